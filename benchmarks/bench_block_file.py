@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of AbstractBlockFileIO scanner on one record spanning
+many chunks (whole chromosome fasta record or large TRF block)
+between two small records. Scan time should grow linearly with
+record size.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_block_file [size_mb ...]
+"""
+import os
+import sys
+import tempfile
+import time
+from trseeker.seqio.block_file import AbstractBlockFileIO
+
+SIZES = (16, 64, 256)
+
+
+def write_record_file(file_name, size_mb):
+    """ Write small record, record of size_mb Mb with 60 bp lines and small record."""
+    line = "ACGT" * 15 + "\n"
+    block = line * (1024 * 1024 // len(line))
+    with open(file_name, "w") as fh:
+        fh.write(">first\nACGT\n>large\n")
+        for i in range(size_mb):
+            fh.write(block)
+        fh.write(">last\nACGT\n")
+
+
+def run(*sizes):
+    """ Print scan time of the file with one large record for each size."""
+    print("size_mb\tchunks\tblocks\tsec\tmb_per_sec")
+    for size_mb in sizes or SIZES:
+        file_name = tempfile.mktemp(suffix=".fa")
+        try:
+            write_record_file(file_name, size_mb)
+            reader = AbstractBlockFileIO(">")
+            start = time.time()
+            with open(file_name, "rb") as fh:
+                blocks = reader.get_blocks(">", fh)
+            elapsed = time.time() - start
+            last_start = os.path.getsize(file_name) - len(">last\nACGT\n")
+            assert blocks == [(0, 12), (12, last_start), (last_start, 0)], blocks
+            chunks = os.path.getsize(file_name) // reader.chunk_size + 1
+            print("%s\t%s\t%s\t%.2f\t%.1f" % (size_mb, chunks, len(blocks), elapsed, size_mb / elapsed))
+        finally:
+            if os.path.isfile(file_name):
+                os.unlink(file_name)
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
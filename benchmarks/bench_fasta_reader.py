@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of sc_iter_fasta reading modes on a synthetic assembly.
+
+Each mode runs in a separate process to measure its own peak RSS:
+
+- inmem   -- previous path, all lines are read before the first record
+- objects -- streaming by chunks, SequenceModel per record
+- tuples  -- streaming by chunks, (header, sequence) per record
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_fasta_reader [size_mb] [contigs]
+"""
+import os
+import sys
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from trseeker.seqio.fasta_file import sc_iter_fasta
+
+MODES = ("inmem", "objects", "tuples")
+
+
+def write_assembly(fasta_file, size_mb, contigs, seed=42):
+    """ Write fasta file of size_mb megabases split in contigs with 60 bp lines."""
+    random.seed(seed)
+    line = "".join(random.choice("ACGT") for i in range(6000))
+    lines = [line[i:i + 60] + "\n" for i in range(0, len(line), 60)]
+    contig_length = size_mb * 1000000 // contigs
+    with open(fasta_file, "w") as fh:
+        for i in range(contigs):
+            fh.write(">contig%s\n" % i)
+            written = 0
+            while written < contig_length:
+                for seq_line in lines:
+                    fh.write(seq_line)
+                written += 6000
+
+
+def read_fasta(fasta_file, mode):
+    """ Iterate over file in given mode, return (records, bases)."""
+    records = 0
+    bases = 0
+    if mode == "tuples":
+        for header, sequence in sc_iter_fasta(fasta_file, as_tuples=True):
+            records += 1
+            bases += len(sequence)
+    else:
+        for seq_obj in sc_iter_fasta(fasta_file, inmem=mode == "inmem", skip_clean=True):
+            records += 1
+            bases += seq_obj.length
+    return records, bases
+
+
+def run_mode(fasta_file, mode):
+    """ Run read_fasta in this process and print tab-delimited statistics."""
+    start = time.time()
+    records, bases = read_fasta(fasta_file, mode)
+    elapsed = time.time() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    size = os.path.getsize(fasta_file) / 1024. / 1024.
+    print("%s\t%s\t%s\t%.2f\t%.1f\t%s" % (mode, records, bases, elapsed, size / elapsed, peak_rss))
+
+
+def run(size_mb=200, contigs=4):
+    """ Print timings and peak RSS for each mode."""
+    fasta_file = tempfile.mktemp(suffix=".fa")
+    try:
+        write_assembly(fasta_file, size_mb, contigs)
+        print("mode\trecords\tbases\tsec\tmb_per_sec\tpeak_rss_mb")
+        sys.stdout.flush()
+        for mode in MODES:
+            subprocess.check_call([sys.executable, "-m", "trseeker.benchmarks.bench_fasta_reader",
+                                   "--mode", mode, fasta_file])
+    finally:
+        if os.path.isfile(fasta_file):
+            os.unlink(fasta_file)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == "--mode":
+        run_mode(sys.argv[3], sys.argv[2])
+    else:
+        run(*[int(x) for x in sys.argv[1:]])
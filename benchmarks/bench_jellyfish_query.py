@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of jellyfish queries: one `jellyfish query` process per batch
+against persistent `query -i` workers, with fake_jellyfish as a stand-in
+binary that loads its database on every start.
+
+Workloads are k-mer extension steps of raw_reads_continue_kmer_right
+(4 k-mers per query) and bulk query of random k-mers. Results are checked
+to be identical.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_jellyfish_query [db_kmers] [steps] [queries]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from trseeker.tools import jellyfish_tools
+from trseeker.tools.jellyfish_query import close_query_pools
+from trseeker.tools.raw_reads_tools import raw_reads_continue_kmer_right
+from trseeker.tools.sequence_tools import get_revcomp
+
+FAKE_JELLYFISH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_jellyfish.py")
+
+
+def write_fake_db(file_name, kmers, header):
+    """ Write fake database of canonical k-mers, header marks jellyfish 2 file."""
+    with open(file_name, "w") as fh:
+        if header:
+            fh.write("000000002{}\n")
+        for i, kmer in enumerate(kmers):
+            fh.write("%s\t%s\n" % (min(kmer, get_revcomp(kmer).upper()), i % 100 + 1))
+
+
+def run(n=200000, steps=50, queries=100000, k=23):
+    """ Print timings of per batch and persistent queries."""
+    random.seed(42)
+    kmers = ["".join(random.choice("ACGT") for i in range(k)) for j in range(n)]
+    work_dir = tempfile.mkdtemp(prefix="bench_jellyfish")
+    jellyfish_tools.location = "%s %s" % (sys.executable, FAKE_JELLYFISH)
+    jellyfish_tools.location_new = jellyfish_tools.location
+    try:
+        db1 = os.path.join(work_dir, "db1.jf")
+        db2 = os.path.join(work_dir, "db2.jf")
+        write_fake_db(db1, kmers, False)
+        write_fake_db(db2, kmers, True)
+        starts = random.sample(kmers, steps)
+        bulk = [random.choice(kmers) if i % 2 else "".join(random.choice("ACGT") for j in range(k))
+                for i in range(queries)]
+        print("workload\tmode\tworkers\tsec")
+        results = {}
+        for workload in ("extension", "bulk"):
+            for mode, db_file, workers in (("per_batch", db1, 1), ("persistent", db2, 1), ("persistent", db2, 2)):
+                close_query_pools()
+                start = time.time()
+                if workload == "extension":
+                    result = [raw_reads_continue_kmer_right(kmer, db_file) for kmer in starts]
+                else:
+                    result = dict(jellyfish_tools.query_kmers(db_file, bulk, workers=workers))
+                print("%s\t%s\t%s\t%.2f" % (workload, mode, workers, time.time() - start))
+                sys.stdout.flush()
+                results.setdefault(workload, result)
+                assert result == results[workload]
+    finally:
+        close_query_pools()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of frequent k-mer counting in reads: exact counting of all k-mers
+against two pass counting with count-min sketch pre-filter for several
+memory budgets. Half of the reads are random (singleton k-mers),
+half come from tandem repeats with sequencing errors.
+
+Peak memory is measured with tracemalloc, frequent k-mers are checked
+to be identical.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_kmer_cms [reads] [k] [min_tf]
+"""
+import sys
+import time
+import random
+import tracemalloc
+import numpy
+from trseeker.tools.kmer_codec import count_kmer_codes
+from trseeker.tools.kmer_cms import iter_code_batches, sc_count_frequent_kmers
+from trseeker.tools.read_codec import merge_kmer_counts
+
+MEMORY_BUDGETS = (16, 64, 256)
+
+
+def get_reads(n, length=100, seed=42, error_rate=0.01):
+    """ Return n reads, odd reads are from 20 tandem repeats with errors."""
+    random.seed(seed)
+    monomers = ["".join(random.choice("acgt") for i in range(random.randint(10, 200))) for j in range(20)]
+    result = []
+    for i in range(n):
+        if i % 2:
+            monomer = random.choice(monomers)
+            array = monomer * (length // len(monomer) + 2)
+            start = random.randrange(len(monomer))
+            read = list(array[start:start + length])
+            for j in range(length):
+                if random.random() < error_rate:
+                    read[j] = random.choice("acgt")
+            result.append("".join(read))
+        else:
+            result.append("".join(random.choice("acgt") for j in range(length)))
+    return result
+
+
+def count_exact(reads, k, min_tf):
+    """ Count all k-mers and select k-mers with tf >= min_tf."""
+    codes = numpy.zeros(0, dtype=numpy.uint64)
+    tfs = numpy.zeros(0, dtype=numpy.uint64)
+    for batch, skipped in iter_code_batches(reads, k):
+        batch, batch_tfs = count_kmer_codes(batch)
+        codes, tfs = merge_kmer_counts(numpy.concatenate([codes, batch]),
+                                       numpy.concatenate([tfs, batch_tfs.astype(numpy.uint64)]))
+    return codes[tfs >= min_tf], tfs[tfs >= min_tf], len(codes)
+
+
+def _run_traced(function, *args, **kwargs):
+    """ Return (result, seconds, peak traced memory in Mb)."""
+    tracemalloc.start()
+    start = time.time()
+    result = function(*args, **kwargs)
+    seconds = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 1024. / 1024.
+
+
+def run(n=200000, k=23, min_tf=10):
+    """ Print time, peak memory and false positive rate of both methods."""
+    reads = get_reads(n)
+    print("method\tsketch_mb\tsec\tpeak_mb\tcounted\tfrequent\tfalse_positive_rate")
+    (codes, tfs, counted), seconds, peak = _run_traced(count_exact, reads, k, min_tf)
+    print("exact\t-\t%.2f\t%.1f\t%s\t%s\t-" % (seconds, peak, counted, len(codes)))
+    sys.stdout.flush()
+    for max_memory in MEMORY_BUDGETS:
+        (sketch_codes, sketch_tfs, stats), seconds, peak = _run_traced(
+            sc_count_frequent_kmers, lambda: iter(reads), k, min_tf, max_memory=max_memory, verbose=False)
+        assert numpy.array_equal(sketch_codes, codes) and numpy.array_equal(sketch_tfs, tfs)
+        print("count-min\t%s\t%.2f\t%.1f\t%s\t%s\t%.4f" % (max_memory, seconds, peak, stats["candidates"],
+                                                         stats["frequent"], stats["false_positive_rate"]))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of k-mer coverage profiles: per position loop of
+get_sequence_coverage (get_revcomp and two dictionary lookups for each
+position) against vectorized kmer_coverage profile over Kmer2tfTable
+and bedGraph output. Results are checked to be identical.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_kmer_coverage [length]
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from trseeker.tools.sequence_tools import get_revcomp
+from trseeker.tools.kmer_mmap import sc_convert_jellyfish_dump, Kmer2tfTable
+from trseeker.tools.kmer_coverage import get_coverage_profile, write_coverage_bedgraph
+
+
+def get_loop_coverage(data, query_sequence, k):
+    """ Coverage loop of previous get_sequence_coverage."""
+    coverage = []
+    for i in range(0, len(query_sequence) - k + 1):
+        kmer = query_sequence[i:i + k]
+        rkmer = get_revcomp(kmer)
+        coverage.append(max(data.get(kmer, 0), data.get(rkmer, 0)))
+    return coverage
+
+
+def run(length=2000000, k=23):
+    """ Print timings of loop and vectorized coverage."""
+    random.seed(42)
+    monomer = "".join(random.choice("ACGT") for i in range(171))
+    parts = []
+    while sum(len(x) for x in parts) < length:
+        parts.append(monomer * random.randint(1, 50))
+        parts.append("".join(random.choice("ACGT") for i in range(random.randint(100, 5000))))
+    sequence = "".join(parts)[:length]
+    data = {}
+    for i in range(0, len(sequence) - k + 1, 3):
+        kmer = min(sequence[i:i + k], get_revcomp(sequence[i:i + k]))
+        data[kmer] = i % 97 + 1
+    work_dir = tempfile.mkdtemp(prefix="bench_kmer_coverage")
+    try:
+        dump_file = os.path.join(work_dir, "kmers.dat")
+        with open(dump_file, "w") as fh:
+            for kmer, tf in data.items():
+                fh.write("%s\t%s\n" % (kmer, tf))
+        sc_convert_jellyfish_dump(dump_file, dump_file + ".kmt", verbose=False)
+        table = Kmer2tfTable(dump_file + ".kmt")
+        print("method\tsec\tpositions")
+        start = time.time()
+        expected = get_loop_coverage(data, sequence, k)
+        print("loop\t%.2f\t%s" % (time.time() - start, len(expected)))
+        start = time.time()
+        coverage = get_coverage_profile(sequence, table.get_code_counts, k=k)
+        print("vectorized\t%.2f\t%s" % (time.time() - start, len(coverage)))
+        start = time.time()
+        fh = io.StringIO()
+        runs = write_coverage_bedgraph(fh, "chr", sequence, table.get_code_counts, k=k, window=1 << 18)
+        print("bedgraph_%s_runs\t%.2f\t%s" % (runs, time.time() - start, len(coverage)))
+        if coverage.tolist() != expected:
+            raise Exception("Vectorized coverage differs from loop")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    args = [int(x) for x in sys.argv[1:]]
+    run(*args)
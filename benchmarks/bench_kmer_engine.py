@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of packed k-mer engine against the previous string path
+for get_kmer2tf and process_list_to_kmer_index on synthetic TR arrays.
+Results are checked to be identical. The previous index counted df
+per strand, so its postings are joined by docid before comparison.
+Peak memory of index construction is measured with tracemalloc.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_kmer_engine [arrays] [k]
+"""
+import sys
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from trseeker.tools.sequence_tools import get_revcomp
+from trseeker.tools.ngrams_tools import get_kmer2tf, process_list_to_kmer_index
+
+
+def get_tr_arrays(n, seed=42, max_monomer=200, max_copies=50):
+    """ Return n random tandem arrays with point mutations and rare N."""
+    random.seed(seed)
+    result = []
+    for i in range(n):
+        monomer = "".join(random.choice("acgt") for j in range(random.randint(5, max_monomer)))
+        array = list(monomer * random.randint(2, max_copies))
+        for j in range(len(array) // 50):
+            array[random.randrange(len(array))] = random.choice("acgtn")
+        result.append("".join(array))
+    return result
+
+
+def get_kmer2tf_strings(sequence, k):
+    """ Previous string implementation of get_kmer2tf."""
+    kmers = defaultdict(int)
+    for i in range(0, len(sequence) - k + 1):
+        kmer = sequence[i:i+k].lower()
+        if 'n' in kmer:
+            continue
+        kmers[kmer] += 1
+    return kmers
+
+
+def process_list_to_kmer_index_strings(data, k, docids=True, cutoff=None):
+    """ Previous string implementation of process_list_to_kmer_index."""
+    tf_dict = defaultdict(int)
+    df_dict = defaultdict(int)
+    doc_data = defaultdict(list)
+    freq_data = defaultdict(list)
+    for i, sequence in enumerate(data):
+        for key, tf in get_kmer2tf_strings(sequence, k).items():
+            tf_dict[key] += tf
+            df_dict[key] += 1
+            doc_data[key].append(i)
+            freq_data[key].append(tf)
+    result = []
+    seen = set()
+    for key in df_dict:
+        if key in seen:
+            continue
+        revkey = get_revcomp(key)
+        if revkey in seen:
+            continue
+        if revkey in df_dict:
+            df = df_dict[key] + df_dict[revkey]
+            tf = tf_dict[key] + tf_dict[revkey]
+            ids = doc_data[key] + doc_data[revkey]
+            freqs = freq_data[key] + freq_data[revkey]
+        else:
+            df = df_dict[key]
+            tf = tf_dict[key]
+            ids = doc_data[key]
+            freqs = freq_data[key]
+        if cutoff and df <= cutoff:
+            continue
+        if revkey < key:
+            key, revkey = revkey, key
+        if docids:
+            result.append((key, revkey, tf, df, ids, freqs))
+        else:
+            result.append((key, revkey, tf, df, None, None))
+        seen.add(key)
+        seen.add(revkey)
+    result.sort(key=lambda x: x[-3], reverse=True)
+    return result
+
+
+def _normalize_index(index):
+    """ Index rows as comparable set, postings of both strands are joined by docid.
+    Palindromes are skipped because the string path counted them twice.
+    """
+    result = set()
+    for kmer, revkmer, tf, df, ids, freqs in index:
+        if kmer == revkmer:
+            continue
+        postings = None
+        if ids is not None:
+            doc2freq = defaultdict(int)
+            for docid, freq in zip(ids, freqs):
+                doc2freq[docid] += freq
+            postings = tuple(sorted(doc2freq.items()))
+        result.add((kmer, revkmer, tf, postings))
+    return result
+
+
+def get_peak_memory(function, *args, **kwargs):
+    """ Return peak traced memory in Mb during function call."""
+    tracemalloc.start()
+    function(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024. / 1024.
+
+
+def run(n=2000, k=23):
+    """ Print timings of string and packed implementations."""
+    data = get_tr_arrays(n)
+    total = sum(len(x) for x in data)
+    print("function\tarrays\tbases\tstring_sec\tpacked_sec\tstring_peak_mb\tpacked_peak_mb")
+
+    start = time.time()
+    expected = [get_kmer2tf_strings(x, k) for x in data]
+    string_time = time.time() - start
+    start = time.time()
+    result = [get_kmer2tf(x, k) for x in data]
+    packed_time = time.time() - start
+    assert result == expected
+    print("get_kmer2tf\t%s\t%s\t%.2f\t%.2f\tNA\tNA" % (n, total, string_time, packed_time))
+
+    for docids in (False, True):
+        start = time.time()
+        expected = process_list_to_kmer_index_strings(data, k, docids=docids)
+        string_time = time.time() - start
+        start = time.time()
+        result = process_list_to_kmer_index(data, k, docids=docids, verbose=False)
+        packed_time = time.time() - start
+        assert _normalize_index(result) == _normalize_index(expected)
+        if docids:
+            assert all(x[3] == len(x[4]) for x in result)
+        del result, expected
+        string_peak = get_peak_memory(process_list_to_kmer_index_strings, data, k, docids=docids)
+        packed_peak = get_peak_memory(process_list_to_kmer_index, data, k, docids=docids, verbose=False)
+        print("process_list_to_kmer_index(docids=%s)\t%s\t%s\t%.2f\t%.2f\t%.1f\t%.1f" % (
+            docids, n, total, string_time, packed_time, string_peak, packed_peak))
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
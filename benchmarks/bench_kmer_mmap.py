@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of kmer2tf loading: load_kmer2tf dictionary of a jellyfish
+dump against memory mapped table of kmer_mmap (conversion, repeated open,
+batched and single lookups). Results are checked to be identical.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_kmer_mmap [dump_kmers] [queries]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import resource
+from trseeker.tools.jellyfish_tools import load_kmer2tf
+from trseeker.tools.kmer_mmap import sc_convert_jellyfish_dump, Kmer2tfTable
+
+
+def get_peak_memory():
+    """ Return peak resident memory of the process in Mb."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def run(n=2000000, queries=100000, k=23):
+    """ Print timings of dictionary and memory mapped kmer2tf."""
+    random.seed(42)
+    work_dir = tempfile.mkdtemp(prefix="bench_kmer_mmap")
+    try:
+        dump_file = os.path.join(work_dir, "kmers.dat")
+        table_file = os.path.join(work_dir, "kmers.kmt")
+        kmers = set()
+        with open(dump_file, "w") as fh:
+            while len(kmers) < n:
+                kmer = "".join(random.choice("ACGT") for i in range(k))
+                if kmer in kmers:
+                    continue
+                kmers.add(kmer)
+                fh.write("%s\t%s\n" % (kmer, len(kmers) % 1000 + 1))
+        kmers = sorted(kmers)
+        query = [random.choice(kmers) for i in range(queries)]
+        print("step\tsec\tpeak_mb")
+
+        start = time.time()
+        sc_convert_jellyfish_dump(dump_file, table_file, canonical=False, verbose=False)
+        print("convert\t%.2f\t%.0f" % (time.time() - start, get_peak_memory()))
+
+        start = time.time()
+        table = Kmer2tfTable(table_file)
+        print("mmap_open\t%.4f\t%.0f" % (time.time() - start, get_peak_memory()))
+        start = time.time()
+        batch = table.get_counts(query).tolist()
+        print("mmap_batch_%s\t%.2f\t%.0f" % (queries, time.time() - start, get_peak_memory()))
+        start = time.time()
+        single = [table[x] for x in query[:10000]]
+        print("mmap_single_10000\t%.2f\t%.0f" % (time.time() - start, get_peak_memory()))
+
+        start = time.time()
+        kmer2tf = load_kmer2tf(dump_file)
+        print("dict_load\t%.2f\t%.0f" % (time.time() - start, get_peak_memory()))
+        start = time.time()
+        expected = [int(kmer2tf[x]) for x in query]
+        print("dict_batch_%s\t%.2f\t%.0f" % (queries, time.time() - start, get_peak_memory()))
+        if batch != expected or single != expected[:10000]:
+            raise Exception("Memory mapped table differs from dictionary")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    args = [int(x) for x in sys.argv[1:]]
+    run(*args)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of document similarity by shared k-mers: previous loop
+with string pair keys against postings arrays and sparse matrix.
+
+The string loop runs only for the first arrays (it is quadratic in df),
+its distances are checked against the sparse matrix. Distance file of
+KmerBasedDistance is compared with the file of the string loop (as
+written by previous save_distances_to_file) and with the file of
+sc_compute_distances spilled in small runs.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_kmer_similarity [arrays] [k] [string_arrays]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from collections import defaultdict
+import numpy
+from trseeker.tools.kmer_tables import sc_count_kmer_table
+from trseeker.tools.kmer_similarity import get_postings_offsets, get_postings_similarity, sc_compute_distances
+from trseeker.tools.kmer_distance import KmerBasedDistance
+from trseeker.benchmarks.bench_kmer_engine import get_tr_arrays
+
+
+def get_tr_families(n, seed=42, max_copies=10):
+    """ Return n arrays from n / 10 families of mutated copies."""
+    founders = get_tr_arrays(max(1, n // 10), seed=seed, max_copies=max_copies)
+    random.seed(seed)
+    result = []
+    for i in range(n):
+        array = list(founders[(i // 10) % len(founders)])
+        for j in range(len(array) // 100):
+            array[random.randrange(len(array))] = random.choice("acgt")
+        result.append("".join(array))
+    return result
+
+
+def get_index(data, k):
+    """ Return inverted index (offsets, docids, nfs)."""
+    keys, tf, df, (codes, docids, freqs) = sc_count_kmer_table(data, k, docids=True)
+    lengths = numpy.array([len(x) for x in data], dtype=numpy.float64)
+    docids = docids.astype(numpy.int64)
+    return get_postings_offsets(df), docids, freqs / lengths[docids]
+
+
+def compute_distances_strings(offsets, docids, nfs):
+    """ Previous compute_distances loop over string pair keys."""
+    D = defaultdict(float)
+    offsets = offsets.tolist()
+    docids = docids.tolist()
+    nfs = nfs.tolist()
+    for p in range(len(offsets) - 1):
+        ids = docids[offsets[p]:offsets[p + 1]]
+        p_nfs = nfs[offsets[p]:offsets[p + 1]]
+        if len(ids) == 1:
+            continue
+        for i, docid_a in enumerate(ids):
+            for j, docid_b in enumerate(ids[i+1:]):
+                key = "%s\t%s" % (docid_a, docid_b)
+                D[key] += min(p_nfs[i], p_nfs[i + 1 + j])
+    return D
+
+
+def read_distance_file(file_name):
+    """ Return dictionary "docid_a\tdocid_b" -> distance."""
+    result = {}
+    with open(file_name) as fh:
+        for line in fh:
+            a, b, value = line.split("\t")
+            result["%s\t%s" % (a, b)] = float(value)
+    return result
+
+
+def same_distances(a, b):
+    """ Compare distance dictionaries."""
+    return set(a) == set(b) and all(abs(a[x] - b[x]) < 1e-9 for x in a)
+
+
+def compare_distance_files(data, k):
+    """ Write distance files of KmerBasedDistance, the string loop and
+    sc_compute_distances and check that they are the same.
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_kmer_similarity")
+    try:
+        distance = KmerBasedDistance(data, k=k)
+        distance.verbose = False
+        distance.count_tf_df_for_data()
+        distance.compute_distances()
+        new_file = os.path.join(work_dir, "new.dat")
+        distance.save_distances_to_file(new_file)
+        old_file = os.path.join(work_dir, "old.dat")
+        with open(old_file, "w") as fh:
+            for key, value in compute_distances_strings(distance.offsets, distance.docids, distance.docnfs).items():
+                fh.write("%s\t%s\n" % (key, value))
+        runs_file = os.path.join(work_dir, "runs.dat")
+        postings = ((distance.docids[distance.offsets[p]:distance.offsets[p + 1]],
+                     distance.docnfs[distance.offsets[p]:distance.offsets[p + 1]])
+                    for p in range(len(distance.offsets) - 1))
+        sc_compute_distances(postings, runs_file, max_memory=0.1, verbose=False)
+        expected = read_distance_file(old_file)
+        assert same_distances(read_distance_file(new_file), expected)
+        assert same_distances(read_distance_file(runs_file), expected)
+        return len(expected)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run(n=50000, k=23, string_n=2000):
+    """ Print timings of string and sparse implementations."""
+    data = get_tr_families(n)
+    start = time.time()
+    pairs = compare_distance_files(data[:string_n], k)
+    print("Distance files of %s arrays are identical (%s pairs, %.2f sec)" % (string_n, pairs, time.time() - start))
+    print("implementation\tarrays\tbases\tindex_sec\tdistance_sec\tpairs")
+    for name, arrays in (("strings", data[:string_n]), ("sparse", data[:string_n]), ("sparse", data)):
+        start = time.time()
+        offsets, docids, nfs = get_index(arrays, k)
+        index_time = time.time() - start
+        start = time.time()
+        if name == "strings":
+            expected = compute_distances_strings(offsets, docids, nfs)
+            pairs = len(expected)
+        else:
+            rows, cols, values = get_postings_similarity(offsets, docids, nfs)
+            pairs = len(rows)
+        distance_time = time.time() - start
+        if name == "sparse" and len(arrays) == len(data[:string_n]):
+            result = dict(("%s\t%s" % (a, b), v) for a, b, v in zip(rows.tolist(), cols.tolist(), values.tolist()))
+            assert set(result) == set(expected)
+            assert all(abs(result[x] - expected[x]) < 1e-9 for x in result)
+        print("%s\t%s\t%s\t%.2f\t%.2f\t%s" % (name, len(arrays), sum(len(x) for x in arrays),
+                                              index_time, distance_time, pairs))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
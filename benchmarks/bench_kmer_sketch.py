@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Recall and speed of MinHash/LSH TR similarity against the exact
+all-pairs similarity over the inverted index.
+
+Synthetic catalog has families of 10 mutated copies and one large
+alpha satellite like family, which makes the exact method quadratic.
+Recall is a fraction of exact pairs with similarity >= threshold
+found by sketches, connected is a fraction of these pairs connected
+in the sketch network of edges >= threshold. Large family copies
+have low Jaccard similarity of k-mer sets, so their connectivity depends
+on family size and bands: with 32 bands 20000 2000 has 0.95 of pairs
+connected (one big component and singletons), 2000 200 is split into
+~60 components (0.45) and needs 64 bands.
+Number of components of the large family is printed for the lowest threshold.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_kmer_sketch [arrays] [large_family] [k] [bands]
+"""
+import sys
+import time
+import random
+from trseeker.tools.kmer_similarity import get_postings_similarity
+from trseeker.tools.kmer_sketch import get_array_kmers, get_minhash_sketches, get_lsh_candidates, \
+    get_pairs_similarity
+from trseeker.benchmarks.bench_kmer_similarity import get_tr_families, get_index
+
+THRESHOLDS = (0.05, 0.1, 0.3, 0.5, 0.8)
+
+
+def _get_components(n, edges):
+    """ Return component of each node for list of edges (union-find)."""
+    parents = list(range(n))
+
+    def find(x):
+        while parents[x] != x:
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    for a, b in edges:
+        parents[find(a)] = find(b)
+    return [find(x) for x in range(n)]
+
+
+def get_catalog(n, large_family, seed=42):
+    """ Return n family arrays and large_family copies of one monomer with 2% mutations."""
+    data = get_tr_families(n, seed=seed)
+    random.seed(seed)
+    monomer = "".join(random.choice("acgt") for i in range(171))
+    for i in range(large_family):
+        array = list(monomer * random.randint(5, 30))
+        for j in range(len(array) // 50):
+            array[random.randrange(len(array))] = random.choice("acgt")
+        data.append("".join(array))
+    return data
+
+
+def run(n=20000, large_family=2000, k=23, bands=32):
+    """ Print time of both methods and recall for similarity thresholds."""
+    data = get_catalog(n, large_family)
+    print("method\tarrays\tsec\tpairs")
+
+    start = time.time()
+    rows, cols, values = get_postings_similarity(*get_index(data, k))
+    exact_time = time.time() - start
+    print("exact\t%s\t%.2f\t%s" % (len(data), exact_time, len(rows)))
+
+    start = time.time()
+    offsets, codes, freqs = get_array_kmers(data, k=k)
+    sketches = get_minhash_sketches(offsets, codes)
+    sketch_rows, sketch_cols = get_lsh_candidates(sketches, bands=bands)
+    sketch_values = get_pairs_similarity(offsets, codes, freqs, sketch_rows, sketch_cols)
+    sketch_time = time.time() - start
+    print("sketch\t%s\t%.2f\t%s" % (len(data), sketch_time, len(sketch_rows)))
+
+    found_pairs = list(zip(sketch_rows.tolist(), sketch_cols.tolist()))
+    found = set(found_pairs)
+    exact = dict(zip(zip(rows.tolist(), cols.tolist()), values.tolist()))
+    print("\nthreshold\texact_pairs\trecall\tconnected")
+    for threshold in THRESHOLDS:
+        pairs = [x for x, value in exact.items() if value >= threshold]
+        edges = [x for x, value in zip(found_pairs, sketch_values.tolist()) if value >= threshold]
+        components = _get_components(len(data), edges)
+        recall = sum(1 for x in pairs if x in found) * 1. / len(pairs) if pairs else 1.
+        connected = sum(1 for a, b in pairs if components[a] == components[b]) * 1. / len(pairs) if pairs else 1.
+        print("%s\t%s\t%.4f\t%.4f" % (threshold, len(pairs), recall, connected))
+        if threshold == THRESHOLDS[0]:
+            large_components = len(set(components[n:]))
+    print("\nlarge_family\tcomponents")
+    print("%s\t%s" % (large_family, large_components))
+    selected = [exact.get(x) for x in found_pairs]
+    assert all(v is None or abs(v - s) < 1e-9 for v, s in zip(selected, sketch_values.tolist()))
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
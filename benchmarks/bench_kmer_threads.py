@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Scaling benchmark of k-mer counting in a process pool
+for 1 to N processes on synthetic TR arrays.
+
+Tables, get_kmer_tf_df_for_data and KmerBasedDistance.count_tf_df_for_data
+results are checked to be identical to the single process result.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_kmer_threads [arrays] [k] [max_threads]
+"""
+import os
+import sys
+import time
+import numpy
+from trseeker.tools.kmer_tables import sc_count_kmer_table
+from trseeker.tools.ngrams_tools import get_kmer_tf_df_for_data
+from trseeker.tools.kmer_distance import KmerBasedDistance
+from trseeker.benchmarks.bench_kmer_engine import get_tr_arrays
+
+
+def _same_tables(a, b):
+    """ Compare (keys, tf, df, postings) tables."""
+    for x, y in zip(a[:3], b[:3]):
+        if not numpy.array_equal(x, y):
+            return False
+    return all(numpy.array_equal(x, y) for x, y in zip(a[3], b[3]))
+
+
+def _get_index(data, k, threads):
+    """ Return KmerBasedDistance index arrays counted with threads processes."""
+    distance = KmerBasedDistance(data, k=k)
+    distance.verbose = False
+    distance.count_tf_df_for_data(threads=threads)
+    return distance.kmers, distance.tf, distance.df, distance.offsets, distance.docids, distance.doctfs
+
+
+def run(n=5000, k=23, max_threads=None):
+    """ Print timings of table counting and dictionary output for each number of processes."""
+    max_threads = max_threads or os.cpu_count() or 1
+    data = get_tr_arrays(n)
+    total = sum(len(x) for x in data)
+    print("threads\tarrays\tbases\ttable_sec\tspeedup\tdicts_sec\tdistance_index_sec")
+    expected_table = None
+    expected_dicts = None
+    expected_index = None
+    base_time = None
+    for threads in range(1, max_threads + 1):
+        start = time.time()
+        table = sc_count_kmer_table(data, k, docids=True, threads=threads)
+        table_time = time.time() - start
+        start = time.time()
+        dicts = get_kmer_tf_df_for_data(data, k, docids=True, verbose=False, threads=threads)
+        dicts_time = time.time() - start
+        start = time.time()
+        index = _get_index(data, k, threads)
+        index_time = time.time() - start
+        if expected_table is None:
+            expected_table = table
+            expected_dicts = dicts
+            expected_index = index
+            base_time = table_time
+        assert _same_tables(table, expected_table)
+        assert dicts == expected_dicts
+        assert index[0] == expected_index[0]
+        assert all(numpy.array_equal(x, y) for x, y in zip(index[1:], expected_index[1:]))
+        print("%s\t%s\t%s\t%.2f\t%.2f\t%.2f\t%.2f" % (threads, n, total, table_time, base_time / table_time,
+                                                     dicts_time, index_time))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
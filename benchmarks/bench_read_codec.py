@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of 2-bit read encoding: previous seq_to_bin / bin_to_seq
+string loops against batch pack_reads / unpack_reads.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_read_codec [reads] [length]
+"""
+import sys
+import time
+import random
+from trseeker.tools.read_codec import pack_reads, unpack_reads, count_packed_reads
+
+LBT = {'a': '00', 'c': '01', 'g': '10', 't': '11'}
+BLT = {'00': 'a', '01': 'c', '10': 'g', '11': 't'}
+
+
+def seq_to_bin_strings(seq):
+    """ Previous seq_to_bin with eval of binary string."""
+    b = '0b1'
+    for l in seq:
+        b += LBT[l]
+    return eval(b)
+
+
+def bin_to_seq_strings(bseq):
+    """ Previous bin_to_seq."""
+    bseq = str(bin(bseq))[3:]
+    result = ''
+    for i in range(0, len(bseq), 2):
+        result += BLT[bseq[i:i + 2]]
+    return result
+
+
+def get_reads(n, length, seed=42):
+    """ Return n random reads from n / 10 templates."""
+    random.seed(seed)
+    templates = ["".join(random.choice("acgt") for i in range(length)) for j in range(max(1, n // 10))]
+    return [random.choice(templates).encode("ascii") for i in range(n)]
+
+
+def run(n=1000000, length=100):
+    """ Print encode, decode and collapse timings."""
+    reads = get_reads(n, length)
+    print("implementation\treads\tencode_sec\tdecode_sec\tunique")
+
+    start = time.time()
+    packed, lengths, valid = pack_reads(reads)
+    encode_time = time.time() - start
+    start = time.time()
+    packed, lengths, tfs = count_packed_reads(packed, lengths)
+    sequences = unpack_reads(packed, lengths)
+    decode_time = time.time() - start
+    print("numpy\t%s\t%.2f\t%.2f\t%s" % (n, encode_time, decode_time, len(sequences)))
+    sys.stdout.flush()
+
+    strings = [x.decode("ascii") for x in reads]
+    start = time.time()
+    seen = {}
+    for seq in strings:
+        seq = seq_to_bin_strings(seq)
+        seen[seq] = seen.get(seq, 0) + 1
+    encode_time = time.time() - start
+    start = time.time()
+    expected = [bin_to_seq_strings(x) for x in seen]
+    decode_time = time.time() - start
+    print("strings\t%s\t%.2f\t%.2f\t%s" % (n, encode_time, decode_time, len(expected)))
+    assert sorted(expected) == sorted(sequences)
+
+
+if __name__ == '__main__':
+    run(*[int(x) for x in sys.argv[1:]])
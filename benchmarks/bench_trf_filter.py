@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Benchmark of TRFFileIO._filter_obj_set on synthetic dense TRF hit sets.
+
+The sweep implementation is compared with the previous nested loop,
+results are checked to be identical.
+
+Usage:
+
+    python -m trseeker.benchmarks.bench_trf_filter
+"""
+import random
+import time
+from trseeker.models.trf_model import TRModel
+from trseeker.seqio.trf_file import TRFFileIO
+
+
+def get_dense_hits(n, span, max_length=2000, seed=42, staircase=False):
+    """ Return n TRModel hits with random coordinates in [1, span].
+    With staircase=True hits have the same length and overlap only partially,
+    as TRF reports for long satellite arrays with many periods.
+    """
+    random.seed(seed)
+    result = []
+    for i in range(n):
+        trf_obj = TRModel()
+        trf_obj.trf_id = i
+        trf_obj.trf_l_ind = random.randint(1, span)
+        if staircase:
+            trf_obj.trf_r_ind = trf_obj.trf_l_ind + max_length
+        else:
+            trf_obj.trf_r_ind = trf_obj.trf_l_ind + random.randint(10, max_length)
+        trf_obj.trf_pmatch = str(random.choice([70, 80, 90, 95, 100]))
+        result.append(trf_obj)
+    return result
+
+
+def filter_nested_loop(obj_set):
+    """ Previous quadratic implementation of nested TRs removing."""
+    n = len(obj_set)
+    obj_set.sort(key=lambda x: (x.trf_l_ind, x.trf_r_ind))
+    for a in range(0, n):
+        obj1 = obj_set[a]
+        if not obj1:
+            continue
+        for b in range(a + 1, n):
+            obj2 = obj_set[b]
+            if not obj2:
+                continue
+            if obj1.trf_l_ind == obj2.trf_l_ind and obj1.trf_r_ind == obj2.trf_r_ind:
+                if obj1.trf_pmatch >= obj2.trf_pmatch:
+                    obj_set[b] = None
+                    continue
+                else:
+                    obj_set[a] = None
+                    continue
+            if obj1.trf_l_ind <= obj2.trf_l_ind and obj1.trf_r_ind >= obj2.trf_r_ind:
+                obj_set[b] = None
+                continue
+            if obj2.trf_l_ind <= obj1.trf_l_ind and obj2.trf_r_ind >= obj1.trf_r_ind:
+                obj_set[a] = None
+                continue
+            if obj1.trf_r_ind > obj2.trf_l_ind and obj1.trf_r_ind < obj2.trf_r_ind:
+                continue
+            if obj1.trf_r_ind < obj2.trf_l_ind:
+                break
+            if obj2.trf_r_ind < obj1.trf_l_ind:
+                break
+    return [x for x in obj_set if not x is None]
+
+
+def run(sizes=(1000, 2000, 4000, 8000, 16000, 32000), span=100000, naive_limit=16000):
+    """ Print timings for growing number of hits in the same region."""
+    reader = TRFFileIO()
+    print("pattern\thits\thits_per_kb\tkept\tsweep_sec\tnested_loop_sec")
+    for staircase in (False, True):
+        pattern = "staircase" if staircase else "random"
+        for n in sizes:
+            start = time.time()
+            kept = reader._filter_obj_set(get_dense_hits(n, span, staircase=staircase))
+            sweep_time = time.time() - start
+            naive_time = "NA"
+            if n <= naive_limit:
+                start = time.time()
+                expected = filter_nested_loop(get_dense_hits(n, span, staircase=staircase))
+                naive_time = "%.3f" % (time.time() - start)
+                assert [x.trf_id for x in kept] == [x.trf_id for x in expected]
+            print("%s\t%s\t%s\t%s\t%.3f\t%s" % (pattern, n, n * 1000 // span, len(kept), sweep_time, naive_time))
+
+
+if __name__ == '__main__':
+    run()
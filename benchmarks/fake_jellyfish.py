@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Stand-in for `jellyfish query` used by bench_jellyfish_query.
+
+Database is a text file of canonical kmer<TAB>count lines, optionally after
+a jellyfish 2 like header line (9 digits length and JSON). It is loaded on
+every start, like jellyfish maps its hash.
+
+Usage:
+
+    python fake_jellyfish.py query [-C] [-i] db_file [mers]
+
+With -i k-mers are read one per line and counts are written one per line
+with flush, otherwise all k-mers of stdin are answered as MER COUNT lines.
+"""
+import sys
+
+COMPLEMENT = {"A": "T", "C": "G", "G": "C", "T": "A"}
+
+
+def load_db(db_file):
+    """ Return dictionary canonical kmer to count."""
+    kmer2tf = {}
+    try:
+        fh = open(db_file)
+    except IOError:
+        sys.stderr.write("Can't open file '%s'\n" % db_file)
+        sys.exit(1)
+    with fh:
+        for line in fh:
+            if line[:9].isdigit():
+                continue
+            kmer, tf = line.split()
+            kmer2tf[kmer] = int(tf)
+    return kmer2tf
+
+
+def get_count(kmer2tf, kmer):
+    kmer = kmer.upper()
+    revkmer = "".join(COMPLEMENT.get(x, x) for x in reversed(kmer))
+    return kmer2tf.get(min(kmer, revkmer), 0)
+
+
+def main(args):
+    args = [x for x in args[1:] if x != "-C"]
+    interactive = "-i" in args
+    args = [x for x in args if x != "-i"]
+    kmer2tf = load_db(args[0])
+    if interactive:
+        for line in iter(sys.stdin.readline, ""):
+            if line.strip():
+                sys.stdout.write("%s\n" % get_count(kmer2tf, line.strip()))
+                sys.stdout.flush()
+        return
+    for kmer in sys.stdin.read().split() + args[1:]:
+        sys.stdout.write("%s %s\n" % (kmer.upper(), get_count(kmer2tf, kmer)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
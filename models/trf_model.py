@@ -338,6 +338,22 @@ class TRModel(AbstractModel):
           )
       return "%s\n" % "\t".join(map(str, d))
 
+    def get_flanked_sequence(self, genome, flank_length=0):
+      '''Return (left_flank, array, right_flank) from genome.
+      Genome is a dict or FastaIndex, keys are the first words of fasta headers.
+      Sequences are cleared with clear_sequence (lower case) as trf_array.
+      '''
+      seqid = self.trf_head.split()[0]
+      if not seqid in genome:
+        return None
+      start = min(self.trf_l_ind, self.trf_r_ind) - 1
+      end = max(self.trf_l_ind, self.trf_r_ind)
+      sequence = genome[seqid]
+      left = clear_sequence(sequence[max(0, start - flank_length):start])
+      array = clear_sequence(sequence[start:end])
+      right = clear_sequence(sequence[end:end + flank_length])
+      return left, array, right
+
 class NetworkSliceModel(TRModel):
     """ Class for network slice data.
     """
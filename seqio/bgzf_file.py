@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Parallel reading of BGZF (bgzip) compressed files.
+
+BGZF file is a series of independent gzip members up to 64 kb each,
+so blocks can be inflated on a thread pool (zlib releases the GIL).
+Ordinary gzip streams are read with gzip module.
+
+Classes:
+
+- BgzfReader(io.RawIOBase)
+- ParallelOpener(WiseOpener)
+
+Shortcuts:
+
+- sc_is_bgzf_file(file_name) -> bool
+- sc_open(file_name, mode="r", threads=None) -> file object
+- sc_compress_bgzf(input_file, output_file, level=6)
+"""
+import os
+import io
+import bz2
+import gzip
+import zlib
+import struct
+import bisect
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PyExp import WiseOpener
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+BGZF_HEADER_SIZE = 18
+BGZF_THREADS = min(8, os.cpu_count() or 1)
+BGZF_BLOCKS_PER_TASK = 16
+BGZF_TASKS_PER_THREAD = 4
+BGZF_BLOCK_DATA_SIZE = 65280
+BGZF_EOF = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+
+def _get_bgzf_block_size(header):
+    """ Return total size of BGZF block by its header or None for not BGZF header."""
+    if len(header) < 12 or not header.startswith(BGZF_MAGIC):
+        return None
+    xlen = struct.unpack("<H", header[10:12])[0]
+    extra = header[12:12 + xlen]
+    i = 0
+    while i + 4 <= len(extra):
+        si1, si2, slen = struct.unpack("<BBH", extra[i:i + 4])
+        if si1 == 66 and si2 == 67 and slen == 2:
+            return struct.unpack("<H", extra[i + 4:i + 6])[0] + 1
+        i += 4 + slen
+    return None
+
+
+def sc_is_bgzf_file(file_name):
+    """ Check that the first gzip member of file has BGZF BC subfield."""
+    with open(file_name, "rb") as fh:
+        return _get_bgzf_block_size(fh.read(BGZF_HEADER_SIZE)) is not None
+
+
+def _inflate_blocks(blocks):
+    """ Inflate list of raw BGZF blocks and check crc and sizes."""
+    result = []
+    for block in blocks:
+        xlen = struct.unpack("<H", block[10:12])[0]
+        crc, isize = struct.unpack("<II", block[-8:])
+        data = zlib.decompress(block[12 + xlen:-8], -15)
+        if len(data) != isize or zlib.crc32(data) != crc:
+            raise Exception("Corrupted BGZF block")
+        result.append(data)
+    return b"".join(result)
+
+
+class BgzfReader(io.RawIOBase):
+    """ Raw binary reader of BGZF file with blocks inflated on a thread pool.
+    Use it through io.BufferedReader or sc_open.
+
+    Seeking uses uncompressed offsets. Positions of visited blocks are remembered,
+    so seek back jumps to the right block and seek forward reads only block trailers.
+    """
+
+    def __init__(self, file_name, threads=None):
+        super(BgzfReader, self).__init__()
+        self.file_name = file_name
+        self.threads = threads or BGZF_THREADS
+        self.fh = open(file_name, "rb")
+        self.pool = ThreadPoolExecutor(self.threads)
+        # block starts in compressed and uncompressed files
+        self.raw_starts = [0]
+        self.data_starts = [0]
+        self.mapped_eof = False
+        self._reset(0, 0)
+
+    def _reset(self, raw_offset, data_offset):
+        """ Restart inflating from given block."""
+        for task in getattr(self, "tasks", []):
+            task.cancel()
+        self.tasks = deque()
+        self.fh.seek(raw_offset)
+        self.raw_offset = raw_offset
+        self.next_data_offset = data_offset
+        self.raw_eof = False
+        self.buffer = b""
+        self.buffer_pos = 0
+        self.position = data_offset
+
+    def _read_raw_block(self):
+        """ Read next compressed block and remember its position."""
+        header = self.fh.read(BGZF_HEADER_SIZE)
+        if not header:
+            self.raw_eof = True
+            self.mapped_eof = True
+            return None
+        size = _get_bgzf_block_size(header)
+        if size is None:
+            raise Exception("Not a BGZF block at byte %s of %s" % (self.raw_offset, self.file_name))
+        block = header + self.fh.read(size - len(header))
+        if len(block) < size:
+            raise Exception("Truncated BGZF block at byte %s of %s" % (self.raw_offset, self.file_name))
+        isize = struct.unpack("<I", block[-4:])[0]
+        self.raw_offset += size
+        self.next_data_offset += isize
+        if self.raw_offset > self.raw_starts[-1]:
+            self.raw_starts.append(self.raw_offset)
+            self.data_starts.append(self.next_data_offset)
+        return block
+
+    def _submit_tasks(self):
+        while not self.raw_eof and len(self.tasks) < self.threads * BGZF_TASKS_PER_THREAD:
+            blocks = []
+            while len(blocks) < BGZF_BLOCKS_PER_TASK:
+                block = self._read_raw_block()
+                if block is None:
+                    break
+                blocks.append(block)
+            if blocks:
+                self.tasks.append(self.pool.submit(_inflate_blocks, blocks))
+
+    def _fill_buffer(self):
+        """ Load next inflated data into buffer, return False at the end of file."""
+        while self.buffer_pos >= len(self.buffer):
+            self._submit_tasks()
+            if not self.tasks:
+                return False
+            self.buffer = self.tasks.popleft().result()
+            self.buffer_pos = 0
+        return True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        if not self._fill_buffer():
+            return 0
+        n = min(len(b), len(self.buffer) - self.buffer_pos)
+        b[:n] = self.buffer[self.buffer_pos:self.buffer_pos + n]
+        self.buffer_pos += n
+        self.position += n
+        return n
+
+    def tell(self):
+        return self.position
+
+    def _map_blocks(self, data_offset):
+        """ Scan block headers and trailers until block with data_offset is found."""
+        fh = self.fh
+        saved_position = fh.tell()
+        fh.seek(self.raw_starts[-1])
+        while not self.mapped_eof and self.data_starts[-1] <= data_offset:
+            header = fh.read(BGZF_HEADER_SIZE)
+            if not header:
+                self.mapped_eof = True
+                break
+            size = _get_bgzf_block_size(header)
+            if size is None:
+                raise Exception("Not a BGZF block at byte %s of %s" % (self.raw_starts[-1], self.file_name))
+            fh.seek(self.raw_starts[-1] + size - 4)
+            isize = fh.read(4)
+            if len(isize) < 4:
+                raise Exception("Truncated BGZF block at byte %s of %s" % (self.raw_starts[-1], self.file_name))
+            self.raw_starts.append(self.raw_starts[-1] + size)
+            self.data_starts.append(self.data_starts[-1] + struct.unpack("<I", isize)[0])
+        fh.seek(saved_position)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            self._map_blocks(float("inf"))
+            offset += self.data_starts[-1]
+        if offset < 0:
+            raise ValueError("Negative seek position %s" % offset)
+        block_start = self.position - self.buffer_pos
+        if block_start <= offset <= block_start + len(self.buffer):
+            self.buffer_pos = offset - block_start
+            self.position = offset
+            return offset
+        self._map_blocks(offset)
+        i = max(0, bisect.bisect_right(self.data_starts, offset) - 1)
+        self._reset(self.raw_starts[i], self.data_starts[i])
+        skip = offset - self.data_starts[i]
+        if skip and self._fill_buffer():
+            self.buffer_pos = min(skip, len(self.buffer))
+            self.position += self.buffer_pos
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            for task in self.tasks:
+                task.cancel()
+            self.pool.shutdown(wait=True)
+            self.fh.close()
+        super(BgzfReader, self).close()
+
+
+def sc_open(file_name, mode="r", threads=None):
+    """ Open file for reading, BGZF files are inflated on threads,
+    other gzip files are read with gzip module.
+    Unlike WiseOpener, mode "r" returns text for compressed files too.
+    """
+    if not mode in ("r", "rb"):
+        raise Exception("Wrong file mode: %s" % mode)
+    if file_name.endswith(".gz") or file_name.endswith(".bgz"):
+        if sc_is_bgzf_file(file_name):
+            fh = io.BufferedReader(BgzfReader(file_name, threads=threads), buffer_size=1024 * 1024)
+        else:
+            fh = gzip.open(file_name, "rb")
+        if mode == "r":
+            fh = io.TextIOWrapper(fh)
+        return fh
+    if file_name.endswith(".bz2"):
+        fh = bz2.BZ2File(file_name, "rb")
+        if mode == "r":
+            fh = io.TextIOWrapper(fh)
+        return fh
+    return open(file_name, mode)
+
+
+class ParallelOpener(WiseOpener):
+    """ WiseOpener that reads BGZF files with a thread pool.
+    Other files and writing modes are handled by WiseOpener.
+    """
+
+    def __init__(self, file_name, mode=None, threads=None):
+        super(ParallelOpener, self).__init__(file_name, mode)
+        self.threads = threads
+
+    def __enter__(self):
+        if self.mode in ("r", "rb") and (self.file_name.endswith(".gz") or self.file_name.endswith(".bgz")):
+            self.fh = sc_open(self.file_name, "rb", threads=self.threads)
+            return self.fh
+        return super(ParallelOpener, self).__enter__()
+
+
+def _deflate_block(data, level=6):
+    """ Compress data to one BGZF block."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = BGZF_MAGIC + struct.pack("<IBBHBBHH", 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def sc_compress_bgzf(input_file, output_file, level=6, threads=None):
+    """ Compress input_file (plain or gzip) to BGZF output_file like bgzip does."""
+    threads = threads or BGZF_THREADS
+    with sc_open(input_file, "rb") as fh, open(output_file, "wb") as fw:
+        with ThreadPoolExecutor(threads) as pool:
+            while True:
+                chunks = []
+                for i in range(threads * BGZF_BLOCKS_PER_TASK):
+                    chunk = fh.read(BGZF_BLOCK_DATA_SIZE)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                if not chunks:
+                    break
+                for block in pool.map(_deflate_block, chunks, [level] * len(chunks)):
+                    fw.write(block)
+        fw.write(BGZF_EOF)
+    return output_file
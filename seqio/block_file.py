@@ -11,8 +11,17 @@ Classes:
 - AbstractBlockFileIO(AbstractFileIO)
     
 """
+import os
+import sys
 import gzip
+import array
+import struct
 from PyExp import AbstractFileIO
+from trseeker.seqio.bgzf_file import ParallelOpener
+
+BLOCK_INDEX_MAGIC = b"TRBI"
+BLOCK_INDEX_VERSION = 1
+BLOCK_INDEX_SUFFIX = ".blocks"
 
 class AbstractBlockFileIO(AbstractFileIO):
     """ Working with file with data organized in block, where each block starts with same token.
@@ -22,6 +31,11 @@ class AbstractBlockFileIO(AbstractFileIO):
     - get_block_sequence(self, head_start, next_head, fh)
     - get_blocks(self, token, fh)
     - gen_block_sequences(self, token, fh)
+    - get_block_index(self, input_file) -> array of offsets
+    - get_blocks_number(self, input_file) -> n
+    - get_block(self, input_file, n) -> item
+    - read_block_range(self, input_file, first, last) ~> item
+    - get_opener(self) -> ParallelOpener
     
     Inherited public properties:
     
@@ -49,21 +63,27 @@ class AbstractBlockFileIO(AbstractFileIO):
         
     """
 
+    chunk_size = 4 * 1024 * 1024
+
     def __init__(self, token, **args):
         """ Overrided. Set token velue."""
         super(AbstractBlockFileIO, self).__init__(**args)
         self.token = token
         self.wise_opener = self.get_opener()
 
+    def get_opener(self):
+        """ Overrided. BGZF files are inflated on a thread pool."""
+        return ParallelOpener
+
     def read_from_file(self, input_file):
         """ Overrided. Read data from given input_file."""
-        with self.wise_opener(input_file, "r") as fh:
+        with self.wise_opener(input_file, "rb") as fh:
             for head, body, start, next in self.gen_block_sequences(self.token, fh):
                 self.data.append((head, body, start, next))
 
     def read_online(self, input_file):
         """ Overrided. Yield items from data online from input_file."""
-        with self.wise_opener(input_file, "r") as fh:
+        with self.wise_opener(input_file, "rb") as fh:
             for head, body, start, next in self.gen_block_sequences(self.token, fh):
                 yield (head, body, start, next)
 
@@ -85,22 +105,23 @@ class AbstractBlockFileIO(AbstractFileIO):
         """
         head_start = int(head_start)
         next_head = int(next_head)
-        sequence = ""
         fh.seek(head_start)
-        pos = head_start
+        head = fh.readline()
+        lines = []
         if next_head:
-            head = fh.readline()
             pos = fh.tell()
-            while pos != next_head:
-                temp_seq = fh.readline()
+            while pos < next_head:
+                line = fh.readline()
+                if not line:
+                    break
+                lines.append(line)
                 pos = fh.tell()
-                if pos != next_head:
-                    sequence += temp_seq
-            sequence += temp_seq
         else:
-            head = fh.readline()
-            fasta_list = fh.readlines()
-            sequence = "".join(fasta_list)
+            lines = fh.readlines()
+        if isinstance(head, bytes):
+            head = self._decode_block_data(head)
+            lines = [self._decode_block_data(line) for line in lines]
+        sequence = "".join(lines)
         return (head, sequence, head_start, next_head)
 
     def get_blocks(self, token, fh):
@@ -116,25 +137,16 @@ class AbstractBlockFileIO(AbstractFileIO):
         """
         fh.seek(0)
         header_start_list = []
-        here = 0
-        wrong = 0
-        start = -1
-        while fh:
-            here = fh.tell()
-            line = fh.readline()
-            if len(line) == 0:
-                header_start_list.append((start, 0))
-                break
-            if line.startswith(token):
-                if start == -1:
-                    start = here
-                else:
-                    header_start_list.append((start, here))
-                    start = here
+        for buf, start, end, offset, eof in self._iter_raw_blocks(token, fh):
+            if eof:
+                header_start_list.append((offset + start, 0))
+            else:
+                header_start_list.append((offset + start, offset + end))
         return header_start_list
 
     def gen_block_sequences(self, token, fh):
         """ Yield (head, seq, head_start, head_end) tuplefor given fh for open file.
+        The file is read once by large chunks, block boundaries are lines starting with token.
         
         Arguments:
         
@@ -149,7 +161,169 @@ class AbstractBlockFileIO(AbstractFileIO):
         - head_end   -- a file pointer to next block start or 0
         
         """
-        header_start_list = self.get_blocks(token, fh)
-        for x, y in header_start_list:
-            # yeild sequence by coordinates 
-            yield self.get_block_sequence(x, y, fh)
\ No newline at end of file
+        for buf, start, end, offset, eof in self._iter_raw_blocks(token, fh):
+            yield self._make_block(buf, start, end, offset, eof)
+
+    def get_block_index(self, input_file):
+        """ Return array of block offsets [start_0, next_0, start_1, next_1, ...]
+        in get_blocks format. Offsets are saved to the input_file.blocks sidecar
+        keyed by file size and mtime and are reused until the file changes.
+        """
+        stat = os.stat(input_file)
+        key = (input_file, stat.st_size, stat.st_mtime_ns, self.token)
+        if getattr(self, "_block_index_key", None) == key:
+            return self._block_index
+        index_file = input_file + BLOCK_INDEX_SUFFIX
+        offsets = self._load_block_index(index_file, stat.st_size, stat.st_mtime_ns)
+        if offsets is None:
+            offsets = array.array("Q")
+            with self.wise_opener(input_file, "rb") as fh:
+                for buf, start, end, offset, eof in self._iter_raw_blocks(self.token, fh):
+                    offsets.append(offset + start)
+                    offsets.append(0 if eof else offset + end)
+            self._save_block_index(index_file, offsets, stat.st_size, stat.st_mtime_ns)
+        self._block_index_key = key
+        self._block_index = offsets
+        return offsets
+
+    def get_blocks_number(self, input_file):
+        """ Return a number of blocks in input_file."""
+        return len(self.get_block_index(input_file)) // 2
+
+    def get_block(self, input_file, n):
+        """ Return n-th block (head, body, start, next) from input_file."""
+        for item in self.read_block_range(input_file, n, n + 1):
+            return item
+        raise IndexError("Block %s out of range in %s" % (n, input_file))
+
+    def read_block_range(self, input_file, first, last):
+        """ Yield blocks from first to last (not included) from input_file.
+        Useful to split a huge file into shards by block number.
+        """
+        offsets = self.get_block_index(input_file)
+        last = min(last, len(offsets) // 2)
+        if first < 0 or first >= last:
+            return
+        with self.wise_opener(input_file, "rb") as fh:
+            fh.seek(offsets[2 * first])
+            for i in range(first, last):
+                start = offsets[2 * i]
+                next = offsets[2 * i + 1]
+                if next:
+                    data = fh.read(next - start)
+                else:
+                    data = fh.read()
+                yield self._make_block(data, 0, len(data), start, not next)
+
+    def _load_block_index(self, index_file, file_size, file_mtime):
+        """ Read block offsets from sidecar or return None if it is absent or outdated."""
+        if not os.path.isfile(index_file):
+            return None
+        token = self.token
+        if not isinstance(token, bytes):
+            token = token.encode("utf8")
+        header_format = "<4sIQQI%dsQ" % len(token)
+        header_size = struct.calcsize(header_format)
+        with open(index_file, "rb") as fh:
+            header = fh.read(header_size)
+            if len(header) != header_size:
+                return None
+            magic, version, size, mtime, token_length, saved_token, n = struct.unpack(header_format, header)
+            if magic != BLOCK_INDEX_MAGIC or version != BLOCK_INDEX_VERSION:
+                return None
+            if size != file_size or mtime != file_mtime or token_length != len(token) or saved_token != token:
+                return None
+            offsets = array.array("Q")
+            try:
+                offsets.fromfile(fh, 2 * n)
+            except EOFError:
+                return None
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        return offsets
+
+    def _save_block_index(self, index_file, offsets, file_size, file_mtime):
+        """ Save block offsets to sidecar, skip if it isn't possible."""
+        token = self.token
+        if not isinstance(token, bytes):
+            token = token.encode("utf8")
+        header = struct.pack("<4sIQQI%dsQ" % len(token),
+                             BLOCK_INDEX_MAGIC,
+                             BLOCK_INDEX_VERSION,
+                             file_size,
+                             file_mtime,
+                             len(token),
+                             token,
+                             len(offsets) // 2)
+        data = offsets
+        if sys.byteorder == "big":
+            data = array.array("Q", offsets)
+            data.byteswap()
+        try:
+            with open(index_file, "wb") as fw:
+                fw.write(header)
+                data.tofile(fw)
+        except (IOError, OSError) as e:
+            print("Can't save block index %s: %s" % (index_file, e))
+
+    def _make_block(self, buf, start, end, offset, eof):
+        """ Split raw buffer[start:end] to (head, body, start, next) item."""
+        head_end = buf.find(b"\n", start, end)
+        if head_end == -1:
+            head_end = end
+        else:
+            head_end += 1
+        head = self._decode_block_data(buf[start:head_end])
+        body = self._decode_block_data(buf[head_end:end])
+        if eof:
+            return (head, body, offset + start, 0)
+        return (head, body, offset + start, offset + end)
+
+    def _decode_block_data(self, data):
+        """ Convert raw bytes to text with universal newlines."""
+        data = data.decode("utf8", "replace")
+        if "\r" in data:
+            data = data.replace("\r\n", "\n")
+        return data
+
+    def _iter_raw_blocks(self, token, fh):
+        """ Single pass scanner over fh, yield (buffer, start, end, offset, is_last)
+        where buffer[start:end] is a raw block and offset is the file position of buffer[0].
+        The buffer is valid only until the next item is requested.
+        """
+        if not isinstance(token, bytes):
+            token = token.encode("utf8")
+        separator = b"\n" + token
+        # fake newline before the first byte lets to find a token at the file start
+        buf = bytearray(b"\n")
+        offset = -1
+        start = None
+        scan = 0
+        while True:
+            chunk = fh.read(self.chunk_size)
+            if not chunk:
+                break
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode("utf8")
+            buf.extend(chunk)
+            while True:
+                i = buf.find(separator, scan)
+                if i == -1:
+                    break
+                if start is not None:
+                    yield buf, start, i + 1, offset, False
+                start = i + 1
+                scan = start
+            # drop already processed data, keep a tail for a separator split between chunks
+            shift = len(buf) - len(separator) + 1
+            if start is not None:
+                shift = start
+            if shift > 0:
+                del buf[:shift]
+                offset += shift
+                if start is not None:
+                    start = 0
+            # the next chunk is scanned only from the kept tail, also when the block is still open
+            scan = max(len(buf) - len(separator) + 1, 0)
+        if start is not None:
+            yield buf, start, len(buf), offset, True
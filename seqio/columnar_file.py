@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Columnar binary format for TRs datasets (and other AbstractModel tables).
+
+Each dumpable attribute is stored as a separate column:
+numeric columns as little-endian int64/float64 arrays,
+other columns as offsets into utf8 string heap.
+The file is memory-mapped, so numeric columns are read without
+creating per-row objects.
+
+Classes:
+
+- ColumnarFile(object)
+
+Shortcuts:
+
+- sc_tab_to_columnar(tab_file, columnar_file, data_type=TRModel) -> n
+- sc_columnar_to_tab(columnar_file, tab_file, data_type=TRModel) -> n
+- sc_iter_columnar_file(columnar_file, data_type=TRModel) ~> obj
+- sc_is_columnar_file(file_name) -> bool
+- sc_get_rows_number(file_name) -> n
+
+File format (little-endian):
+
+- header     -- b"TRCF", version (uint32), rows (uint64), columns (uint32)
+- columns    -- name length (uint16), name, kind (b"q", b"d" or b"s"), offset (uint64), size (uint64)
+- data       -- 8-byte aligned column data, string column is rows+1 offsets followed by heap
+
+String column kind is b"s" for uint32 offsets and b"S" for uint64 offsets (heap over 4 Gb).
+"""
+import os
+import csv
+import mmap
+import array
+import struct
+import sys
+from PyExp import AbstractModel
+from trseeker.models.trf_model import TRModel
+
+COLUMNAR_MAGIC = b"TRCF"
+COLUMNAR_VERSION = 1
+COLUMN_INT = b"q"
+COLUMN_FLOAT = b"d"
+COLUMN_STRING = b"s"
+COLUMN_LARGE_STRING = b"S"
+STRING_KINDS = (COLUMN_STRING, COLUMN_LARGE_STRING)
+
+csv.field_size_limit(1000000000)
+
+
+class _ColumnBuilder(object):
+    """ Accumulate column values, numeric column turns to string column
+    if a value can't be converted.
+    """
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        if kind == COLUMN_STRING:
+            self._to_strings(array.array("q"))
+        else:
+            self.values = array.array(kind.decode("ascii"))
+
+    def _to_strings(self, values):
+        self.kind = COLUMN_STRING
+        self.offsets = array.array("Q", [0])
+        self.heap = bytearray()
+        for value in values:
+            self.add_string(str(value))
+
+    def add_string(self, value):
+        self.heap += value.encode("utf8")
+        self.offsets.append(len(self.heap))
+
+    def add(self, value):
+        if self.kind == COLUMN_STRING:
+            self.add_string(value)
+            return
+        try:
+            if self.kind == COLUMN_INT:
+                self.values.append(int(value))
+            else:
+                self.values.append(float(value))
+        except (ValueError, OverflowError):
+            self._to_strings(self.values)
+            self.values = None
+            self.add_string(value)
+
+    def get_bytes(self):
+        if self.kind == COLUMN_STRING:
+            if len(self.heap) < 2**32:
+                offsets = array.array("I", self.offsets)
+            else:
+                self.kind = COLUMN_LARGE_STRING
+                offsets = self.offsets
+            if sys.byteorder != "little":
+                offsets = array.array(offsets.typecode, offsets)
+                offsets.byteswap()
+            return offsets.tobytes() + bytes(self.heap)
+        values = self.values
+        if sys.byteorder != "little":
+            values = array.array(values.typecode, values)
+            values.byteswap()
+        return values.tobytes()
+
+
+def _get_column_kind(data_type, name):
+    if name in data_type.int_attributes:
+        return COLUMN_INT
+    if name in data_type.float_attributes:
+        return COLUMN_FLOAT
+    return COLUMN_STRING
+
+
+def _write_columns(columnar_file, n, builders):
+    """ Write header and aligned columns data."""
+    header_size = struct.calcsize("<4sIQI")
+    for builder in builders:
+        header_size += struct.calcsize("<H") + len(builder.name.encode("utf8")) + struct.calcsize("<cQQ")
+    offset = (header_size + 7) // 8 * 8
+    header = [struct.pack("<4sIQI", COLUMNAR_MAGIC, COLUMNAR_VERSION, n, len(builders))]
+    chunks = []
+    for builder in builders:
+        data = builder.get_bytes()
+        name = builder.name.encode("utf8")
+        header.append(struct.pack("<H", len(name)) + name + struct.pack("<cQQ", builder.kind, offset, len(data)))
+        padding = (len(data) + 7) // 8 * 8 - len(data)
+        chunks.append(data + b"\0" * padding)
+        offset += len(data) + padding
+    header = b"".join(header)
+    with open(columnar_file, "wb") as fw:
+        fw.write(header)
+        fw.write(b"\0" * ((len(header) + 7) // 8 * 8 - len(header)))
+        for chunk in chunks:
+            fw.write(chunk)
+
+
+def sc_tab_to_columnar(tab_file, columnar_file, data_type=TRModel):
+    """ Convert tab-delimited dataset of data_type objects to columnar file.
+    Return a number of rows.
+    """
+    names = data_type.dumpable_attributes
+    builders = [_ColumnBuilder(name, _get_column_kind(data_type, name)) for name in names]
+    m = len(names)
+    n = 0
+    with open(tab_file) as fh:
+        for data in csv.reader(fh, delimiter='\t', quoting=csv.QUOTE_NONE):
+            if not data:
+                continue
+            if len(data) < m:
+                data = data + ["None"] * (m - len(data))
+            for builder, value in zip(builders, data):
+                builder.add(value)
+            n += 1
+    _write_columns(columnar_file, n, builders)
+    return n
+
+
+def sc_columnar_to_tab(columnar_file, tab_file, data_type=TRModel):
+    """ Convert columnar file to tab-delimited file, return a number of rows."""
+    n = 0
+    with ColumnarFile(columnar_file, data_type=data_type) as reader:
+        with open(tab_file, "w") as fw:
+            for obj in reader.iter_objs():
+                fw.write(str(obj))
+                n += 1
+    return n
+
+
+def sc_is_columnar_file(file_name):
+    """ Check magic bytes of file."""
+    if not os.path.isfile(file_name):
+        return False
+    with open(file_name, "rb") as fh:
+        return fh.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+
+
+def sc_get_rows_number(file_name):
+    """ Return a number of rows in columnar or tab-delimited file
+    without parsing rows.
+    """
+    if sc_is_columnar_file(file_name):
+        with open(file_name, "rb") as fh:
+            return struct.unpack("<4sIQI", fh.read(struct.calcsize("<4sIQI")))[2]
+    n = 0
+    last = b"\n"
+    with open(file_name, "rb") as fh:
+        while True:
+            chunk = fh.read(4 * 1024 * 1024)
+            if not chunk:
+                break
+            n += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        n += 1
+    return n
+
+
+def sc_iter_columnar_file(columnar_file, data_type=TRModel):
+    """ Iter over columnar file, yield an object of given data_type."""
+    with ColumnarFile(columnar_file, data_type=data_type) as reader:
+        for obj in reader.iter_objs():
+            yield obj
+
+
+class ColumnarFile(object):
+    """ Memory-mapped reader of columnar dataset file.
+
+    Public methods:
+
+    - get_column(self, name, convert=False) -> typed memoryview or [str,]
+    - get_value(self, name, i) -> value
+    - get_column_kind(self, name) -> b"q", b"d" or b"s"
+    - get_obj(self, i) -> obj
+    - iter_objs(self, rows=None) ~> obj
+    - iter_rows(self, names, rows=None) ~> (value,)
+    - close(self)
+
+    Numeric columns are zero-copy views:
+
+    >>> with ColumnarFile("trs.trc") as reader:
+    >>>     periods = reader.get_column("trf_period")
+    >>>     rows = [i for i, x in enumerate(periods) if x > 100]
+    >>>     for trf_obj in reader.iter_objs(rows):
+    >>>         print(trf_obj.trf_id)
+    """
+
+    def __init__(self, file_name, data_type=TRModel):
+        self.file_name = file_name
+        self.data_type = data_type
+        self.fh = open(file_name, "rb")
+        self.mm = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mm)
+        magic, version, self.n, n_columns = struct.unpack_from("<4sIQI", self.mm, 0)
+        if magic != COLUMNAR_MAGIC:
+            self.close()
+            raise Exception("Not a columnar file: %s" % file_name)
+        if version != COLUMNAR_VERSION:
+            self.close()
+            raise Exception("Unsupported columnar file version %s: %s" % (version, file_name))
+        pos = struct.calcsize("<4sIQI")
+        self.names = []
+        self.name2column = {}
+        for i in range(n_columns):
+            name_length = struct.unpack_from("<H", self.mm, pos)[0]
+            pos += 2
+            name = bytes(self.mm[pos:pos + name_length]).decode("utf8")
+            pos += name_length
+            kind, offset, size = struct.unpack_from("<cQQ", self.mm, pos)
+            pos += struct.calcsize("<cQQ")
+            self.names.append(name)
+            self.name2column[name] = (kind, offset, size)
+        self._cache = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.n
+
+    def get_column_kind(self, name):
+        """ Return b"q" for int, b"d" for float and b"s" for string column."""
+        kind = self.name2column[name][0]
+        if kind in STRING_KINDS:
+            return COLUMN_STRING
+        return kind
+
+    def _get_view(self, name):
+        """ Return typed view for numeric column or (offsets, heap_start) for string column."""
+        if name in self._cache:
+            return self._cache[name]
+        kind, offset, size = self.name2column[name]
+        if kind in STRING_KINDS:
+            typecode = "I" if kind == COLUMN_STRING else "Q"
+            offsets_size = (self.n + 1) * struct.calcsize("<" + typecode)
+            offsets = self.buffer[offset:offset + offsets_size].cast(typecode)
+            if sys.byteorder != "little":
+                offsets = array.array(typecode, offsets.tobytes())
+                offsets.byteswap()
+            view = (offsets, offset + offsets_size)
+        else:
+            view = self.buffer[offset:offset + size].cast(kind.decode("ascii"))
+            if sys.byteorder != "little":
+                view = array.array(kind.decode("ascii"), view.tobytes())
+                view.byteswap()
+        self._cache[name] = view
+        return view
+
+    def get_column(self, name, convert=False):
+        """ Return numeric column as typed memoryview or string column as list.
+        Values of string columns are returned as they are in tab file,
+        with convert=True they are converted as in set_with_dict.
+        """
+        kind = self.get_column_kind(name)
+        if kind != COLUMN_STRING:
+            return self._get_view(name)
+        if convert:
+            getter = self._get_getter(name)
+            return [getter(i) for i in range(self.n)]
+        offsets, heap_start = self._get_view(name)
+        mm = self.mm
+        return [mm[heap_start + offsets[i]:heap_start + offsets[i + 1]].decode("utf8") for i in range(self.n)]
+
+    def _has_preprocess(self):
+        """ Check that data_type overrides preprocess_pair."""
+        return getattr(self.data_type, "preprocess_pair", None) is not AbstractModel.preprocess_pair
+
+    def _uses_set_with_dict(self):
+        """ Check that objects should be set with set_with_dict:
+        data_type has own preprocess_pair or list attributes among columns.
+        """
+        return self._has_preprocess() or bool(set(self.data_type.list_attributes) & set(self.names))
+
+    def _get_raw_getter(self, name):
+        """ Return function i -> value as text of tab file."""
+        if self.name2column[name][0] not in STRING_KINDS:
+            view = self._get_view(name)
+            return lambda i: str(view[i])
+        offsets, heap_start = self._get_view(name)
+        mm = self.mm
+
+        def get_string(i):
+            return mm[heap_start + offsets[i]:heap_start + offsets[i + 1]].decode("utf8")
+        return get_string
+
+    def _get_getter(self, name):
+        """ Return function i -> value with the same conversion as in set_with_dict."""
+        preprocess = self.data_type().preprocess_pair if self._has_preprocess() else None
+        if self.name2column[name][0] not in STRING_KINDS and preprocess is None:
+            return self._get_view(name).__getitem__
+        get_raw = self._get_raw_getter(name)
+        data_type = self.data_type
+
+        def get_value(i):
+            key, value = name, get_raw(i)
+            if preprocess is not None:
+                key, value = preprocess(key, value)
+            if value == "None" or value is None:
+                return None
+            if key in data_type.int_attributes:
+                return int(value)
+            if key in data_type.float_attributes:
+                return float(value)
+            if key in data_type.list_attributes:
+                if not value:
+                    return []
+                return [data_type.list_attributes_types[key](x) for x in value.split(",")]
+            return value
+        return get_value
+
+    def get_value(self, name, i):
+        """ Return value of i-th row with the same conversion as in set_with_dict."""
+        return self._get_getter(name)(i)
+
+    def get_obj(self, i):
+        """ Return i-th row as data_type object."""
+        if i < 0:
+            i += self.n
+        if i < 0 or i >= self.n:
+            raise IndexError("Row %s out of %s rows" % (i, self.n))
+        for obj in self.iter_objs([i]):
+            return obj
+
+    def iter_objs(self, rows=None):
+        """ Yield data_type objects for all rows or for given row numbers.
+        Objects of models with list attributes or own preprocess_pair
+        are set with set_with_dict from text values.
+        """
+        names = self.names
+        if self._uses_set_with_dict():
+            getters = [self._get_raw_getter(name) for name in names]
+            for values in self._iter_values(getters, rows):
+                obj = self.data_type()
+                obj.set_with_dict(dict(zip(names, values)))
+                yield obj
+            return
+        getters = [self._get_getter(name) for name in names]
+        for values in self._iter_values(getters, rows):
+            obj = self.data_type()
+            obj.__dict__.update(zip(names, values))
+            yield obj
+
+    def iter_rows(self, names, rows=None):
+        """ Yield tuples of values of given columns without creating objects."""
+        getters = [self._get_getter(name) for name in names]
+        for values in self._iter_values(getters, rows):
+            yield values
+
+    def _iter_values(self, getters, rows=None):
+        if rows is None:
+            rows = range(self.n)
+        for i in rows:
+            yield tuple([getter(i) for getter in getters])
+
+    def close(self):
+        """ Close file, if column views are still referenced
+        the memory map is closed when they are released.
+        """
+        self._cache = {}
+        try:
+            if getattr(self, "buffer", None) is not None:
+                self.buffer.release()
+            if self.mm is not None:
+                self.mm.close()
+        except BufferError:
+            pass
+        self.buffer = None
+        self.mm = None
+        if self.fh:
+            self.fh.close()
+            self.fh = None
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Random access to fasta files with samtools compatible .fai index.
+
+Classes:
+
+- FastaIndex(object)
+- FastaContig(object)
+
+Shortcuts:
+
+- sc_build_fasta_index(fasta_file, fai_file=None) -> fai_file
+- sc_read_fasta_index(fai_file) -> [(name, length, offset, linebases, linewidth),]
+
+Index format (tab-delimited, one line per sequence):
+
+- name       -- the first word of the fasta header
+- length     -- sequence length in bases
+- offset     -- byte offset of the first base
+- linebases  -- bases per sequence line
+- linewidth  -- bytes per sequence line including newline
+"""
+import os
+import mmap
+
+
+def sc_build_fasta_index(fasta_file, fai_file=None):
+    """ Build .fai index for given uncompressed fasta_file and return index file name.
+    All sequence lines of a record, except the last one, should have the same length.
+    """
+    if not fai_file:
+        fai_file = fasta_file + ".fai"
+    records = []
+    name = None
+    with open(fasta_file, "rb") as fh:
+        pos = 0
+        for line in fh:
+            line_start = pos
+            pos += len(line)
+            if line.startswith(b">"):
+                if name is not None:
+                    records.append((name, length, offset, linebases, linewidth))
+                name = line[1:].split()[0].decode("utf8") if line[1:].strip() else ""
+                length = 0
+                offset = pos
+                linebases = 0
+                linewidth = 0
+                short_line = False
+                continue
+            if name is None:
+                if line.strip():
+                    raise Exception("Wrong fasta file %s: sequence before the first header" % fasta_file)
+                continue
+            bases = len(line.rstrip(b"\r\n"))
+            if not bases:
+                short_line = True
+                continue
+            if short_line or (linebases and bases > linebases):
+                raise Exception("Different line length in sequence %s at byte %s" % (name, line_start))
+            if not linebases:
+                linebases = bases
+                linewidth = len(line)
+            elif bases < linebases:
+                short_line = True
+            length += bases
+        if name is not None:
+            records.append((name, length, offset, linebases, linewidth))
+    with open(fai_file, "w") as fw:
+        for record in records:
+            fw.write("%s\n" % "\t".join(map(str, record)))
+    return fai_file
+
+
+def sc_read_fasta_index(fai_file):
+    """ Read .fai index file, return list of (name, length, offset, linebases, linewidth)."""
+    result = []
+    with open(fai_file) as fh:
+        for line in fh:
+            data = line.strip("\n").split("\t")
+            if len(data) < 5:
+                continue
+            result.append((data[0], int(data[1]), int(data[2]), int(data[3]), int(data[4])))
+    return result
+
+
+class FastaContig(object):
+    """ Lazy sequence of one fasta record, supports len() and slicing.
+
+    >>> index = FastaIndex("genome.fa")
+    >>> index["chr1"][1000:1100]
+    """
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+
+    def __len__(self):
+        return self.index.get_length(self.name)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if item.step not in (None, 1):
+                return self.index.fetch(self.name)[item]
+            start, end, step = item.indices(len(self))
+            return self.index.fetch(self.name, start, end)
+        n = len(self)
+        if item < 0:
+            item += n
+        if item < 0 or item >= n:
+            raise IndexError("Position %s out of %s" % (item, self.name))
+        return self.index.fetch(self.name, item, item + 1)
+
+    def __str__(self):
+        return self.index.fetch(self.name)
+
+
+class FastaIndex(object):
+    """ Memory-mapped random access to fasta file via .fai index.
+    The index is built if it is absent or older than the fasta file.
+
+    Public methods:
+
+    - fetch(self, name, start=0, end=None) -> sequence
+    - get_length(self, name) -> length
+    - keys(self) -> [name,]
+    - close(self)
+
+    Coordinates are zero-based and half-open like python slices,
+    so it can replace chr2seq dictionary:
+
+    >>> genome = FastaIndex("genome.fa")
+    >>> genome["chr1"][start:end]
+    """
+
+    def __init__(self, fasta_file, fai_file=None, build=True):
+        if fasta_file.endswith(".gz"):
+            raise Exception("Random access to gzipped fasta isn't supported: %s" % fasta_file)
+        self.fasta_file = fasta_file
+        if not fai_file:
+            fai_file = fasta_file + ".fai"
+        self.fai_file = fai_file
+        if build:
+            if not os.path.isfile(fai_file) or os.path.getmtime(fai_file) < os.path.getmtime(fasta_file):
+                sc_build_fasta_index(fasta_file, fai_file)
+        self.names = []
+        self.name2record = {}
+        for record in sc_read_fasta_index(fai_file):
+            self.names.append(record[0])
+            self.name2record[record[0]] = record
+        self.fh = open(fasta_file, "rb")
+        self.mm = None
+        if os.path.getsize(fasta_file):
+            self.mm = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.name2record
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __getitem__(self, name):
+        if not name in self.name2record:
+            raise KeyError(name)
+        return FastaContig(self, name)
+
+    def keys(self):
+        return list(self.names)
+
+    def get_length(self, name):
+        return self.name2record[name][1]
+
+    def _get_byte_position(self, record, pos):
+        name, length, offset, linebases, linewidth = record
+        if not linebases:
+            return offset
+        return offset + (pos // linebases) * linewidth + pos % linebases
+
+    def fetch(self, name, start=0, end=None):
+        """ Return sequence[start:end] for given sequence name."""
+        record = self.name2record[name]
+        length = record[1]
+        if end is None or end > length:
+            end = length
+        if start < 0:
+            start = 0
+        if start >= end:
+            return ""
+        byte_start = self._get_byte_position(record, start)
+        byte_end = self._get_byte_position(record, end - 1) + 1
+        data = self.mm[byte_start:byte_end]
+        return data.replace(b"\n", b"").replace(b"\r", b"").decode("utf8")
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.fh:
+            self.fh.close()
+            self.fh = None
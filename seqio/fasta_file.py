@@ -11,9 +11,13 @@ Classes:
   
 """
 import os
+import re
 import pickle
 from trseeker.seqio.block_file import AbstractBlockFileIO
 from trseeker.models.sequence_model import SequenceModel
+from trseeker.seqio.bgzf_file import sc_open
+
+FASTA_CHUNK_SIZE = 4 * 1024 * 1024
 
 
 class FastaFileIO(AbstractBlockFileIO):
@@ -65,78 +69,111 @@ def sc_iter_reads(file_name):
             yield seq_obj            
 
 
-def sc_iter_fasta(file_name, lower=False, protein=False, inmem=True, skip_clean=False):
-    """ Iter over fasta file."""
-    header = None
-    seq = []
-    with open(file_name) as fh:
-        data = fh
-        if inmem:
-            data = fh.readlines()
-        for line in data:
-            if line.startswith(">"):
-                if seq:
-                    sequence = "".join(seq)
-                    seq_obj = SequenceModel(lower=lower, protein=protein)
-                    seq_obj.set_ncbi_sequence(header, sequence, skip_clean=skip_clean)            
-                    yield seq_obj
-                header = line
-                seq = []
-                continue
-            seq.append(line)
-        if seq or header:
-            sequence = "".join(seq)
-            seq_obj = SequenceModel(lower=lower, protein=protein)
-            seq_obj.set_ncbi_sequence(header, sequence)            
-            yield seq_obj
+def sc_iter_fasta_records(file_name, chunk_size=FASTA_CHUNK_SIZE):
+    """ Iter over fasta file by large chunks and yield (header, sequence) tuples.
+    Header is the header line with '>' but without line end,
+    sequence is without whitespaces and isn't cleaned otherwise.
+    Memory is bounded by the longest record, not by the file size.
+    Text before the first header is yielded with None header.
+    """
+    pieces = []
+    in_record = False
+    after_newline = True
+    with sc_open(file_name, "rb") as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                break
+            pos = 0
+            while True:
+                if pos == 0 and after_newline and chunk.startswith(b">"):
+                    start = 0
+                else:
+                    start = chunk.find(b"\n>", pos)
+                    if start == -1:
+                        break
+                    start += 1
+                pieces.append(chunk[pos:start])
+                if in_record or _has_sequence(pieces):
+                    yield _make_fasta_record(in_record, pieces)
+                pieces = []
+                in_record = True
+                pos = start + 1
+            pieces.append(chunk[pos:])
+            after_newline = chunk.endswith(b"\n")
+    if in_record or _has_sequence(pieces):
+        yield _make_fasta_record(in_record, pieces)
 
-def sc_iter_fasta_brute(file_name, inmem=False, lower=False):
-    """ Iter over fasta file."""
-    
+
+def _has_sequence(pieces):
+    """ Check that text before the first header isn't empty."""
+    return any(piece.strip() for piece in pieces)
+
+
+def _make_fasta_record(with_header, pieces):
+    """ Convert raw record text (after '>' token) to (header, sequence)."""
+    data = b"".join(pieces)
+    if with_header:
+        head, _, body = data.partition(b"\n")
+        head = (">" + head.decode("utf8", "replace")).strip()
+    else:
+        head = None
+        body = data
+    sequence = body.translate(None, b" \t\r\n\x0b\x0c").decode("utf8", "replace")
+    return head, sequence
+
+
+def _iter_fasta_lines(file_name):
+    """ Previous in memory reader, all lines are read before the first record."""
     header = None
     seq = []
-    with open(file_name) as fh:
-        if inmem:
-            data = fh.readlines()
-        else:
-            data = fh
-        for line in data:
-            if line.startswith(">"):
-                if seq or header:
-                    sequence = "".join(seq)
-                    if lower:
-                        sequence = sequence.lower()
-                    yield header, sequence
-                header = line.strip()
-                seq = []
-                continue
-            seq.append(line.strip())
-        if seq or header:
-            sequence = "".join(seq)
+    with sc_open(file_name) as fh:
+        data = fh.readlines()
+    for line in data:
+        if line.startswith(">"):
+            if header is not None or "".join(seq):
+                yield header, "".join(seq)
+            header = line.strip()
+            seq = []
+            continue
+        seq.append(re.sub(r"\s+", "", line))
+    if header is not None or "".join(seq):
+        yield header, "".join(seq)
+
+
+def sc_iter_fasta(file_name, lower=False, protein=False, inmem=False, skip_clean=False, as_tuples=False):
+    """ Iter over fasta file, yield SequenceModel objects
+    or (header, sequence) tuples if as_tuples is True.
+    By default file is streamed by chunks, inmem=True reads all lines first.
+    """
+    if inmem:
+        records = _iter_fasta_lines(file_name)
+    else:
+        records = sc_iter_fasta_records(file_name)
+    for header, sequence in records:
+        if as_tuples:
             if lower:
                 sequence = sequence.lower()
             yield header, sequence
+            continue
+        seq_obj = SequenceModel(lower=lower, protein=protein)
+        seq_obj.set_ncbi_sequence("%s\n" % (header or ""), sequence, skip_clean=skip_clean)
+        yield seq_obj
 
+def sc_iter_fasta_brute(file_name, inmem=False, lower=False):
+    """ Iter over fasta file, yield (header, sequence)."""
+    for header, sequence in sc_iter_fasta_records(file_name):
+        if lower:
+            sequence = sequence.lower()
+        yield header, sequence
 
-def sc_iter_fasta_for_refseq(file_name):
-    """ Iter over fasta file."""
 
-    header = None
-    seq = []
-    with open(file_name) as fh:
-        data = fh.readlines()
-        for line in data:
-            if line.startswith(">"):
-                if seq:
-                    sequence = "".join(seq)
-                    yield (header, sequence)
-                header = line.strip().split()[0][1:]
-                seq = []
-                continue
-            seq.append(line.upper().strip())
-        if seq or header:
-            sequence = "".join(seq)
-            yield (header, sequence)
+def sc_iter_fasta_for_refseq(file_name):
+    """ Iter over fasta file, yield (name, upper case sequence)."""
+    for header, sequence in sc_iter_fasta_records(file_name):
+        if header is None:
+            continue
+        yield (header.split()[0][1:], sequence.upper())
 
 def sc_iter_fasta_slow(file_name, lower=True, protein=False):
     """ Iter over fasta file."""
@@ -206,20 +243,8 @@ def sc_get_fasta_lengths(fasta_file):
 def sc_chr2seq_from_fasta(file_name):
     """ Iter over fasta file and return chr name to sequence."""
     chr2seq = {}
-    header = None
-    seq = []
-    with open(file_name) as fh:
-        data = fh.readlines()
-        for line in data:
-            if line.startswith(">"):
-                if seq:
-                    chr2seq[header] = "".join(seq)
-                header = line.strip().split()[0][1:]
-                seq = []
-                continue
-            seq.append(line.upper().strip())
-        if seq or header:
-            chr2seq[header] = "".join(seq)
+    for header, sequence in sc_iter_fasta_for_refseq(file_name):
+        chr2seq[header] = sequence
     return chr2seq
 
 
@@ -18,6 +18,7 @@ except:
     print("Not Bio installed")
 import random
 from PyExp import WiseOpener
+from trseeker.seqio.bgzf_file import ParallelOpener
 
 class FastqObj(object):
 
@@ -186,52 +187,151 @@ class FastqObj(object):
         for i in xrange(len(self.seq)-k+1):
             yield i, self.seq[i:i+k]
 
+class FastqRecord(object):
+    """ Lightweight fastq record.
+    It keeps a reference to the read buffer and offsets of lines,
+    strings are decoded only when the corresponding property is requested.
+    NB: a stored record keeps the whole read chunk in memory, use to_fastq_obj() to detach it.
+    """
+
+    __slots__ = ("buf", "head_start", "seq_start", "strain_start", "qual_start", "end", "_qv")
+
+    def __init__(self, buf, head_start, seq_start, strain_start, qual_start, end):
+        self.buf = buf
+        self.head_start = head_start
+        self.seq_start = seq_start
+        self.strain_start = strain_start
+        self.qual_start = qual_start
+        self.end = end
+        self._qv = None
+
+    @property
+    def head(self):
+        return self.buf[self.head_start:self.seq_start].decode("utf8", "replace").strip()
+
+    @property
+    def seq(self):
+        return self.buf[self.seq_start:self.strain_start].decode("utf8", "replace").strip()
+
+    @property
+    def strain(self):
+        return self.buf[self.strain_start:self.qual_start].decode("utf8", "replace").strip()
+
+    @property
+    def qual(self):
+        return self.buf[self.qual_start:self.end].decode("utf8", "replace").strip()
+
+    @property
+    def qv(self):
+        """ Phred33 quality values, decoded on the first access."""
+        if self._qv is None:
+            self._qv = [x - 33 for x in self.buf[self.qual_start:self.end].strip()]
+        return self._qv
+
+    @property
+    def sequence(self):
+        return self.seq
+
+    @property
+    def length(self):
+        return len(self.seq)
+
+    @property
+    def id(self):
+        return self.head.replace("#", " ").split()[0]
+
+    @property
+    def fasta(self):
+        return ">%s\n%s\n" % (self.head, self.seq)
+
+    @property
+    def fastq(self):
+        return "%s\n%s\n%s\n%s\n" % (self.head, self.seq.upper(), self.strain, self.qual)
+
+    def to_fastq_obj(self, phred33=False):
+        """ Return full FastqObj for this record."""
+        return FastqObj(self.head, self.seq, self.strain, self.qual, phred33=phred33)
+
+
 class PERun(object):
     pass
 
-def fastq_reader(fastq_file, phred33=False, head_pattern=None):
-    with WiseOpener(fastq_file) as fh:
+FASTQ_CHUNK_SIZE = 4 * 1024 * 1024
+
+def iter_fastq_records(fastq_file, head_pattern=None, chunk_size=FASTQ_CHUNK_SIZE):
+    """ Iterate over fastq file by large chunks and yield FastqRecord objects.
+    Raise Exception with a line number for malformed or truncated records.
+    """
+    if head_pattern:
+        head_pattern = re.compile(head_pattern)
+    line_number = 1
+    with ParallelOpener(fastq_file, "rb") as fh:
+        tail = b""
         while True:
-            try:
-                head = fh.readline()
-                if head == '':
+            chunk = fh.read(chunk_size)
+            eof = not chunk
+            buf = tail + chunk if tail else chunk
+            if eof and buf and not buf.endswith(b"\n"):
+                buf += b"\n"
+            n = len(buf)
+            pos = 0
+            while True:
+                # skip empty lines between records
+                while pos < n and buf[pos] in (10, 13):
+                    pos += 1
+                    line_number += 1
+                seq_start = buf.find(b"\n", pos) + 1
+                if not seq_start:
+                    break
+                strain_start = buf.find(b"\n", seq_start) + 1
+                if not strain_start:
+                    break
+                qual_start = buf.find(b"\n", strain_start) + 1
+                if not qual_start:
                     break
-                if head_pattern:
-                    if not re.match(head_pattern, head):
-                        continue
-                seq = fh.readline()
-                strain = fh.readline()
-                qual = fh.readline()
-                fastq_obj = FastqObj(head, seq, strain, qual, phred33=phred33)
-                yield fastq_obj
-            except:
+                end = buf.find(b"\n", qual_start)
+                if end == -1:
+                    break
+                if buf[pos] != 64 or buf[strain_start] != 43 or \
+                        strain_start - seq_start != end + 1 - qual_start:
+                    raise Exception("Malformed fastq record at line %s in %s: %s" % (
+                        line_number, fastq_file, buf[pos:seq_start].strip().decode("utf8", "replace")))
+                line_number += 4
+                record = FastqRecord(buf, pos, seq_start, strain_start, qual_start, end)
+                pos = end + 1
+                if head_pattern and not head_pattern.match(record.head):
+                    continue
+                yield record
+            tail = buf[pos:]
+            if eof:
+                if tail.strip():
+                    raise Exception("Truncated fastq record at line %s in %s" % (line_number, fastq_file))
                 break
 
-def fastq_pe_reader(fastq_file1, fastq_file2, phred33=False, head_pattern=None):
-    with WiseOpener(fastq_file1) as fh1:
-        with WiseOpener(fastq_file2) as fh2:
-            while True:
-                try:
-                    head1 = fh1.readline()
-                    head2 = fh2.readline()
-                    if head1 == '':
-                        break
-                    if head_pattern:
-                        if not re.match(head_pattern, head1):
-                            continue
-                    seq1 = fh1.readline()
-                    strain1 = fh1.readline()
-                    qual1 = fh1.readline()
-                    fastq_obj1 = FastqObj(head1, seq1, strain1, qual1, phred33=phred33)
-
-                    seq2 = fh2.readline()
-                    strain2 = fh2.readline()
-                    qual2 = fh2.readline()
-                    fastq_obj2 = FastqObj(head2, seq2, strain2, qual2, phred33=phred33)
+def fastq_reader(fastq_file, phred33=False, head_pattern=None):
+    for record in iter_fastq_records(fastq_file, head_pattern=head_pattern):
+        yield FastqObj(record.head, record.seq, record.strain, record.qual, phred33=phred33)
 
-                    yield fastq_obj1, fastq_obj2
-                except:
-                    break
+def fastq_pe_reader(fastq_file1, fastq_file2, phred33=False, head_pattern=None):
+    for record1, record2 in iter_fastq_pe_records(fastq_file1, fastq_file2, head_pattern=head_pattern):
+        fastq_obj1 = FastqObj(record1.head, record1.seq, record1.strain, record1.qual, phred33=phred33)
+        fastq_obj2 = FastqObj(record2.head, record2.seq, record2.strain, record2.qual, phred33=phred33)
+        yield fastq_obj1, fastq_obj2
+
+def iter_fastq_pe_records(fastq_file1, fastq_file2, head_pattern=None):
+    """ Yield pairs of FastqRecord objects from two fastq files."""
+    reader1 = iter_fastq_records(fastq_file1)
+    reader2 = iter_fastq_records(fastq_file2)
+    for record1 in reader1:
+        record2 = next(reader2, None)
+        if record2 is None:
+            raise Exception("File %s has less reads than %s" % (fastq_file2, fastq_file1))
+        if head_pattern:
+            if not re.match(head_pattern, record1.head):
+                continue
+        yield record1, record2
+    if next(reader2, None) is not None:
+        raise Exception("File %s has more reads than %s" % (fastq_file2, fastq_file1))
 
 def fastq_iter_seqs_pe(fastq_file1, fastq_file2):
     with WiseOpener(fastq_file1) as fh1:
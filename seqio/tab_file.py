@@ -14,6 +14,7 @@ import csv
 from PyExp import AbstractFileIO
 import tempfile
 import os
+from trseeker.seqio.columnar_file import sc_is_columnar_file, ColumnarFile
 
 csv.field_size_limit(1000000000)
 
@@ -108,7 +109,19 @@ class TabDelimitedFileIO(AbstractFileIO):
             fh.writelines(self._data)
 
 def sc_iter_tab_file(input_file, data_type, skip_starts_with=None, remove_starts_with=None, preprocess_function=None, check_function=None):
-    """ Iter over tab file, yield an object of given data_type."""
+    """ Iter over tab file, yield an object of given data_type.
+    Columnar files (see sc_tab_to_columnar) are read directly.
+    """
+    if sc_is_columnar_file(input_file):
+        if remove_starts_with or preprocess_function or check_function:
+            raise Exception("Line preprocessing isn't supported for columnar file %s" % input_file)
+        with ColumnarFile(input_file, data_type=data_type) as reader:
+            first = reader.names[0]
+            for obj in reader.iter_objs():
+                if skip_starts_with and str(getattr(obj, first)).startswith(skip_starts_with):
+                    continue
+                yield obj
+        return
 
     temp_file = tempfile.NamedTemporaryFile(delete=False)
     temp_file_name = temp_file.name
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+TRs dataset as NumPy columns: filtering with boolean masks,
+group-by counts and projection without TRModel objects.
+
+Classes:
+
+- TRDataset(object)
+
+Functions:
+
+- sc_write_selected_rows(file_name, output_file, mask, data_type=TRModel) -> number of rows
+
+Example:
+
+>>> dataset = TRDataset.load(trf_file, fields=["trf_chr", "trf_array_length"])
+>>> large = dataset.filter(dataset["trf_array_length"] > 3000)
+>>> chr2n = large.count_by("trf_chr")
+
+Filter without loading other columns into memory:
+
+>>> with TRDataset.load(trf_file, fields=["trf_array_length"]) as dataset:
+...     mask = dataset["trf_array_length"] > 3000
+>>> n = sc_write_selected_rows(trf_file, output_file, mask)
+"""
+import csv
+from collections import Counter
+import numpy
+from trseeker.models.trf_model import TRModel
+from trseeker.seqio.columnar_file import sc_is_columnar_file, ColumnarFile, COLUMN_INT, COLUMN_FLOAT
+
+csv.field_size_limit(1000000000)
+
+
+def _to_array(values, convert=None):
+    """ Return int64/float64 array for numeric values
+    and object array if there are None or strings.
+    """
+    if convert is int and not None in values:
+        return numpy.array(values, dtype=numpy.int64)
+    if convert is float and not None in values:
+        return numpy.array(values, dtype=numpy.float64)
+    result = numpy.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+class TRDataset(object):
+    """ Columns of TRs dataset (tab-delimited or columnar file).
+
+    Public properties:
+
+    - names -- loaded fields in file order
+
+    Public methods:
+
+    - load(cls, file_name, fields=None, data_type=TRModel) -> TRDataset
+    - filter(self, mask) -> TRDataset
+    - project(self, fields) -> TRDataset
+    - count_by(self, field, mask=None) -> {value: n}
+    - iter_rows(self, fields=None) ~> (value,)
+    - iter_objs(self) ~> obj
+    - write_to_file(self, output_file)
+    - close(self)
+
+    Columns of columnar file are loaded on the first access,
+    so filters over numeric fields read only these fields.
+    """
+
+    def __init__(self, columns, names=None, data_type=TRModel, reader=None, rows=None, n=None):
+        """ Create dataset from dictionary of field -> array.
+
+        Keyword arguments:
+
+        - names     -- field order, default is dumpable_attributes order
+        - reader    -- ColumnarFile for lazy columns
+        - rows      -- selected row numbers in reader
+        - n         -- number of rows if there are no columns
+        """
+        self.columns = dict(columns)
+        if names is None:
+            names = [x for x in data_type.dumpable_attributes if x in self.columns]
+        self.names = list(names)
+        self.data_type = data_type
+        self.reader = reader
+        self.rows = rows
+        if n is None:
+            if rows is not None:
+                n = len(rows)
+            elif reader is not None:
+                n = len(reader)
+            elif self.columns:
+                n = len(next(iter(self.columns.values())))
+            else:
+                n = 0
+        self.n = n
+
+    @classmethod
+    def load(cls, file_name, fields=None, data_type=TRModel):
+        """ Load given fields (all by default) from TRs file in one pass."""
+        if sc_is_columnar_file(file_name):
+            reader = ColumnarFile(file_name, data_type=data_type)
+            names = [x for x in reader.names if fields is None or x in fields]
+            return cls({}, names=names, data_type=data_type, reader=reader)
+        all_names = data_type.dumpable_attributes
+        if fields is None:
+            names = list(all_names)
+        else:
+            names = [x for x in all_names if x in fields]
+        unknown = [x for x in (fields or []) if not x in all_names]
+        if unknown:
+            raise Exception("Unknown fields: %s" % ", ".join(unknown))
+        positions = [all_names.index(x) for x in names]
+        converters = []
+        for name in names:
+            if name in data_type.int_attributes:
+                converters.append(int)
+            elif name in data_type.float_attributes:
+                converters.append(float)
+            else:
+                converters.append(None)
+        values = [[] for x in names]
+        with open(file_name) as fh:
+            for data in csv.reader(fh, delimiter='\t', quoting=csv.QUOTE_NONE):
+                if not data:
+                    continue
+                for column, pos, convert in zip(values, positions, converters):
+                    value = data[pos] if pos < len(data) else None
+                    if value == "None" or value is None:
+                        value = None
+                    elif convert is not None:
+                        value = convert(value)
+                    column.append(value)
+        columns = {}
+        for name, column, convert in zip(names, values, converters):
+            columns[name] = _to_array(column, convert)
+        n = len(values[0]) if values else None
+        return cls(columns, names=names, data_type=data_type, n=n)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, name):
+        """ Return column array."""
+        if not name in self.names:
+            raise KeyError(name)
+        if not name in self.columns:
+            kind = self.reader.get_column_kind(name)
+            if kind == COLUMN_INT:
+                column = numpy.frombuffer(self.reader.get_column(name), dtype="<i8")
+            elif kind == COLUMN_FLOAT:
+                column = numpy.frombuffer(self.reader.get_column(name), dtype="<f8")
+            else:
+                column = _to_array(self.reader.get_column(name, convert=True))
+            if self.rows is not None:
+                column = column[self.rows]
+            self.columns[name] = column
+        return self.columns[name]
+
+    def filter(self, mask):
+        """ Return dataset with rows selected by boolean mask or row numbers."""
+        mask = numpy.asarray(mask)
+        if mask.dtype == bool:
+            if len(mask) != self.n:
+                raise Exception("Mask length %s doesn't match dataset length %s" % (len(mask), self.n))
+            selected = numpy.flatnonzero(mask)
+        else:
+            selected = mask.astype(numpy.int64)
+        columns = {}
+        for name, column in self.columns.items():
+            columns[name] = column[selected]
+        rows = None
+        if self.reader is not None:
+            rows = selected if self.rows is None else self.rows[selected]
+        return TRDataset(columns, names=self.names, data_type=self.data_type,
+                         reader=self.reader, rows=rows, n=len(selected))
+
+    def project(self, fields):
+        """ Return dataset with given fields only."""
+        for name in fields:
+            if not name in self.names:
+                raise KeyError(name)
+        names = [x for x in self.names if x in fields]
+        columns = dict((x, self.columns[x]) for x in names if x in self.columns)
+        return TRDataset(columns, names=names, data_type=self.data_type,
+                         reader=self.reader, rows=self.rows, n=self.n)
+
+    def count_by(self, field, mask=None):
+        """ Return dictionary value -> number of rows (with mask if given)."""
+        column = self[field]
+        if mask is not None:
+            column = column[numpy.asarray(mask)]
+        if column.dtype == object:
+            return dict(Counter(column.tolist()))
+        values, counts = numpy.unique(column, return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+
+    def iter_rows(self, fields=None):
+        """ Yield tuples of python values of given fields (all loaded by default)."""
+        if fields is None:
+            fields = self.names
+        columns = [self[name].tolist() for name in fields]
+        for row in zip(*columns):
+            yield row
+
+    def iter_objs(self):
+        """ Yield data_type objects with loaded fields."""
+        for row in self.iter_rows():
+            obj = self.data_type()
+            obj.__dict__.update(zip(self.names, row))
+            yield obj
+
+    def write_to_file(self, output_file):
+        """ Write loaded fields to tab-delimited file in the same format as str(obj)."""
+        with open(output_file, "w") as fw:
+            for row in self.iter_rows():
+                fw.write("%s\n" % "\t".join([str(x).strip() for x in row]))
+
+    def close(self):
+        self.columns = {}
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+def sc_write_selected_rows(file_name, output_file, mask, data_type=TRModel):
+    """ Stream rows of TRs file (tab-delimited or columnar) selected by boolean mask
+    to tab-delimited output_file, rows of tab file are copied as they are.
+    Return number of written rows.
+    """
+    mask = numpy.asarray(mask, dtype=bool)
+    written = 0
+    with open(output_file, "w") as fw:
+        if sc_is_columnar_file(file_name):
+            reader = ColumnarFile(file_name, data_type=data_type)
+            try:
+                if len(mask) != len(reader):
+                    raise Exception("Mask length %s doesn't match dataset length %s" % (len(mask), len(reader)))
+                for obj in reader.iter_objs(numpy.flatnonzero(mask).tolist()):
+                    fw.write(str(obj))
+                    written += 1
+            finally:
+                reader.close()
+            return written
+        i = 0
+        with open(file_name) as fh:
+            for line in fh:
+                if not line.strip("\r\n"):
+                    continue
+                if i >= len(mask):
+                    raise Exception("Mask length %s is less than number of rows" % len(mask))
+                if mask[i]:
+                    fw.write(line if line.endswith("\n") else line + "\n")
+                    written += 1
+                i += 1
+        if i != len(mask):
+            raise Exception("Mask length %s doesn't match dataset length %s" % (len(mask), i))
+    return written
@@ -12,6 +12,8 @@ Classes:
 
 """
 import re, os
+import bisect
+from multiprocessing import Pool
 from trseeker.models.trf_model import TRModel
 from trseeker.seqio.block_file import AbstractBlockFileIO
 from trseeker.tools.sequence_tools import get_gc, remove_consensus_redundancy
@@ -33,12 +35,15 @@ class TRFFileIO(AbstractBlockFileIO):
     Public methods:
     
     - iter_parse(self, trf_file, filter=True)
-    - parse_to_file(self, file_path, output_path, trf_id=0) -> trf_id
+    - iter_parse_parallel(self, trf_file, filter=True, threads=4, shard_size=None)
+    - parse_to_file(self, file_path, output_path, trf_id=0, threads=1) -> trf_id
     
     Private methods:
     
+    - _parse_block(self, head, body, filter=True, trf_id=1)
     - _gen_data_line(self, data)
     - _filter_obj_set(self, obj_set)
+    - _remove_nested(self, obj_set)
     - _join_overlapped(self, obj1, obj2)
     
     Inherited public properties:
@@ -77,37 +82,67 @@ class TRFFileIO(AbstractBlockFileIO):
         """
         trf_id = 1
         for ii, (head, body, start, next) in enumerate(self.read_online(trf_file)):
-            head = head.replace("\t", " ")
-            obj_set = []
-            # print(" processing:", head)
-            n = body.count("\n")
-            for i, line in enumerate(self._gen_data_line(body)):
-                # print("   %s/%s" % (i,n), "\r", end=" ")
-                trf_obj = TRModel()
-                trf_obj.set_raw_trf(head, None, line)
-                obj_set.append(trf_obj)
-            # print(" filtering...")
-            if filter:
-                # Filter object set
-                trf_obj_set = self._filter_obj_set(obj_set)
-                obj_set = [x for x in trf_obj_set if x]
-            ### set trf_id
-            for trf_obj in obj_set:
-                trf_obj.trf_id = trf_id
-                trf_id += 1
-            # print(" fixing monomers...")
-            obj_set, variants2df = remove_consensus_redundancy(obj_set)
+            obj_set, trf_id = self._parse_block(head, body, filter=filter, trf_id=trf_id)
             yield obj_set
 
-    def parse_to_file(self, file_path, output_path, trf_id=0, project=None, verbose=True):
-        """ Parse trf file in tab delimited file."""
+    def _parse_block(self, head, body, filter=True, trf_id=1):
+        """ Parse, filter and fix monomers for one sequence block.
+        Return (obj_set, next trf_id).
+        """
+        head = head.replace("\t", " ")
+        obj_set = []
+        # print(" processing:", head)
+        for i, line in enumerate(self._gen_data_line(body)):
+            trf_obj = TRModel()
+            trf_obj.set_raw_trf(head, None, line)
+            obj_set.append(trf_obj)
+        # print(" filtering...")
+        if filter:
+            # Filter object set
+            trf_obj_set = self._filter_obj_set(obj_set)
+            obj_set = [x for x in trf_obj_set if x]
+        ### set trf_id
+        for trf_obj in obj_set:
+            trf_obj.trf_id = trf_id
+            trf_id += 1
+        # print(" fixing monomers...")
+        obj_set, variants2df = remove_consensus_redundancy(obj_set)
+        return obj_set, trf_id
+
+    def iter_parse_parallel(self, trf_file, filter=True, threads=4, shard_size=None):
+        """ Iterate over raw trf data and yield TRFObjs sets in file order.
+        Blocks are split into ranges by the block index and parsed in a process pool.
+        """
+        n = self.get_blocks_number(trf_file)
+        if not n:
+            return
+        if not shard_size:
+            shard_size = max(1, n // (threads * 4))
+        shards = [(trf_file, first, min(first + shard_size, n), filter) for first in range(0, n, shard_size)]
+        pool = Pool(threads)
+        try:
+            for obj_sets in pool.imap(_parse_trf_block_range, shards):
+                for obj_set in obj_sets:
+                    yield obj_set
+        finally:
+            pool.terminate()
+
+    def parse_to_file(self, file_path, output_path, trf_id=0, project=None, verbose=True, threads=1):
+        """ Parse trf file in tab delimited file.
+        With threads > 1 blocks are parsed in a process pool, output is the same as for the serial mode.
+        """
         if trf_id == 0:
             mode = "w"
         else:
             mode = "a"
+
+        if threads > 1:
+            trf_obj_sets = self.iter_parse_parallel(file_path, threads=threads)
+        else:
+            trf_obj_sets = self.iter_parse(file_path)
         
         with WiseOpener(output_path, mode) as fw:
-            for trf_obj_set in self.iter_parse(file_path):
+            for trf_obj_set in trf_obj_sets:
                 for trf_obj in trf_obj_set:
                     trf_obj.trf_id = trf_id
 
@@ -134,55 +169,9 @@ class TRFFileIO(AbstractBlockFileIO):
         # NB: I removed the overlaping part due to suspicious results.
         # Complex filter
         is_overlapping = False
-        n = len(obj_set)
 
         obj_set.sort(key=lambda x: (x.trf_l_ind, x.trf_r_ind))
-        for a in range(0, n):
-            # print("\t%s\%s" % (a,n), "\r", end=" ")
-
-            obj1 = obj_set[a]
-            if not obj1:
-                continue
-            for b in range(a + 1, n):
-                obj2 = obj_set[b]
-                if not obj2:
-                    continue
-                # a ------ 
-                # b ------
-                if obj1.trf_l_ind == obj2.trf_l_ind and obj1.trf_r_ind == obj2.trf_r_ind:
-                    # Check period
-                    if obj1.trf_pmatch >= obj2.trf_pmatch:
-                        obj_set[b] = None
-                        continue
-                    else:
-                        obj_set[a] = None
-                        continue
-                # a ------ ------  ------- 
-                # b ---       ---    ---
-                if obj1.trf_l_ind <= obj2.trf_l_ind and obj1.trf_r_ind >= obj2.trf_r_ind:
-                    obj_set[b] = None
-                    continue
-                # a ---       ---    ---
-                # b ------ ------  ------- 
-                if obj2.trf_l_ind <= obj1.trf_l_ind and obj2.trf_r_ind >= obj1.trf_r_ind:
-                    obj_set[a] = None
-                    continue
-                # a ------ 
-                # b    -----
-                if obj1.trf_r_ind > obj2.trf_l_ind and obj1.trf_r_ind < obj2.trf_r_ind:
-                    #TODO: move overlaping part in different place
-                    # is_overlapping = True
-                    # obj1.overlap = obj2.trf_id
-                    # obj2.overlap = obj1.trf_id
-                    continue
-                # a ------ 
-                # b                -----
-                if obj1.trf_r_ind < obj2.trf_l_ind:
-                    break
-                # a               ------ 
-                # b -----
-                if obj2.trf_r_ind < obj1.trf_l_ind:
-                    break
+        self._remove_nested(obj_set)
         obj_set = [a for a in obj_set if not a is None]
         n = len(obj_set)
 
@@ -247,6 +236,92 @@ class TRFFileIO(AbstractBlockFileIO):
         
         return obj_set
 
+    def _remove_nested(self, obj_set):
+        """ Set to None TRs nested in other TRs for obj_set sorted by (trf_l_ind, trf_r_ind).
+        Sweep over TRs by start with a min-tree of ends of still alive TRs,
+        so each removed TR costs O(log n) instead of a scan over all overlapping TRs.
+
+        Rules, a is before b in sorted order:
+
+        a ------     a ------ ------  -------     a ---
+        b ------     b ---       ---    ---       b ------
+        keep with    remove b                     remove a
+        max pmatch
+
+        Partially overlapping TRs are kept as is.
+        """
+        n = len(obj_set)
+        if n < 2:
+            return
+        starts = [x.trf_l_ind for x in obj_set]
+        ends = [x.trf_r_ind for x in obj_set]
+        size = 1
+        while size < n:
+            size *= 2
+        inf = float("inf")
+        tree = [inf] * (2 * size)
+        tree[size:size + n] = ends
+        for i in range(size - 1, 0, -1):
+            tree[i] = min(tree[2 * i], tree[2 * i + 1])
+
+        def remove(i):
+            obj_set[i] = None
+            i += size
+            tree[i] = inf
+            i //= 2
+            while i:
+                value = min(tree[2 * i], tree[2 * i + 1])
+                if tree[i] == value:
+                    break
+                tree[i] = value
+                i //= 2
+
+        def find_ended_before(lo, hi, cutoff):
+            """ Return index in [lo, hi) of alive TR with end <= cutoff or -1."""
+            lo += size
+            hi += size
+            left = []
+            right = []
+            while lo < hi:
+                if lo & 1:
+                    left.append(lo)
+                    lo += 1
+                if hi & 1:
+                    hi -= 1
+                    right.append(hi)
+                lo //= 2
+                hi //= 2
+            for node in left + right[::-1]:
+                if tree[node] <= cutoff:
+                    while node < size:
+                        node = 2 * node if tree[2 * node] <= cutoff else 2 * node + 1
+                    return node - size
+            return -1
+
+        for a in range(n):
+            obj1 = obj_set[a]
+            if obj1 is None:
+                continue
+            l_ind = starts[a]
+            r_ind = ends[a]
+            b = a + 1
+            # TRs with the same start
+            while b < n and starts[b] == l_ind:
+                obj2 = obj_set[b]
+                if obj2 is not None:
+                    if ends[b] == r_ind and obj1.trf_pmatch >= obj2.trf_pmatch:
+                        remove(b)
+                    elif obj_set[a] is not None:
+                        remove(a)
+                b += 1
+            # TRs starting inside a and ending before a end
+            hi = bisect.bisect_right(starts, r_ind, b)
+            while b < hi:
+                i = find_ended_before(b, hi, r_ind)
+                if i == -1:
+                    break
+                remove(i)
+
     def _join_overlapped(self, obj1, obj2):
         ''' Join overlapping sequences.'''
         obj1.trf_pmatch = int(obj1.trf_pmatch)
@@ -282,7 +357,17 @@ class TRFFileIO(AbstractBlockFileIO):
 
         return obj1
 
-def sc_parse_raw_trf_folder(trf_raw_folder, output_trf_file, project=None):
+def _parse_trf_block_range(args):
+    """ Pool worker: parse blocks from first to last (not included) of raw TRF file."""
+    trf_file, first, last, filter = args
+    reader = TRFFileIO()
+    result = []
+    for head, body, start, next in reader.read_block_range(trf_file, first, last):
+        obj_set, trf_id = reader._parse_block(head, body, filter=filter)
+        result.append(obj_set)
+    return result
+
+def sc_parse_raw_trf_folder(trf_raw_folder, output_trf_file, project=None, threads=1):
     """ Parse raw TRF output in given folder to output_trf_file."""
     reader = TRFFileIO()
     trf_id = 1
@@ -290,7 +375,7 @@ def sc_parse_raw_trf_folder(trf_raw_folder, output_trf_file, project=None):
         os.remove(output_trf_file)
     for file_path in sc_iter_filepath_folder(trf_raw_folder, mask="dat"):
         print("Start parse file %s..." % file_path)
-        trf_id = reader.parse_to_file(file_path, output_trf_file, trf_id=trf_id, project=project)
+        trf_id = reader.parse_to_file(file_path, output_trf_file, trf_id=trf_id, project=project, threads=threads)
 
 def sc_trf_to_fasta(trf_file, fasta_file):
     """ Convert TRF file to fasta file.
@@ -23,6 +23,7 @@ sys.path.append("/Users/akomissarov/Dropbox/workspace")
 from collections import defaultdict
 
 from trseeker.seqio.tab_file import sc_iter_tab_file, sc_iter_simple_tab_file
+from trseeker.seqio.columnar_file import sc_get_rows_number
 from trseeker.models.blast_model import BlastResultModel
 from trseeker.models.trf_model import TRModel
 import os
@@ -338,8 +339,7 @@ def blastn_search_for_trs(trf_large_file, db, annotation_self_folder, temp_file,
     @param is_huge_alpha: skip ALPHA families
     @return: None
     """
-    for n, u in enumerate(sc_iter_tab_file(trf_large_file, TRModel)):
-        pass
+    n = sc_get_rows_number(trf_large_file)
     
     alpha_sets = {}
     for i, u in enumerate(sc_iter_tab_file(trf_large_file, TRModel)):
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Persistent jellyfish 2 query workers.
+
+Each worker is a long-lived `jellyfish query -i db` process, the database is
+opened once and k-mers are streamed one per line to stdin, counts are read
+one per line from stdout. Pool splits a batch of k-mers into chunks sent
+to all workers before reading answers, so workers query in parallel.
+Pools are cached by (location, db_file, workers, mtime of db_file), so a database
+rebuilt at the same path gets new workers, and pools are closed at exit.
+Stderr of a worker goes to a temporary file, so warnings can't fill a pipe
+and block the worker.
+
+query_kmer_counts canonicalizes a batch of k-mers of any length once,
+queries each distinct k-mer once and returns counts aligned with the batch.
+
+- is_jellyfish2_db(db_file) -> bool
+- get_canonical_kmers(kmers) -> bytes array
+- JellyfishQueryWorker(db_file, location)
+- JellyfishQueryPool(db_file, location, workers=1, chunk_size=1000)
+- get_query_pool(db_file, location, workers=1) -> JellyfishQueryPool
+- close_query_pools()
+- query_kmer_counts(db_file, kmers, location, workers=1, both_strands=True) -> int64 array
+"""
+import os
+import atexit
+import shlex
+import subprocess
+import tempfile
+import numpy
+
+JELLYFISH_QUERY_CHUNK = 1000
+
+_QUERY_POOLS = {}
+_COMPLEMENT = numpy.arange(256, dtype=numpy.uint8)
+_COMPLEMENT[bytearray(b"ACGTacgt")] = bytearray(b"TGCAtgca")
+
+
+def is_jellyfish2_db(db_file):
+    """ Check that file has jellyfish 2 header (9 digits length and JSON)."""
+    try:
+        with open(db_file, "rb") as fh:
+            head = fh.read(10)
+    except IOError:
+        return False
+    return len(head) == 10 and head[:9].isdigit() and head[9:] == b"{"
+
+
+def get_canonical_kmers(kmers):
+    """ Return bytes array of upper case min(kmer, reverse complement),
+    k-mers of each length are processed as one matrix.
+    """
+    kmers = numpy.array([x.upper() for x in kmers], dtype=bytes)
+    lengths = numpy.char.str_len(kmers)
+    result = kmers.copy()
+    for length in numpy.unique(lengths).tolist():
+        if not length:
+            continue
+        selected = numpy.flatnonzero(lengths == length)
+        forward = kmers[selected].astype("S%s" % length)
+        letters = forward.view(numpy.uint8).reshape(-1, length)
+        reverse = numpy.ascontiguousarray(_COMPLEMENT[letters[:, ::-1]]).view("S%s" % length).ravel()
+        result[selected] = numpy.where(reverse < forward, reverse, forward)
+    return result
+
+
+class JellyfishQueryWorker(object):
+    """ Long-lived `jellyfish query -i` process for one database."""
+
+    def __init__(self, db_file, location):
+        self.db_file = db_file
+        self.stderr = tempfile.TemporaryFile(mode="w+")
+        try:
+            self.process = subprocess.Popen(shlex.split(location) + ["query", "-i", db_file],
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.stderr,
+                                            universal_newlines=True, bufsize=1)
+        except Exception:
+            self.stderr.close()
+            raise
+
+    def send(self, kmers):
+        """ Write k-mers to the worker."""
+        try:
+            self.process.stdin.write("\n".join(kmers) + "\n")
+            self.process.stdin.flush()
+        except (IOError, OSError):
+            self._fail()
+
+    def receive(self, n):
+        """ Read n counts from the worker."""
+        result = []
+        for i in range(n):
+            line = self.process.stdout.readline()
+            if not line:
+                self._fail()
+            result.append(int(line.split()[0]))
+        return result
+
+    def _fail(self):
+        self.process.wait()
+        self.stderr.seek(0)
+        raise Exception("Jellyfish query for %s exited: %s" % (self.db_file, self.stderr.read().strip()))
+
+    def close(self):
+        """ Close stdin and wait for the worker."""
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+            except (IOError, OSError):
+                pass
+            self.process.wait()
+        self.process.stdout.close()
+        self.stderr.close()
+
+
+class JellyfishQueryPool(object):
+    """ Pool of persistent query workers for one database."""
+
+    def __init__(self, db_file, location, workers=1, chunk_size=JELLYFISH_QUERY_CHUNK):
+        self.db_file = db_file
+        self.chunk_size = chunk_size
+        self.workers = []
+        try:
+            for i in range(max(1, workers)):
+                self.workers.append(JellyfishQueryWorker(db_file, location))
+        except Exception:
+            self.close()
+            raise
+
+    def query(self, kmers):
+        """ Return list of counts for list of k-mers in the same order."""
+        chunks = [kmers[i:i + self.chunk_size] for i in range(0, len(kmers), self.chunk_size)]
+        result = []
+        try:
+            for start in range(0, len(chunks), len(self.workers)):
+                group = list(zip(self.workers, chunks[start:start + len(self.workers)]))
+                for worker, chunk in group:
+                    worker.send(chunk)
+                for worker, chunk in group:
+                    result.extend(worker.receive(len(chunk)))
+        except Exception:
+            self.close()
+            raise
+        return result
+
+    def is_alive(self):
+        """ Check that all workers are running."""
+        return bool(self.workers) and all(x.process.poll() is None for x in self.workers)
+
+    def close(self):
+        """ Stop all workers."""
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+
+
+def get_query_pool(db_file, location, workers=1):
+    """ Return cached running pool for database or start a new one.
+    Pools of previous versions of db_file (other mtime) are closed.
+    """
+    mtime = os.path.getmtime(db_file) if os.path.exists(db_file) else None
+    key = (location, db_file, workers, mtime)
+    for stale in [x for x in _QUERY_POOLS if x[:3] == key[:3] and x != key]:
+        _QUERY_POOLS.pop(stale).close()
+    pool = _QUERY_POOLS.get(key)
+    if pool is None or not pool.is_alive():
+        pool = JellyfishQueryPool(db_file, location, workers=workers)
+        _QUERY_POOLS[key] = pool
+    return pool
+
+
+def close_query_pools():
+    """ Stop all cached pools."""
+    for pool in _QUERY_POOLS.values():
+        pool.close()
+    _QUERY_POOLS.clear()
+
+
+atexit.register(close_query_pools)
+
+
+def query_kmer_counts(db_file, kmers, location, workers=1, both_strands=True):
+    """ Return int64 array of counts aligned with list of k-mers.
+    With both_strands k-mers are canonicalized before query.
+    """
+    if not len(kmers):
+        return numpy.zeros(0, dtype=numpy.int64)
+    if both_strands:
+        keys = get_canonical_kmers(kmers)
+    else:
+        keys = numpy.array([x.upper() for x in kmers], dtype=bytes)
+    keys, inverse = numpy.unique(keys, return_inverse=True)
+    counts = get_query_pool(db_file, location, workers=workers).query([x.decode("ascii") for x in keys.tolist()])
+    return numpy.array(counts, dtype=numpy.int64)[inverse.ravel()]
@@ -23,10 +23,14 @@ except:
 from trseeker.settings import load_settings
 from PyExp import sc_iter_filepath_folder
 import subprocess
+import numpy
 from trseeker.tools.seqfile import sort_file_by_int_field
-from trseeker.tools.ngrams_tools import process_list_to_kmer_index
 from trseeker.tools.sequence_tools import get_revcomp
-from collections import defaultdict
+from trseeker.tools.jellyfish_query import query_kmer_counts, is_jellyfish2_db
+from trseeker.tools.kmer_mmap import sc_open_kmer2tf
+from trseeker.tools.kmer_codec import get_kmer_codes, get_revcomp_codes, decode_kmers
+from trseeker.tools.kmer_coverage import get_coverage_profile, sc_write_coverage_bedgraph
+from collections import defaultdict, OrderedDict
 
 jellyfish_available = True
 try:
@@ -92,27 +96,104 @@ class Kmer2tfAPI(object):
 
 
 
+KMER2TF_CACHE_SIZE = 1 << 20
+_REVCOMP_TABLE = str.maketrans("ACGTacgt", "TGCAtgca")
+
+
+def get_canonical_kmer(kmer):
+    """ Return upper case min(kmer, reverse complement kmer)."""
+    kmer = kmer.upper()
+    rev_kmer = kmer.translate(_REVCOMP_TABLE)[::-1]
+    if kmer < rev_kmer:
+        return kmer
+    return rev_kmer
+
+
 class Kmer2tfAPI_cache(Kmer2tfAPI):
+    """ Kmer2tfAPI with bounded LRU cache of canonical k-mers.
+    Backend with get_counts method (kmer_mmap.Kmer2tfTable) is queried
+    with one call per batch of missed k-mers.
+    """
 
-    def __init__(self, jf_api):
+    def __init__(self, jf_api, max_size=KMER2TF_CACHE_SIZE):
         self.jf_api = jf_api
         self.change = defaultdict(int)
-        self.cache = {}
+        self.cache = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _query(self, keys):
+        if hasattr(self.jf_api, "get_counts"):
+            return self.jf_api.get_counts(keys).tolist()
+        return [self.jf_api[jellyfish.MerDNA(key)] for key in keys]
+
+    def _store(self, keys, values):
+        for key, value in zip(keys, values):
+            self.cache[key] = value
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
 
     def __getitem__(self, kmer):
-        if kmer in self.cache:
-            return self.cache[kmer]
-        rev_kmer = get_revcomp(kmer)
-        if kmer < rev_kmer:
-            if not kmer in self.cache:
-                self.cache[kmer] = self.jf_api[jellyfish.MerDNA(kmer)]
-            return self.cache[kmer]
-        if not kmer in self.cache:
-            self.cache[kmer] = self.jf_api[jellyfish.MerDNA(kmer)]
-        return self.cache[kmer]
-
+        key = get_canonical_kmer(kmer)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        value = self._query([key])[0]
+        self._store([key], [value])
+        return value
+
+    def prefetch(self, kmers):
+        """ Query missed k-mers of the list with one backend call,
+        return list of tfs in the same order.
+        """
+        keys = [get_canonical_kmer(kmer) for kmer in kmers]
+        result = []
+        missed = []
+        for key in keys:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                result.append(self.cache[key])
+            else:
+                self.misses += 1
+                missed.append(key)
+                result.append(None)
+        if not missed:
+            return result
+        missed = list(OrderedDict.fromkeys(missed))
+        values = dict(zip(missed, self._query(missed)))
+        self._store(missed, [values[key] for key in missed])
+        return [values[key] if tf is None else tf for key, tf in zip(keys, result)]
+
+    def get_neighbours(self, kmer):
+        """ Return (left, right) lists of (tf, kmer) for 4 left and 4 right
+        shifts of k-mer (ACGT order), all 8 are prefetched at once.
+        """
+        kmer = kmer.strip().upper()
+        left = [letter + kmer[:-1] for letter in "ACGT"]
+        right = [kmer[1:] + letter for letter in "ACGT"]
+        tfs = self.prefetch(left + right)
+        return list(zip(tfs[:4], left)), list(zip(tfs[4:], right))
+
+    def get_stats(self):
+        """ Return dictionary with hits, misses, hit_rate and size of the cache."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits * 1. / total if total else 0.,
+            "size": len(self.cache),
+        }
+
+    def clear_cache(self):
+        """ Drop cached k-mers and counters."""
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
 
-        
 
 settings = load_settings()
 location = settings["blast_settings"]["jellyfish_location"]
@@ -277,17 +358,29 @@ def dump_kmers(db_file, kmers_file, dumpmintf, new=False):
     if os.path.getsize(kmers_file)/1000000000 <10:
         sort_file_by_int_field(kmers_file, 1)
 
-def query_kmers(db_file, query_hashes, both_strands=True, verbose=False, new=False, batch_size=1000):
+def query_kmers(db_file, query_hashes, both_strands=True, verbose=False, new=False, batch_size=1000, workers=1):
     """
     Query jellyfish database.
+    Jellyfish 2 databases (new=True, k > 23 or jellyfish 2 file header) are queried
+    by persistent `query -i` workers kept open between calls (jellyfish_query).
     @param db_file: jf db file
     @param query_hashes: kmers to query
     @param both_strands: use both strands
     @param verbose: verbose
+    @param workers: number of persistent query processes
     @return: dictionary hash to tf
     """
-    if len(query_hashes[0]) > 23 or new:
-        return query_kmers_new(db_file, query_hashes, both_strands=True, verbose=verbose)
+    if not query_hashes:
+        return defaultdict(int)
+    if len(query_hashes[0]) > 23 or new or is_jellyfish2_db(db_file):
+        counts = query_kmers_new(db_file, query_hashes, both_strands=both_strands, verbose=verbose > 1,
+                                 workers=workers)
+        if counts is None:
+            return None
+        final_result = defaultdict(int)
+        for kmer, tf in zip(query_hashes, counts.tolist()):
+            final_result[kmer] = tf
+        return final_result
 
     params = {
         "location": location,
@@ -303,15 +396,11 @@ def query_kmers(db_file, query_hashes, both_strands=True, verbose=False, new=Fal
     final_result = defaultdict(int)
     n = len(query_hashes)
     step = batch_size
-    for k in xrange(0,n,step):
+    for k in range(0,n,step):
         if verbose > 1:
             print(k, n)
         pp = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE, universal_newlines=True)
-        # query = " ".join(query_hashes[k:k+100]).upper()
-        for i, query in enumerate(query_hashes[k:k+step]):
-            pp.stdin.write(query+" ")
-        data = pp.communicate(input=query)
-        # sys.stdout.flush()
+        data = pp.communicate(input=" ".join(query_hashes[k:k+step]) + "\n")
         error = data[1]
         if "Can't open file" in error:
             return None
@@ -330,119 +419,97 @@ def query_kmers(db_file, query_hashes, both_strands=True, verbose=False, new=Fal
         
     return(final_result)
 
-def query_kmers_new(db_file, query_hashes, both_strands=True, verbose=False):
+def query_kmers_new(db_file, query_hashes, both_strands=True, verbose=False, workers=1):
     """
-    Query jellyfish database.
+    Query jellyfish 2 database with persistent workers (jellyfish_query).
+    K-mers of any length are canonicalized once per batch and each distinct
+    k-mer is queried once, counts are mapped back by position.
     @param db_file: jf db file
     @param query_hashes: kmers to query
-    @param both_strands: use both strands
+    @param both_strands: canonicalize kmers before query
     @param verbose: verbose
-    @return: dictionary hash to tf
+    @param workers: number of persistent query processes
+    @return: numpy int64 array of tf aligned with query_hashes or None if db can't be opened
     """
-    params = {
-        "location": location_new,
-        "db_file": db_file,
-        "query_hashes": query_hashes,
-        "both_strands": "",
-    }
-    # if both_strands:
-    #     params["both_strands"] = "-C"
-    command = "%(location)s query -i %(both_strands)s %(db_file)s" % params
     if verbose:
-        print(command)
-    final_result = defaultdict(int)
-    n = len(query_hashes)
-
-    step = 1000
-    for k in xrange(0,n,step):
-        if verbose > 1:
-            print(k, n)
-        pp = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE, universal_newlines=True)
-        # query = " ".join(query_hashes[k:k+100]).upper()
-        for i, query in enumerate(query_hashes[k:k+step]):
-            pp.stdin.write(query+" ")
-        data = pp.communicate(input=query)
-        error = data[1]
-        if "Can't open file" in error:
+        print("Query %s k-mers with %s workers for %s" % (len(query_hashes), workers, db_file))
+    try:
+        return query_kmer_counts(db_file, query_hashes, location_new, workers=workers, both_strands=both_strands)
+    except Exception as e:
+        if "Can't open file" in str(e):
             return None
-        for item in data[0].strip().split("\n"):
-            if item.strip():
-                if verbose:
-                    print(k, n, item)
-                final_result[query] = int(item.strip().split()[0])
-            else:
-                if verbose:
-                    print(k, n, data)
-                final_result[-1] = data[1]
-    return final_result
+        raise
 
 
-def query_and_write_coverage_histogram(db_file, query_sequence, output_file, k=23):
+def get_kmer_code_counter(db_file, k, workers=1):
+    """
+    Return function of canonical k-mer codes to array of tfs (kmer_coverage).
+    @param db_file: jf db file or Kmer2tfTable
+    @param k: k-mer length
+    @param workers: number of persistent query processes
+    @return: get_counts(codes) function
     """
-    Save coverage histogram into output_file for given query_sequence.
-    @param db_file:
+    if hasattr(db_file, "get_code_counts"):
+        return db_file.get_code_counts
+
+    def get_counts(codes):
+        kmers = [x.upper() for x in decode_kmers(codes, k)]
+        data = query_kmers(db_file, kmers, both_strands=True, workers=workers)
+        if data is None:
+            raise Exception("Can't open file %s" % db_file)
+        return numpy.array([int(data[x]) for x in kmers], dtype=numpy.int64)
+    return get_counts
+
+
+def query_and_write_coverage_histogram(db_file, query_sequence, output_file, k=23, workers=1):
+    """
+    Save coverage histogram into output_file for given query_sequence:
+    kmer, position, tf of canonical kmer.
+    @param db_file: jf db file or Kmer2tfTable
     @param query_sequence:
     @param output_file:
     @param k:
-    @return:
+    @param workers: number of persistent query processes
+    @return: dictionary kmer and revkmer to tf
     """
-    index = process_list_to_kmer_index([query_sequence], k, docids=False, cutoff=None, verbose=False)
-    query_hashes = [x[0] for x in index]
-    data =  query_kmers(db_file, query_hashes, both_strands=True)
-    keys = data.keys()
-    for kmer in keys:
-        rkmer = get_revcomp(kmer)
-        data[kmer] = int(data[kmer])
-        if not rkmer in data:
-            data[rkmer] = int(data[kmer])
+    coverage = get_sequence_coverage(db_file, query_sequence, k=k, workers=workers)
+    codes, positions = get_kmer_codes(query_sequence, k, canonical=True, positions=True)
+    tfs = coverage[positions].tolist()
+    data = {}
+    for kmers in (decode_kmers(codes, k), decode_kmers(get_revcomp_codes(codes, k), k)):
+        data.update(zip([x.upper() for x in kmers], tfs))
     with open(output_file, "w") as fh:
-        for i in xrange(0, len(query_sequence)-k + 1):
-            kmer = query_sequence[i:i+k]
-            p0 = 0
-            p1 = 0
-            p2 = 0
-            rkmer = get_revcomp(kmer)
-            if kmer in data:
-                p1 = int(data[kmer])
-            if rkmer in data:
-                p2 = int(data[rkmer])
-            p = max(p1,p2,p0)
-            fh.write("%s\t%s\t%s\n" % (kmer, i, p))
+        fh.write("".join("%s\t%s\t%s\n" % (query_sequence[i:i+k], i, p) for i, p in enumerate(coverage.tolist())))
     return data
 
-def get_sequence_coverage(db_file, query_sequence, k=23):
+def get_sequence_coverage(db_file, query_sequence, k=23, workers=1):
     """
     Get coverage histogram for given query_sequence.
-    @param db_file:
+    Canonical k-mers of all positions are computed at once and each distinct
+    k-mer is queried once.
+    @param db_file: jf db file or Kmer2tfTable
     @param query_sequence:
     @param k:
-    @return:
+    @param workers: number of persistent query processes
+    @return: numpy int64 array of tf for each position
     """
-    query_sequence = query_sequence.upper()
-    index = process_list_to_kmer_index([query_sequence], k, docids=False, cutoff=None, verbose=False)
-    query_hashes = [x[0].upper() for x in index]
-    data =  query_kmers(db_file, query_hashes, both_strands=True)
-    keys = data.keys()
-    for kmer in keys:
-        rkmer = get_revcomp(kmer)
-        data[kmer] = int(data[kmer])
-        if not rkmer in data:
-            data[rkmer] = int(data[kmer])
-    
-    coverage = []
-    for i in xrange(0, len(query_sequence)-k + 1):
-        kmer = query_sequence[i:i+k]
-        p0 = 0
-        p1 = 0
-        p2 = 0
-        rkmer = get_revcomp(kmer)
-        if kmer in data:
-            p1 = int(data[kmer])
-        if rkmer in data:
-            p2 = int(data[rkmer])
-        p = max(p1,p2,p0)
-        coverage.append(p)
-    return coverage
+    return get_coverage_profile(query_sequence, get_kmer_code_counter(db_file, k, workers=workers), k=k)
+
+
+def sc_write_jellyfish_coverage_bedgraph(db_file, fasta_file, output_file, k=23, workers=1, skip_zero=False):
+    """
+    Write bedGraph file (chrom, start, end, tf) of runs of equal coverage
+    for all sequences of fasta file, sequences are read by windows.
+    @param db_file: jf db file or Kmer2tfTable
+    @param fasta_file: fasta file
+    @param output_file: bedGraph file
+    @param k: k-mer length
+    @param workers: number of persistent query processes
+    @param skip_zero: don't write runs with zero coverage
+    @return: number of runs
+    """
+    return sc_write_coverage_bedgraph(fasta_file, output_file, get_kmer_code_counter(db_file, k, workers=workers),
+                                      k=k, skip_zero=skip_zero)
 
 
 def sc_count_and_dump_kmers_for_folder(folder, output_prefix, kmers_file, k=23, mintf=None):
@@ -504,9 +571,13 @@ def sc_count_and_dump_kmers_for_file(fasta_file, jellyfish_data_folder, jf_db, j
             print("Removing", file_path)
             os.unlink(file_path)
 
-def load_kmer2tf(jf_data_file):
+def load_kmer2tf(jf_data_file, mmap=False, table_file=None):
     """ Load kmer2tf file from jellyfish dat file
+    With mmap=True return Kmer2tfTable over memory mapped table
+    (jf_data_file.kmt by default) converted once from the dat file.
     """
+    if mmap:
+        return sc_open_kmer2tf(jf_data_file, table_file=table_file)
     print("Read file %s..." % jf_data_file)
     kmer2tf = {}
     with open(jf_data_file) as fh:
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Count-min sketch of packed k-mer codes for two pass counting of frequent k-mers.
+
+First pass adds all k-mers to depth rows of uint32 counters, estimate of a k-mer
+is the minimum of its counters and it is never less than the true tf.
+Second pass counts exactly only k-mers with estimate >= min_tf, so singletons
+from sequencing errors are not kept in memory. False positive rate is a fraction
+of k-mers passed the sketch with exact tf < min_tf.
+
+- CountMinSketch(max_memory=256, depth=4, seed=42)
+- iter_code_batches(sequences, k, canonical=False, batch_size=1 << 22) ~> (codes, skipped)
+- get_count_min_sketch(sequences, k, max_memory=256, depth=4, canonical=False) -> (sketch, kmers, skipped)
+- sc_count_frequent_kmers(get_sequences, k, min_tf, max_memory=256, depth=4, canonical=False) -> (codes, tfs, stats)
+"""
+import math
+import numpy
+from trseeker.tools.kmer_codec import get_kmer_codes, count_kmer_codes, hash_codes
+from trseeker.tools.read_codec import merge_kmer_parts, add_merged_part
+
+KMER_CMS_MEMORY = 256
+KMER_CMS_DEPTH = 4
+KMER_CMS_BATCH = 1 << 22
+
+
+class CountMinSketch(object):
+    """ Count-min sketch of uint64 codes with max_memory Mb of uint32 counters."""
+
+    def __init__(self, max_memory=KMER_CMS_MEMORY, depth=KMER_CMS_DEPTH, seed=42):
+        self.depth = depth
+        self.width = max(int(max_memory * 1024 * 1024) // (4 * depth), 1)
+        self.table = numpy.zeros((depth, self.width), dtype=numpy.uint32)
+        self.seeds = hash_codes(numpy.arange(depth, dtype=numpy.uint64) + numpy.uint64(seed))
+        self.total = 0
+
+    def _get_columns(self, codes, row):
+        return (hash_codes(codes ^ self.seeds[row]) % numpy.uint64(self.width)).astype(numpy.int64)
+
+    def add(self, codes):
+        """ Add array of codes."""
+        codes, counts = count_kmer_codes(codes)
+        counts = counts.astype(numpy.uint32)
+        for row in range(self.depth):
+            numpy.add.at(self.table[row], self._get_columns(codes, row), counts)
+        self.total += int(counts.sum())
+
+    def get_counts(self, codes):
+        """ Return uint32 array of estimated counts of codes."""
+        codes = numpy.asarray(codes, dtype=numpy.uint64)
+        result = numpy.full(len(codes), numpy.iinfo(numpy.uint32).max, dtype=numpy.uint32)
+        for row in range(self.depth):
+            numpy.minimum(result, self.table[row][self._get_columns(codes, row)], out=result)
+        return result
+
+    def get_error(self):
+        """ Return (error, probability): estimate exceeds tf by more than error
+        with probability less than probability.
+        """
+        return math.e * self.total / self.width, math.exp(-self.depth)
+
+
+def iter_code_batches(sequences, k, canonical=False, batch_size=KMER_CMS_BATCH):
+    """ Iterate over (codes, skipped) of joined sequences with about batch_size bases,
+    skipped is a number of k-mers with non ACGT characters.
+    """
+    batch = []
+    size = 0
+    windows = 0
+    for sequence in sequences:
+        batch.append(sequence)
+        size += len(sequence) + 1
+        windows += max(0, len(sequence) - k + 1)
+        if size < batch_size:
+            continue
+        codes = get_kmer_codes((b"n" if isinstance(sequence, bytes) else "n").join(batch), k, canonical=canonical)
+        yield codes, windows - len(codes)
+        batch = []
+        size = 0
+        windows = 0
+    if batch:
+        codes = get_kmer_codes((b"n" if isinstance(batch[0], bytes) else "n").join(batch), k, canonical=canonical)
+        yield codes, windows - len(codes)
+
+
+def get_count_min_sketch(sequences, k, max_memory=KMER_CMS_MEMORY, depth=KMER_CMS_DEPTH, canonical=False):
+    """ Return (sketch, number of k-mers, number of skipped k-mers) for iterable of sequences."""
+    sketch = CountMinSketch(max_memory=max_memory, depth=depth)
+    skipped = 0
+    for codes, batch_skipped in iter_code_batches(sequences, k, canonical=canonical):
+        sketch.add(codes)
+        skipped += batch_skipped
+    return sketch, sketch.total, skipped
+
+
+def sc_count_frequent_kmers(get_sequences, k, min_tf, max_memory=KMER_CMS_MEMORY, depth=KMER_CMS_DEPTH,
+                            canonical=False, verbose=True):
+    """ Count k-mers with tf >= min_tf in two passes over get_sequences() iterable.
+
+    Keyword arguments:
+
+    - max_memory      -- memory of count-min sketch in Mb
+    - depth           -- number of hash rows of the sketch
+
+    Return (sorted codes, tfs, stats), stats is a dictionary with kmers, skipped,
+    candidates, frequent, false_positive_rate and expected_error.
+    """
+    if verbose:
+        print("Build count-min sketch...")
+    sketch, kmers, skipped = get_count_min_sketch(get_sequences(), k, max_memory=max_memory, depth=depth,
+                                                  canonical=canonical)
+    if verbose:
+        print("Count candidates...")
+    parts = []
+    for batch, batch_skipped in iter_code_batches(get_sequences(), k, canonical=canonical):
+        batch_codes, batch_tfs = count_kmer_codes(batch[sketch.get_counts(batch) >= min_tf])
+        add_merged_part(parts, (batch_codes, batch_tfs.astype(numpy.uint64)), merge_kmer_parts)
+    codes, tfs = merge_kmer_parts(parts)
+    del parts
+    selected = tfs >= min_tf
+    stats = {
+        "kmers": kmers,
+        "skipped": skipped,
+        "candidates": len(codes),
+        "frequent": int(selected.sum()),
+        "false_positive_rate": 1. - selected.sum() * 1. / len(codes) if len(codes) else 0.,
+        "expected_error": sketch.get_error()[0],
+    }
+    if verbose:
+        print("Candidates: %(candidates)s, frequent: %(frequent)s, false positive rate: %(false_positive_rate).4f" % stats)
+    return codes[selected], tfs[selected], stats
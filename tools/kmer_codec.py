@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Packed 2-bit k-mer codes (a=0, c=1, g=2, t=3) for k <= 32.
+
+The numeric order of codes is the lexicographic order of lower case k-mers,
+so canonical code min(forward, revcomp) corresponds to min(kmer, revkmer).
+K-mers with any character other than ACGT (N runs, IUPAC codes) are skipped.
+
+- encode_kmer(kmer) -> code
+- decode_kmer(code, k) -> kmer
+- get_revcomp_code(code, k) -> code
+- get_canonical_code(code, k) -> code
+- iter_kmer_codes(sequence, k) ~> (pos, forward code, canonical code)
+- encode_sequence(sequence) -> uint8 array
+- get_kmer_codes(sequence, k, canonical=False, positions=False) -> uint64 array
+- get_revcomp_codes(codes, k) -> uint64 array
+- get_canonical_codes(codes, k) -> uint64 array
+- count_kmer_codes(codes) -> (uint64 array, int64 array)
+- count_kmer_postings(codes, doc_ids) -> (keys, tf, df, (codes, doc_ids, freqs))
+- decode_kmers(codes, k) -> [kmer,]
+- hash_codes(codes) -> uint64 array
+"""
+import numpy
+
+KMER_MAX_K = 32
+
+NUCLEOTIDE_TO_CODE = {"a": 0, "c": 1, "g": 2, "t": 3, "A": 0, "C": 1, "G": 2, "T": 3}
+CODE_TO_NUCLEOTIDE = "acgt"
+
+NUCLEOTIDE_CODES = numpy.full(256, 4, dtype=numpy.uint8)
+for _nucleotide, _code in NUCLEOTIDE_TO_CODE.items():
+    NUCLEOTIDE_CODES[ord(_nucleotide)] = _code
+
+_DECODE_TABLE = numpy.frombuffer(CODE_TO_NUCLEOTIDE.encode("ascii"), dtype=numpy.uint8)
+_DECODE_BLOCK = 1 << 18
+_REVERSE_MASKS = [(2, 0x3333333333333333),
+                  (4, 0x0F0F0F0F0F0F0F0F),
+                  (8, 0x00FF00FF00FF00FF),
+                  (16, 0x0000FFFF0000FFFF)]
+
+
+def _check_k(k):
+    if k < 1 or k > KMER_MAX_K:
+        raise Exception("Packed k-mers support k from 1 to %s, got %s" % (KMER_MAX_K, k))
+
+
+def encode_kmer(kmer):
+    """ Return 2-bit code of k-mer, raise Exception for non ACGT characters."""
+    _check_k(len(kmer))
+    code = 0
+    for nucleotide in kmer:
+        if not nucleotide in NUCLEOTIDE_TO_CODE:
+            raise Exception("Can't encode k-mer with %s: %s" % (nucleotide, kmer))
+        code = (code << 2) | NUCLEOTIDE_TO_CODE[nucleotide]
+    return code
+
+
+def decode_kmer(code, k):
+    """ Return lower case k-mer for 2-bit code."""
+    result = []
+    for i in range(k):
+        result.append(CODE_TO_NUCLEOTIDE[code & 3])
+        code >>= 2
+    return "".join(reversed(result))
+
+
+def get_revcomp_code(code, k):
+    """ Return code of reverse complement k-mer."""
+    code = ~int(code) & 0xFFFFFFFFFFFFFFFF
+    for shift, mask in _REVERSE_MASKS:
+        code = ((code >> shift) & mask) | ((code & mask) << shift)
+    code = ((code >> 32) | (code << 32)) & 0xFFFFFFFFFFFFFFFF
+    return code >> (64 - 2 * k)
+
+
+def get_canonical_code(code, k):
+    """ Return min(code, revcomp code)."""
+    return min(code, get_revcomp_code(code, k))
+
+
+def iter_kmer_codes(sequence, k):
+    """ Rolling encoder, yield (position, forward code, canonical code)
+    for each k-mer without non ACGT characters.
+    """
+    _check_k(k)
+    mask = (1 << 2 * k) - 1
+    shift = 2 * (k - 1)
+    forward = 0
+    reverse = 0
+    length = 0
+    for i, nucleotide in enumerate(sequence):
+        code = NUCLEOTIDE_TO_CODE.get(nucleotide)
+        if code is None:
+            length = 0
+            forward = 0
+            reverse = 0
+            continue
+        forward = ((forward << 2) | code) & mask
+        reverse = (reverse >> 2) | ((3 - code) << shift)
+        length += 1
+        if length >= k:
+            yield i - k + 1, forward, min(forward, reverse)
+
+
+def encode_sequence(sequence):
+    """ Return uint8 array of nucleotide codes, 4 for non ACGT characters."""
+    if isinstance(sequence, str):
+        sequence = sequence.encode("ascii", "replace")
+    return NUCLEOTIDE_CODES[numpy.frombuffer(sequence, dtype=numpy.uint8)]
+
+
+def get_kmer_codes(sequence, k, canonical=False, positions=False):
+    """ Return uint64 array of k-mer codes in sequence order,
+    k-mers with non ACGT characters are skipped.
+    With positions=True return (codes, int64 array of k-mer start positions).
+    """
+    _check_k(k)
+    bases = encode_sequence(sequence)
+    n = len(bases) - k + 1
+    if n <= 0:
+        codes = numpy.zeros(0, dtype=numpy.uint64)
+        if positions:
+            return codes, numpy.zeros(0, dtype=numpy.int64)
+        return codes
+    invalid = numpy.zeros(len(bases) + 1, dtype=numpy.int64)
+    numpy.cumsum(bases > 3, out=invalid[1:])
+    valid = (invalid[k:] - invalid[:-k]) == 0
+    values = (bases & 3).astype(numpy.uint64)
+    codes = numpy.zeros(n, dtype=numpy.uint64)
+    two = numpy.uint64(2)
+    for j in range(k):
+        codes <<= two
+        codes |= values[j:j + n]
+    if canonical:
+        codes = get_canonical_codes(codes, k)
+    if valid.all():
+        if positions:
+            return codes, numpy.arange(n, dtype=numpy.int64)
+        return codes
+    if positions:
+        return codes[valid], numpy.flatnonzero(valid)
+    return codes[valid]
+
+
+def get_revcomp_codes(codes, k):
+    """ Return uint64 array of reverse complement codes."""
+    _check_k(k)
+    x = numpy.invert(numpy.asarray(codes, dtype=numpy.uint64))
+    for shift, mask in _REVERSE_MASKS:
+        shift = numpy.uint64(shift)
+        mask = numpy.uint64(mask)
+        x = ((x >> shift) & mask) | ((x & mask) << shift)
+    x = (x >> numpy.uint64(32)) | (x << numpy.uint64(32))
+    return x >> numpy.uint64(64 - 2 * k)
+
+
+def get_canonical_codes(codes, k):
+    """ Return uint64 array of min(code, revcomp code)."""
+    codes = numpy.asarray(codes, dtype=numpy.uint64)
+    return numpy.minimum(codes, get_revcomp_codes(codes, k))
+
+
+def count_kmer_codes(codes):
+    """ Return sorted unique codes and their counts."""
+    codes = numpy.asarray(codes, dtype=numpy.uint64)
+    if not len(codes):
+        return codes, numpy.zeros(0, dtype=numpy.int64)
+    codes = numpy.sort(codes)
+    starts = numpy.flatnonzero(numpy.concatenate(([True], codes[1:] != codes[:-1])))
+    counts = numpy.diff(numpy.append(starts, len(codes)))
+    return codes[starts], counts
+
+
+def count_kmer_postings(codes, doc_ids):
+    """ Count codes of documents in one sort.
+    Return (keys, tf, df, postings), where postings are (code, docid, freq) runs.
+    Document frequency is incremented when docid differs from the last docid of the code.
+    """
+    codes = numpy.asarray(codes, dtype=numpy.uint64)
+    doc_ids = numpy.asarray(doc_ids)
+    if not len(codes):
+        counts = numpy.zeros(0, dtype=numpy.int64)
+        return codes, counts, counts, (codes, doc_ids, numpy.zeros(0, dtype=numpy.uint32))
+    order = numpy.argsort(codes, kind="stable")
+    codes = codes[order]
+    doc_ids = doc_ids[order]
+    new_key = numpy.concatenate(([True], codes[1:] != codes[:-1]))
+    new_doc = new_key.copy()
+    new_doc[1:] |= doc_ids[1:] != doc_ids[:-1]
+    key_starts = numpy.flatnonzero(new_key)
+    doc_starts = numpy.flatnonzero(new_doc)
+    tf = numpy.diff(numpy.append(key_starts, len(codes)))
+    df = numpy.add.reduceat(new_doc.astype(numpy.int64), key_starts)
+    freqs = numpy.diff(numpy.append(doc_starts, len(codes))).astype(numpy.uint32)
+    postings = (codes[doc_starts], doc_ids[doc_starts], freqs)
+    return codes[key_starts], tf, df, postings
+
+
+def decode_kmers(codes, k):
+    """ Return list of lower case k-mers for array of codes."""
+    _check_k(k)
+    codes = numpy.asarray(codes, dtype=numpy.uint64)
+    shifts = numpy.arange(2 * (k - 1), -1, -2, dtype=numpy.uint64)
+    three = numpy.uint64(3)
+    result = []
+    for start in range(0, len(codes), _DECODE_BLOCK):
+        block = codes[start:start + _DECODE_BLOCK]
+        letters = _DECODE_TABLE[((block[:, None] >> shifts) & three).astype(numpy.uint8)]
+        result.extend(numpy.ascontiguousarray(letters).view("S%s" % k).ravel().astype("U%s" % k).tolist())
+    return result
+
+
+def hash_codes(codes):
+    """ Return splitmix64 finalizer of uint64 array, used as a hash of codes."""
+    x = numpy.asarray(codes, dtype=numpy.uint64)
+    x = (x ^ (x >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return x ^ (x >> numpy.uint64(31))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+K-mer coverage profiles of long sequences (k <= 32).
+
+Query is encoded once, canonical codes of all positions are computed
+with kmer_codec and each distinct code is looked up once with
+get_counts(codes) -> counts (Kmer2tfTable.get_code_counts or
+jellyfish_tools.get_kmer_code_counter). Coverage of position i is tf
+of canonical k-mer starting at i, k-mers with non ACGT characters have 0.
+
+Whole chromosomes are profiled by overlapping windows (FastaIndex contigs
+aren't read into memory) and written as bedGraph runs of equal coverage:
+
+chrom, start, end, coverage
+
+- get_coverage_profile(sequence, get_counts, k=23) -> int64 array
+- iter_coverage_windows(sequence, get_counts, k=23, window=1 << 22) ~> (start, coverage)
+- get_coverage_runs(coverage) -> (starts, ends, values)
+- write_coverage_bedgraph(fh, name, sequence, get_counts, k=23, window=1 << 22, skip_zero=False) -> number of runs
+- sc_write_coverage_bedgraph(fasta_file, output_file, get_counts, k=23, window=1 << 22, skip_zero=False) -> number of runs
+"""
+import numpy
+from trseeker.tools.kmer_codec import get_kmer_codes
+from trseeker.seqio.fai_file import FastaIndex
+
+KMER_COVERAGE_WINDOW = 1 << 22
+
+
+def get_coverage_profile(sequence, get_counts, k=23):
+    """ Return int64 array of tfs of canonical k-mers for each position of sequence."""
+    coverage = numpy.zeros(max(len(sequence) - k + 1, 0), dtype=numpy.int64)
+    codes, positions = get_kmer_codes(sequence, k, canonical=True, positions=True)
+    if len(codes):
+        keys, inverse = numpy.unique(codes, return_inverse=True)
+        coverage[positions] = numpy.asarray(get_counts(keys), dtype=numpy.int64)[inverse.ravel()]
+    return coverage
+
+
+def iter_coverage_windows(sequence, get_counts, k=23, window=KMER_COVERAGE_WINDOW):
+    """ Iterate over (start, coverage) of consecutive windows of window positions,
+    sequence can be any sliceable sequence with len (str or FastaContig).
+    """
+    n = len(sequence) - k + 1
+    for start in range(0, max(n, 0), window):
+        yield start, get_coverage_profile(sequence[start:start + window + k - 1], get_counts, k=k)
+
+
+def get_coverage_runs(coverage):
+    """ Return (starts, ends, values) of runs of equal coverage."""
+    coverage = numpy.asarray(coverage)
+    if not len(coverage):
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        return empty, empty, coverage
+    starts = numpy.flatnonzero(numpy.concatenate(([True], coverage[1:] != coverage[:-1])))
+    ends = numpy.append(starts[1:], len(coverage))
+    return starts, ends, coverage[starts]
+
+
+def write_coverage_bedgraph(fh, name, sequence, get_counts, k=23, window=KMER_COVERAGE_WINDOW, skip_zero=False):
+    """ Write bedGraph lines of coverage runs of sequence to open file,
+    runs continuing over window bounds are joined. Return number of runs.
+    """
+    written = 0
+    last = None
+    for offset, coverage in iter_coverage_windows(sequence, get_counts, k=k, window=window):
+        starts, ends, values = get_coverage_runs(coverage)
+        starts = (starts + offset).tolist()
+        ends = (ends + offset).tolist()
+        values = values.tolist()
+        if last is not None and last[2] == values[0]:
+            starts[0] = last[0]
+        elif last is not None:
+            starts.insert(0, last[0])
+            ends.insert(0, last[1])
+            values.insert(0, last[2])
+        last = (starts.pop(), ends.pop(), values.pop())
+        lines = ["%s\t%s\t%s\t%s\n" % (name, start, end, value)
+                 for start, end, value in zip(starts, ends, values) if value or not skip_zero]
+        fh.write("".join(lines))
+        written += len(lines)
+    if last is not None and (last[2] or not skip_zero):
+        fh.write("%s\t%s\t%s\t%s\n" % (name, last[0], last[1], last[2]))
+        written += 1
+    return written
+
+
+def sc_write_coverage_bedgraph(fasta_file, output_file, get_counts, k=23, window=KMER_COVERAGE_WINDOW,
+                               skip_zero=False, verbose=True):
+    """ Write bedGraph file of k-mer coverage for all sequences of fasta file,
+    sequences are read by windows with .fai index. Return number of runs.
+    """
+    written = 0
+    with FastaIndex(fasta_file) as index, open(output_file, "w") as fh:
+        for name in index.keys():
+            if verbose:
+                print("Coverage of %s (%s bp)..." % (name, index.get_length(name)))
+            written += write_coverage_bedgraph(fh, name, index[name], get_counts, k=k, window=window,
+                                               skip_zero=skip_zero)
+    return written
@@ -19,8 +19,20 @@ from trseeker.tools.ngrams_tools import *
 from trseeker.settings import NGRAM_N, NGRAM_LENGTH
 from collections import defaultdict
 from trseeker.seqio.tr_file import get_all_trf_objs
+from trseeker.tools.kmer_codec import KMER_MAX_K, decode_kmers
+from trseeker.tools.kmer_tables import sc_count_kmer_table
+from trseeker.tools.kmer_similarity import get_postings_offsets, get_postings_similarity, \
+    write_similarity_file, sc_compute_distances, KMER_SIMILARITY_MEMORY
+import numpy
 
 class KmerBasedDistance(object):
+    ''' Inverted index of k-mers and similarity of documents.
+
+    After count_tf_df_for_data k-mer p has tf[p], df[p] and postings
+    docids, doctfs, docnfs from offsets[p] to offsets[p+1] (integer arrays,
+    docids are ascending). compute_distances accumulates sum of min(nf)
+    of shared k-mers into sparse matrix D = (rows, cols, values).
+    '''
 
     SKIP_N = True
     verbose = False
@@ -33,11 +45,12 @@ class KmerBasedDistance(object):
         self.k = k
         self.tf = defaultdict(int)
         self.df = defaultdict(int)
-        self.p2docids = defaultdict(list)
-        self.p2doctfs = defaultdict(list)
-        self.p2docnfs = defaultdict(list)
+        self.offsets = None
+        self.docids = None
+        self.doctfs = None
+        self.docnfs = None
         self.N = len(self.data)
-        self.D = defaultdict(float)
+        self.D = None
         if self.N>100 or verbose:
             self.verbose = True
        
@@ -45,10 +58,6 @@ class KmerBasedDistance(object):
     def count_kmers(self, docid):
         ''' Update tf and df data with k-mers from given sequence.
         '''
-        # import cProfile, pstats, io
-        # pr = cProfile.Profile()
-        # pr.enable()
-
         sequence = self.data[docid]
         _local_tf = defaultdict(int)
         self.local_nf = {}
@@ -62,7 +71,7 @@ class KmerBasedDistance(object):
             _local_tf[kmer] += 1
         for kmer in _local_tf:
             
-            if not kmer in self.kmers:
+            if not kmer in self.kmer2p:
                 self.pointer += 1
                 self.kmer2p[kmer] = self.pointer
                 self.kmers.append(kmer)
@@ -75,99 +84,73 @@ class KmerBasedDistance(object):
         for p in self.local_tf:
             self.local_nf[p] = self.local_tf[p]/n
 
-        # pr.disable()
-        # pr.print_stats()
-        
-
-    def count_tf_df_for_data(self):
+    def count_tf_df_for_data(self, threads=1):
+        ''' Count tf/df and postings of k-mers for data.
+        For k <= 32 documents are counted as packed k-mer tables,
+        with threads > 1 in a process pool. Pointers are given to k-mers
+        in order of their first document, so result doesn't depend on threads.
         '''
-        '''
-        print "Count tf/df for data"
-        for docid in xrange(self.N):
-
-            import cProfile, pstats, io
-            pr = cProfile.Profile(timeunit=1)
-            pr.enable()
-            
-
-            
-            
-            #self.count_kmers(docid)
-
-            sequence = self.data[docid]
-
-            if self.verbose:
-                print "Process tf/df: ", docid, self.N, len(sequence)
-            
-            _local_tf = defaultdict(int)
-            local_nf = {}
-            local_tf = defaultdict(int)
-            local_seen = {}
-            n = float(len(sequence))
-            for i in xrange(0, len(sequence) - self.k + 1):
-                kmer = sequence[i:i + self.k]
-                if self.SKIP_N and 'n' in kmer:
-                    continue
-                _local_tf[kmer] += 1
-            for kmer in _local_tf:
-                
-                if not kmer in self.kmers:
-                    self.pointer += 1
-                    self.kmer2p[kmer] = self.pointer
-                    self.kmers.append(kmer)
-                p = self.kmer2p[kmer]
-                if not p in local_seen:
-                    self.df[p] += 1
-                    local_seen[p] = True
-                self.tf[p] += _local_tf[kmer]
-                local_tf[p] = _local_tf[kmer]
-            for p in local_tf:
-                local_nf[p] = local_tf[p]/n
-
-            for p in local_tf:
-                self.p2docids[p].append(docid)
-                self.p2doctfs[p].append(local_tf[p])
-                self.p2docnfs[p].append(local_nf[p])
-            pr.disable()
-            pr.print_stats()
-        
-        print
+        print("Count tf/df for data")
+        if self.k > KMER_MAX_K or not self.SKIP_N:
+            p2docids = defaultdict(list)
+            p2doctfs = defaultdict(list)
+            for docid in range(self.N):
+                if self.verbose:
+                    print("Process tf/df: ", docid, self.N, len(self.data[docid]))
+                self.count_kmers(docid)
+                for p in self.local_tf:
+                    p2docids[p].append(docid)
+                    p2doctfs[p].append(self.local_tf[p])
+            n = len(self.kmers)
+            self.tf = numpy.array([self.tf[p] for p in range(n)], dtype=numpy.int64)
+            self.df = numpy.array([self.df[p] for p in range(n)], dtype=numpy.int64)
+            self.offsets = get_postings_offsets(self.df)
+            self.docids = numpy.array([x for p in range(n) for x in p2docids[p]], dtype=numpy.int64)
+            self.doctfs = numpy.array([x for p in range(n) for x in p2doctfs[p]], dtype=numpy.int64)
+        else:
+            keys, tf, df, (codes, doc_ids, freqs) = sc_count_kmer_table(self.data, self.k, docids=True, threads=threads)
+            starts = numpy.searchsorted(codes, keys, side="left")
+            order = numpy.lexsort((keys, doc_ids[starts]))
+            self.kmers = decode_kmers(keys[order], self.k)
+            self.kmer2p = dict((kmer, p) for p, kmer in enumerate(self.kmers))
+            self.pointer = len(self.kmers) - 1
+            self.tf = tf[order]
+            self.df = df[order]
+            self.offsets = get_postings_offsets(self.df)
+            positions = numpy.repeat(starts[order] - self.offsets[:-1], self.df) + numpy.arange(self.offsets[-1])
+            self.docids = doc_ids[positions].astype(numpy.int64)
+            self.doctfs = freqs[positions].astype(numpy.int64)
+        lengths = numpy.array([len(sequence) for sequence in self.data], dtype=numpy.float64)
+        self.docnfs = self.doctfs / lengths[self.docids]
+        print()
 
     def compute_distances(self):
+        ''' Compute D as sparse matrix (rows, cols, values) with rows < cols,
+        value is a sum of min(nf) over shared k-mers.
         '''
-        '''
-        print "Compute distances"
-        kmer_n = len(self.df)
-        for m, p in enumerate(self.df):
-            print m, kmer_n, "\r",
-            if self.df[p] == 1:
-                continue
-            docids = self.p2docids[p]
-            for i, docid_a in enumerate(docids):
-                for j, docid_b in enumerate(docids[i+1:]):
-                    if docid_a < docid_b:
-                        key = "%s\t%s" % (docid_a, docid_b)
-                    else:
-                        key = "%s\t%s" % (docid_b, docid_a)
-                    self.D[key] += min(
-                                self.p2docnfs[p][i],
-                                self.p2docnfs[p][j]
-                    )
-        print
+        print("Compute distances")
+        self.D = get_postings_similarity(self.offsets, self.docids, self.docnfs)
+        print()
 
     def save_index_to_file(self, file_name):
         '''
         '''
-        print "Save index data"
+        print("Save index data")
+        offsets = self.offsets.tolist()
+        docids = self.docids.tolist()
+        doctfs = self.doctfs.tolist()
+        docnfs = self.docnfs.tolist()
         with open(file_name, "w") as fh:
             for p, kmer in enumerate(self.kmers):
+                start = offsets[p]
+                end = offsets[p + 1]
                 d = (kmer, 
                          get_revcomp(kmer),
                          self.tf[p],
                          self.df[p],
-                         ",".join(map(str, self.p2docids[p])),
-                         ",".join(map(str, self.p2doctfs[p])),
-                         ",".join(map(str, self.p2docnfs[p])),
+                         ",".join(map(str, docids[start:end])),
+                         ",".join(map(str, doctfs[start:end])),
+                         ",".join(map(str, docnfs[start:end])),
                     )
                 d = "\t".join(map(str, d)) 
                 fh.write("%s\n" % d)
@@ -175,10 +158,8 @@ class KmerBasedDistance(object):
     def save_distances_to_file(self, file_name):
         '''
         '''
-        print "Save distance data"
-        with open(file_name, "w") as fh:
-            for key, value in self.D.items():
-                fh.write("%s\t%s\n" % (key, value))
+        print("Save distance data")
+        write_similarity_file(file_name, *self.D)
 
 def compute_kmer_profiles_for_trs(trf_large_file, output_folder, k):
     '''
@@ -186,7 +167,7 @@ def compute_kmer_profiles_for_trs(trf_large_file, output_folder, k):
     if not os.path.isdir(output_folder):
         os.makedirs(output_folder)
     for i, trf_obj in enumerate(sc_iter_tab_file(trf_large_file, TRModel)):
-        print "Compute for", i, "\r",
+        print("Compute for", i, end="\r")
         file_name = os.path.join(output_folder, "%s.ngram" % str(trf_obj.trf_id))
         ngrams = get_ngrams_freq(trf_obj.trf_array, m=NGRAM_N, n=k)
         with open(file_name, "w") as fh:
@@ -197,7 +178,7 @@ def compute_kmer_profiles_for_trs(trf_large_file, output_folder, k):
                 else:
                     data = "%s\t%s\t%s\t%s\n" % (rngram, ngram, tf, nf)
                 fh.write(data)
-    print
+    print()
 
 
 def get_dust_score(sequence, k=4):
@@ -220,17 +201,17 @@ def compile_ngrams(trf_large_file, ngram_index_file, k=NGRAM_LENGTH, cutoff=None
 
     data = []
     trf_index = []
-    print "Read arrays..."
+    print("Read arrays...")
     trf_index = get_all_trf_objs(trf_large_file)
     trf_index = [trf_obj for trf_obj in trf_index if trf_obj.trf_array_length >= k]
     data = [trf_obj.trf_array for trf_obj in trf_index]
-    print "Skipped %s arrays as short" % (len(trf_index) - len(data))
-    print "Process kmers..."
+    print("Skipped %s arrays as short" % (len(trf_index) - len(data)))
+    print("Process kmers...")
     index_data = process_list_to_kmer_index(data, k, docids=True, cutoff=cutoff)
     _process_index_data_to_file(ngram_index_file, index_data, k, dust=dust, trf_index=trf_index)
 
 def _process_index_data_to_file(ngram_index_file, index_data, k, dust=False, trf_index=None):
-    print "Sort data..."
+    print("Sort data...")
     result = []
     skipped_by_dust = 0
     for i, (key, revkey, tf, df, docids, freqs) in enumerate(index_data):
@@ -259,16 +240,16 @@ def _process_index_data_to_file(ngram_index_file, index_data, k, dust=False, trf
         data = "%s\n" % "\t".join(map(str, data))
         result.append(data)
     if dust:
-        print "Skipped by dust:", skipped_by_dust
-    print "Save data to %s..." % ngram_index_file
+        print("Skipped by dust:", skipped_by_dust)
+    print("Save data to %s..." % ngram_index_file)
     with open(ngram_index_file, "w") as fh:
         fh.writelines(result)
 
 def compile_kmer_index_from_arrays(arrays, ngram_index_file, k=NGRAM_LENGTH):
     """ Compile ngrams collection for given project."""
-    print "Process kmers..." 
+    print("Process kmers...")
     index_data = process_list_to_kmer_index(arrays, k, docids=True)
-    print "Sort data..."
+    print("Sort data...")
     result = []
     for i, (key, revkey, tf, df, docids, freqs) in enumerate(index_data):
         new_doc_ids = []
@@ -277,90 +258,52 @@ def compile_kmer_index_from_arrays(arrays, ngram_index_file, k=NGRAM_LENGTH):
         data = [key, revkey, tf, df, ",".join(map(str, new_doc_ids)), ",".join(map(str, freqs))]
         data = "%s\n" % "\t".join(map(str, data))
         result.append(data)
-    print "Save data..."
+    print("Save data...")
     with open(ngram_index_file, "w") as fh:
         fh.writelines(result)
 
 def compile_kmer_index_from_kmer_profiles():
     pass
 
-def compute_distances(index_objs, id2length, index_function=None):
-    ''' Compute distance between kmer profiles.
+def _iter_index_postings(index, id2length=None, from_objs=False):
+    ''' Yield (docids, freqs) of index rows or index objects,
+    freqs are divided by document lengths if id2length is given.
+    Rows are released after use.
     '''
-    print "Compute distances..."
-    n = len(index_objs)
-    D = {}
-    KEYS_CUTOFF = 1000000
-    chunk = 0
-    for k, kmer_index in enumerate(index_objs):
-        ids = kmer_index.docs
-        print "Current size", len(ids)
-        for i, trid_a in enumerate(ids):
-            print k, n, i, len(ids), "\r",
-            for j, trid_b in enumerate(ids[i+1:]):
-                if trid_a < trid_b:
-                    key = "%s\t%s" % (trid_a, trid_b)
-                else:
-                    key = "%s\t%s" % (trid_b, trid_a)
-                D.setdefault(key, 0.0)
-                D[key] += min(
-                            kmer_index.freqs[i]*1./id2length[trid_a],
-                            kmer_index.freqs[j]*1./id2length[trid_b]
-                )
-        if len(D) > KEYS_CUTOFF:
-            print "save D for chunk", chunk
-            file_name = "chunk%s.dat" % chunk
-            chunk += 1
-            with open(file_name, "w") as fh:
-                for key in D:
-                    s = "%s\t%s\n" % (key, D[key])
-                    fh.write(s)
-            D = {}
-        index_objs[k] = None
-    return D
-
-def compute_distances_for_index(index, id2length, index_function=None):
-    ''' Compute distance between kmer profiles.
-    '''
-    print "Compute distances..."
-    n = len(index)
-    D = {}
     for k, kmer_index in enumerate(index):
-        ids = kmer_index[4]
-        for i, trid_a in enumerate(ids):
-            print k, n, i, len(ids), "\r",
-            for j, trid_b in enumerate(ids[i+1:]):
-                if trid_a < trid_b:
-                    key = "%s\t%s" % (trid_a, trid_b)
-                else:
-                    key = "%s\t%s" % (trid_b, trid_a)
-                D.setdefault(key, 0.0)
-                D[key] += min(
-                            kmer_index[5][i]*1./id2length[trid_a],
-                            kmer_index[5][j]*1./id2length[trid_b]
-                )
+        if from_objs:
+            ids, freqs = kmer_index.docs, kmer_index.freqs
+        else:
+            ids, freqs = kmer_index[4], kmer_index[5]
+        if id2length is not None:
+            freqs = [freq * 1. / id2length[trid] for trid, freq in zip(ids, freqs)]
+        yield ids, freqs
         index[k] = None
-    return D
 
-def compute_distances_for_index_by_raw_kmers(index, id2length, index_function=None):
-    ''' Compute distance between kmer profiles.
+def compute_distances(index_objs, id2length, output_file, max_memory=KMER_SIMILARITY_MEMORY,
+                      top_k=None, temp_dir=None):
+    ''' Compute distance between kmer profiles of index objects,
+    distance is a sum of min(freq/length) over shared kmers.
+    Write one distance file, see sc_compute_distances, return number of pairs.
     '''
-    print "Compute distances..."
-    n = len(index)
-    D = {}
-    for k, kmer_index in enumerate(index):
-        ids = kmer_index[4]
-        for i, trid_a in enumerate(ids):
-            print k, n, i, len(ids), "\r",
-            for j, trid_b in enumerate(ids[i+1:]):
-                if trid_a < trid_b:
-                    key = "%s\t%s" % (trid_a, trid_b)
-                else:
-                    key = "%s\t%s" % (trid_b, trid_a)
-                D.setdefault(key, 0.0)
-                D[key] += min(
-                            kmer_index[5][i],
-                            kmer_index[5][j]
-                )
-        index[k] = None
-    return D
\ No newline at end of file
+    print("Compute distances...")
+    postings = _iter_index_postings(index_objs, id2length=id2length, from_objs=True)
+    return sc_compute_distances(postings, output_file, max_memory=max_memory, top_k=top_k, temp_dir=temp_dir)
+
+def compute_distances_for_index(index, id2length, output_file, max_memory=KMER_SIMILARITY_MEMORY,
+                                top_k=None, temp_dir=None):
+    ''' Compute distance between kmer profiles of index rows (kmer, revkmer, tf, df, docids, freqs),
+    distance is a sum of min(freq/length) over shared kmers.
+    '''
+    print("Compute distances...")
+    postings = _iter_index_postings(index, id2length=id2length)
+    return sc_compute_distances(postings, output_file, max_memory=max_memory, top_k=top_k, temp_dir=temp_dir)
+
+def compute_distances_for_index_by_raw_kmers(index, id2length, output_file, max_memory=KMER_SIMILARITY_MEMORY,
+                                             top_k=None, temp_dir=None):
+    ''' Compute distance between kmer profiles of index rows,
+    distance is a sum of min(freq) over shared kmers.
+    '''
+    print("Compute distances...")
+    postings = _iter_index_postings(index)
+    return sc_compute_distances(postings, output_file, max_memory=max_memory, top_k=top_k, temp_dir=temp_dir)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+External memory construction of k-mer index file for k <= 32.
+
+Canonical k-mer codes are counted by chunks within memory limit,
+chunk counts are spilled to disk as sorted runs and k-way merged
+by blocks. Merged k-mers are placed in df order with counting sort
+(a seek per df value of each block), so index file has the same format and order
+as process_list_to_kmer_index result with docids=False:
+
+kmer, revkmer, tf, df, None, None
+
+Runs keep first and last docid of each k-mer, a sequence split between
+two chunks is counted once in df.
+
+Shortcuts:
+
+- sc_compute_kmer_index(sequences, index_file, k=23, cutoff=None, max_memory=1024, max_complexity=None, min_complexity=None, temp_dir=None, verbose=True) -> number of k-mers
+"""
+import os
+import shutil
+import tempfile
+import numpy
+from trseeker.tools.kmer_codec import KMER_MAX_K, get_kmer_codes, get_revcomp_codes, decode_kmers
+from trseeker.tools.complexity import get_zlib_complexity
+
+KMER_INDEX_MEMORY = 1024
+KMER_INDEX_BYTES_PER_KMER = 64
+KMER_INDEX_MIN_CHUNK = 1 << 12
+
+RUN_DTYPE = numpy.dtype([("key", "<u8"), ("tf", "<i8"), ("df", "<u4"), ("first", "<u4"), ("last", "<u4")])
+INDEX_DTYPE = numpy.dtype([("key", "<u8"), ("tf", "<i8"), ("df", "<u4")])
+
+
+def _iter_pieces(sequence, k, size):
+    """ Yield overlapping pieces of sequence with no more than size bases."""
+    if len(sequence) <= size:
+        yield sequence
+        return
+    for start in range(0, len(sequence) - k + 1, size - k + 1):
+        yield sequence[start:start + size]
+
+
+def _count_chunk(codes, doc_ids):
+    """ Return run records sorted by key for canonical codes of a chunk."""
+    order = numpy.argsort(codes, kind="stable")
+    codes = codes[order]
+    doc_ids = doc_ids[order]
+    del order
+    new_key = numpy.concatenate(([True], codes[1:] != codes[:-1]))
+    new_doc = new_key.copy()
+    new_doc[1:] |= doc_ids[1:] != doc_ids[:-1]
+    key_starts = numpy.flatnonzero(new_key)
+    key_ends = numpy.append(key_starts[1:], len(codes))
+    run = numpy.empty(len(key_starts), dtype=RUN_DTYPE)
+    run["key"] = codes[key_starts]
+    run["tf"] = key_ends - key_starts
+    run["df"] = numpy.add.reduceat(new_doc.astype(numpy.uint32), key_starts)
+    run["first"] = doc_ids[key_starts]
+    run["last"] = doc_ids[key_ends - 1]
+    return run
+
+
+def _write_runs(sequences, k, chunk_size, temp_dir, verbose):
+    """ Count sequences by chunks and write sorted runs.
+    Return (list of run files, number of sequences).
+    """
+    run_files = []
+    chunk_codes = []
+    chunk_docs = []
+    filled = 0
+    n = 0
+
+    def spill():
+        run = _count_chunk(numpy.concatenate(chunk_codes), numpy.concatenate(chunk_docs))
+        run_file = os.path.join(temp_dir, "run%s.dat" % len(run_files))
+        run.tofile(run_file)
+        run_files.append(run_file)
+        if verbose:
+            print("Spill run %s with %s k-mers (%s sequences)" % (len(run_files), len(run), n))
+
+    for docid, sequence in enumerate(sequences):
+        n = docid + 1
+        for piece in _iter_pieces(sequence, k, chunk_size):
+            codes = get_kmer_codes(piece, k, canonical=True)
+            if not len(codes):
+                continue
+            chunk_codes.append(codes)
+            chunk_docs.append(numpy.full(len(codes), docid, dtype=numpy.uint32))
+            filled += len(codes)
+            if filled >= chunk_size:
+                spill()
+                chunk_codes = []
+                chunk_docs = []
+                filled = 0
+    if filled:
+        spill()
+    return run_files, n
+
+
+def _iter_merged_runs(run_files, block_size):
+    """ K-way merge of sorted runs by blocks.
+    Yield (keys, tf, df) arrays in key order.
+    """
+    handles = [open(x, "rb") for x in run_files]
+    buffers = [numpy.zeros(0, dtype=RUN_DTYPE) for x in run_files]
+    try:
+        while True:
+            for i, fh in enumerate(handles):
+                if fh is not None and not len(buffers[i]):
+                    buffers[i] = numpy.fromfile(fh, dtype=RUN_DTYPE, count=block_size)
+                    if len(buffers[i]) < block_size:
+                        fh.close()
+                        handles[i] = None
+            active = [i for i, buffer in enumerate(buffers) if len(buffer)]
+            if not active:
+                break
+            bounds = [buffers[i]["key"][-1] for i in active if handles[i] is not None]
+            parts = []
+            for i in active:
+                end = len(buffers[i])
+                if bounds:
+                    end = int(numpy.searchsorted(buffers[i]["key"], min(bounds), side="right"))
+                parts.append(buffers[i][:end])
+                buffers[i] = buffers[i][end:]
+            yield _reduce_runs(numpy.concatenate(parts))
+            del parts
+    finally:
+        for fh in handles:
+            if fh is not None:
+                fh.close()
+
+
+def _reduce_runs(part):
+    """ Join run records with the same key, return (keys, tf, df).
+    Records of each key come in run order, a docid shared by
+    last record of one run and first record of the next is counted once.
+    """
+    part = part[numpy.argsort(part["key"], kind="stable")]
+    keys = part["key"]
+    new_key = numpy.concatenate(([True], keys[1:] != keys[:-1]))
+    starts = numpy.flatnonzero(new_key)
+    tf = numpy.add.reduceat(part["tf"], starts)
+    df = numpy.add.reduceat(part["df"].astype(numpy.int64), starts)
+    shared = (~new_key[1:]) & (part["last"][:-1] == part["first"][1:])
+    if shared.any():
+        shared_keys = numpy.cumsum(new_key)[1:][shared] - 1
+        df -= numpy.bincount(shared_keys, minlength=len(starts))
+    return keys[starts], tf, df
+
+
+def _write_merged(run_files, merged_file, cutoff, block_size, verbose):
+    """ Merge runs into key sorted file of INDEX_DTYPE records.
+    Return dictionary df -> number of k-mers.
+    """
+    df2n = {}
+    total = 0
+    with open(merged_file, "wb") as fh:
+        for keys, tf, df in _iter_merged_runs(run_files, block_size):
+            if cutoff:
+                selected = df > cutoff
+                keys = keys[selected]
+                tf = tf[selected]
+                df = df[selected]
+            if not len(keys):
+                continue
+            records = numpy.empty(len(keys), dtype=INDEX_DTYPE)
+            records["key"] = keys
+            records["tf"] = tf
+            records["df"] = df
+            records.tofile(fh)
+            values, counts = numpy.unique(df, return_counts=True)
+            for value, count in zip(values.tolist(), counts.tolist()):
+                df2n[value] = df2n.get(value, 0) + count
+            total += len(keys)
+    if verbose:
+        print("Merged %s runs into %s k-mers" % (len(run_files), total))
+    return df2n
+
+
+def _sort_by_df(merged_file, sorted_file, df2n, block_size):
+    """ Counting sort of key sorted records by df (descending),
+    k-mers with the same df stay in key order.
+    """
+    total = sum(df2n.values())
+    df2start = {}
+    start = 0
+    for value in sorted(df2n, reverse=True):
+        df2start[value] = start
+        start += df2n[value]
+    with open(merged_file, "rb") as fh, open(sorted_file, "wb") as fw:
+        fw.truncate(total * INDEX_DTYPE.itemsize)
+        while True:
+            block = numpy.fromfile(fh, dtype=INDEX_DTYPE, count=block_size)
+            if not len(block):
+                break
+            block = block[numpy.argsort(block["df"], kind="stable")]
+            values, starts, counts = numpy.unique(block["df"], return_index=True, return_counts=True)
+            for value, start, count in zip(values.tolist(), starts.tolist(), counts.tolist()):
+                fw.seek(df2start[value] * INDEX_DTYPE.itemsize)
+                block[start:start + count].tofile(fw)
+                df2start[value] += count
+
+
+def _write_index(sorted_file, index_file, k, block_size, max_complexity, min_complexity):
+    """ Write records as index file lines, return number of written k-mers."""
+    written = 0
+    with open(sorted_file, "rb") as fr, open(index_file, "w") as fh:
+        while True:
+            block = numpy.fromfile(fr, dtype=INDEX_DTYPE, count=block_size)
+            if not len(block):
+                break
+            kmers = decode_kmers(block["key"], k)
+            revkmers = decode_kmers(get_revcomp_codes(block["key"], k), k)
+            tf = block["tf"].tolist()
+            df = block["df"].tolist()
+            for j, kmer in enumerate(kmers):
+                if max_complexity and get_zlib_complexity(kmer) > max_complexity:
+                    continue
+                if min_complexity and get_zlib_complexity(kmer) < min_complexity:
+                    continue
+                fh.write("%s\t%s\t%s\t%s\tNone\tNone\n" % (kmer, revkmers[j], tf[j], df[j]))
+                written += 1
+    return written
+
+
+def sc_compute_kmer_index(sequences, index_file, k=23, cutoff=None, max_memory=KMER_INDEX_MEMORY,
+                          max_complexity=None, min_complexity=None, temp_dir=None, verbose=True):
+    """ Compute k-mer index file for iterable of sequences in external memory.
+
+    Keyword arguments:
+
+    - cutoff          -- write k-mers with df > cutoff
+    - max_memory      -- approximate memory ceiling for counting and merging in Mb
+    - max_complexity, min_complexity -- zlib complexity filter of written k-mers
+    - temp_dir        -- directory for runs (default system temporary directory)
+
+    Return number of written k-mers.
+    """
+    if k > KMER_MAX_K:
+        raise Exception("External k-mer index supports k up to %s, got %s" % (KMER_MAX_K, k))
+    chunk_size = max(int(max_memory * 1024 * 1024) // KMER_INDEX_BYTES_PER_KMER, KMER_INDEX_MIN_CHUNK, 2 * k)
+    work_dir = tempfile.mkdtemp(prefix="kmer_index", dir=temp_dir)
+    try:
+        if verbose:
+            print("Count k-mers by chunks of %s..." % chunk_size)
+        run_files, n = _write_runs(sequences, k, chunk_size, work_dir, verbose)
+        if verbose:
+            print("Readed %s sequences." % n)
+            print("Merge runs...")
+        block_size = max(chunk_size // max(len(run_files), 1), KMER_INDEX_MIN_CHUNK)
+        merged_file = os.path.join(work_dir, "merged.dat")
+        df2n = _write_merged(run_files, merged_file, cutoff, block_size, verbose)
+        for run_file in run_files:
+            os.unlink(run_file)
+        sorted_file = os.path.join(work_dir, "sorted.dat")
+        if verbose:
+            print("Sort by df...")
+        _sort_by_df(merged_file, sorted_file, df2n, chunk_size)
+        os.unlink(merged_file)
+        if verbose:
+            print("Save index...")
+        return _write_index(sorted_file, index_file, k, KMER_INDEX_MIN_CHUNK * 16, max_complexity, min_complexity)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
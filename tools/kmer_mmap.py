@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Memory mapped k-mer tables built from jellyfish dump files (k <= 32).
+
+Table file has a header (magic, k, canonical, count), count sorted uint64
+k-mer codes of kmer_codec and count parallel uint32 tfs. File is opened with
+numpy.memmap, so opening doesn't read the table and repeated runs share
+pages of the OS cache. Lookup is a binary search over mapped codes,
+batch of k-mers is encoded and searched with one numpy.searchsorted call.
+
+Dump is converted by chunks: each chunk is encoded, sorted and spilled
+as a run, runs are merged by blocks, tfs of equal codes are summed
+(forward and reverse k-mers of a dump without -C with canonical=True).
+Both `dump --column --tab` lines and fasta dump (>tf, kmer) are accepted.
+
+- sc_convert_jellyfish_dump(dump_file, table_file, canonical=True, max_memory=1024, temp_dir=None) -> number of k-mers
+- Kmer2tfTable(table_file)
+- sc_open_kmer2tf(dump_file, table_file=None, canonical=True) -> Kmer2tfTable
+"""
+import os
+import shutil
+import tempfile
+import numpy
+from trseeker.tools.kmer_codec import KMER_MAX_K, encode_kmer, encode_sequence, get_canonical_code, \
+    get_canonical_codes, decode_kmers
+from trseeker.tools.read_codec import merge_kmer_counts
+
+KMER_MMAP_MAGIC = b"TRK1"
+KMER_MMAP_MEMORY = 1024
+KMER_MMAP_BYTES_PER_BYTE = 8
+KMER_MMAP_BLOCK = 1 << 20
+
+TABLE_HEADER_DTYPE = numpy.dtype([("magic", "S4"), ("k", "<u4"), ("canonical", "<u4"), ("reserved", "<u4"),
+                                  ("count", "<u8")])
+TABLE_RUN_DTYPE = numpy.dtype([("code", "<u8"), ("tf", "<u8")])
+
+_MAX_TF = numpy.iinfo(numpy.uint32).max
+
+
+def _iter_dump_chunks(dump_file, chunk_bytes):
+    """ Iterate over (kmers, tfs) lists of bytes of a jellyfish dump by chunks."""
+    with open(dump_file, "rb") as fh:
+        while True:
+            lines = fh.readlines(chunk_bytes)
+            if not lines:
+                break
+            fields = b"".join(lines).split()
+            if fields and fields[0].startswith(b">"):
+                if len(fields) % 2:
+                    fields.extend(fh.readline().split())
+                yield fields[1::2], [x[1:] for x in fields[0::2]]
+            else:
+                yield fields[0::2], fields[1::2]
+
+
+def _encode_equal_kmers(kmers, k):
+    """ Return (uint64 codes, valid) for list of k-mers,
+    k-mers of other length or with non ACGT characters aren't valid.
+    """
+    n = len(kmers)
+    codes = numpy.zeros(n, dtype=numpy.uint64)
+    if not n or not k:
+        return codes, numpy.zeros(n, dtype=bool)
+    if isinstance(kmers[0], bytes):
+        kmers = numpy.array(kmers, dtype="S%s" % k)
+    else:
+        kmers = numpy.array(kmers, dtype="U%s" % k).astype("S%s" % k)
+    lengths = numpy.char.str_len(kmers)
+    bases = encode_sequence(kmers.tobytes()).reshape(n, k)
+    valid = (lengths == k) & ~(bases > 3).any(axis=1)
+    two = numpy.uint64(2)
+    for j in range(k):
+        codes <<= two
+        codes |= (bases[:, j] & 3).astype(numpy.uint64)
+    return codes, valid
+
+
+def _write_dump_runs(dump_file, chunk_bytes, canonical, work_dir):
+    """ Encode chunks of dump and write runs of sorted unique codes, return (run files, k)."""
+    run_files = []
+    k = None
+    for kmers, tfs in _iter_dump_chunks(dump_file, chunk_bytes):
+        if not kmers:
+            continue
+        if k is None:
+            k = len(kmers[0])
+            if not 0 < k <= KMER_MAX_K:
+                raise Exception("K-mer table supports k up to %s, got %s" % (KMER_MAX_K, k))
+        codes, valid = _encode_equal_kmers(kmers, k)
+        if not valid.all():
+            raise Exception("Dump %s has k-mer %s not of %s ACGT characters" %
+                            (dump_file, kmers[int(numpy.flatnonzero(~valid)[0])], k))
+        if canonical:
+            codes = get_canonical_codes(codes, k)
+        codes, tfs = merge_kmer_counts(codes, numpy.array(tfs).astype(numpy.uint64))
+        run = numpy.empty(len(codes), dtype=TABLE_RUN_DTYPE)
+        run["code"] = codes
+        run["tf"] = tfs
+        run_file = os.path.join(work_dir, "run%s.dat" % len(run_files))
+        run.tofile(run_file)
+        run_files.append(run_file)
+    return run_files, k
+
+
+def _iter_merged_runs(run_files, block_size):
+    """ K-way merge of sorted runs of unique codes by blocks.
+    Yield (codes, tfs) in code order with tfs of equal codes summed.
+    """
+    handles = [open(x, "rb") for x in run_files]
+    buffers = [numpy.zeros(0, dtype=TABLE_RUN_DTYPE) for x in run_files]
+    try:
+        while True:
+            for i, fh in enumerate(handles):
+                if fh is not None and not len(buffers[i]):
+                    buffers[i] = numpy.fromfile(fh, dtype=TABLE_RUN_DTYPE, count=block_size)
+                    if len(buffers[i]) < block_size:
+                        fh.close()
+                        handles[i] = None
+            active = [i for i, buffer in enumerate(buffers) if len(buffer)]
+            if not active:
+                break
+            bounds = [buffers[i]["code"][-1] for i in active if handles[i] is not None]
+            parts = []
+            for i in active:
+                end = len(buffers[i])
+                if bounds:
+                    end = int(numpy.searchsorted(buffers[i]["code"], min(bounds), side="right"))
+                parts.append(buffers[i][:end])
+                buffers[i] = buffers[i][end:]
+            part = numpy.concatenate(parts)
+            yield merge_kmer_counts(part["code"], part["tf"])
+            del parts, part
+    finally:
+        for fh in handles:
+            if fh is not None:
+                fh.close()
+
+
+def _write_table(table_file, k, canonical, merged, work_dir):
+    """ Write header, codes and tfs of merged (codes, tfs) blocks, return number of k-mers."""
+    codes_file = os.path.join(work_dir, "codes.dat")
+    tfs_file = os.path.join(work_dir, "tfs.dat")
+    count = 0
+    with open(codes_file, "wb") as fc, open(tfs_file, "wb") as ft:
+        for codes, tfs in merged:
+            codes.tofile(fc)
+            numpy.minimum(tfs, _MAX_TF).astype("<u4").tofile(ft)
+            count += len(codes)
+    header = numpy.zeros(1, dtype=TABLE_HEADER_DTYPE)
+    header[0] = (KMER_MMAP_MAGIC, k or 0, int(canonical), 0, count)
+    with open(table_file, "wb") as fh:
+        header.tofile(fh)
+        for file_name in (codes_file, tfs_file):
+            with open(file_name, "rb") as fr:
+                shutil.copyfileobj(fr, fh, KMER_MMAP_BLOCK)
+    return count
+
+
+def sc_convert_jellyfish_dump(dump_file, table_file, canonical=True, max_memory=KMER_MMAP_MEMORY, temp_dir=None,
+                              verbose=True):
+    """ Convert jellyfish dump file into memory mapped k-mer table.
+
+    Keyword arguments:
+
+    - canonical       -- keep min(kmer, revkmer) codes, lookups are canonicalized too
+    - max_memory      -- approximate memory ceiling for parsing and sorting of chunks in Mb
+    - temp_dir        -- directory for runs (default system temporary directory)
+
+    Return number of k-mers in the table.
+    """
+    chunk_bytes = max(int(max_memory * 1024 * 1024) // KMER_MMAP_BYTES_PER_BYTE, 1 << 16)
+    work_dir = tempfile.mkdtemp(prefix="kmer_mmap", dir=temp_dir)
+    try:
+        if verbose:
+            print("Sort chunks of %s..." % dump_file)
+        run_files, k = _write_dump_runs(dump_file, chunk_bytes, canonical, work_dir)
+        if verbose:
+            print("Merge %s runs..." % len(run_files))
+        block_size = max(KMER_MMAP_BLOCK * 4 // max(len(run_files), 1), 1 << 12)
+        count = _write_table(table_file, k, canonical, _iter_merged_runs(run_files, block_size), work_dir)
+        if verbose:
+            print("Written %s k-mers to %s" % (count, table_file))
+        return count
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class Kmer2tfTable(object):
+    """ Read only kmer2tf mapping over memory mapped k-mer table.
+    Missing k-mers have tf 0, as in jellyfish queries.
+    """
+
+    def __init__(self, table_file):
+        self.table_file = table_file
+        with open(table_file, "rb") as fh:
+            header = numpy.fromfile(fh, dtype=TABLE_HEADER_DTYPE, count=1)
+        if not len(header) or header[0]["magic"] != KMER_MMAP_MAGIC:
+            raise Exception("Not a k-mer table file: %s" % table_file)
+        self.k = int(header[0]["k"])
+        self.canonical = bool(header[0]["canonical"])
+        count = int(header[0]["count"])
+        if count:
+            offset = TABLE_HEADER_DTYPE.itemsize
+            self.codes = numpy.memmap(table_file, dtype="<u8", mode="r", offset=offset, shape=(count,))
+            self.tfs = numpy.memmap(table_file, dtype="<u4", mode="r", offset=offset + 8 * count, shape=(count,))
+        else:
+            self.codes = numpy.zeros(0, dtype=numpy.uint64)
+            self.tfs = numpy.zeros(0, dtype=numpy.uint32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _find(self, codes):
+        """ Return (positions, found) of codes in the table."""
+        codes = numpy.asarray(codes, dtype=numpy.uint64)
+        if self.canonical and self.k:
+            codes = get_canonical_codes(codes, self.k)
+        if not len(self.codes):
+            return numpy.zeros(len(codes), dtype=numpy.int64), numpy.zeros(len(codes), dtype=bool)
+        order = numpy.argsort(codes, kind="stable")
+        positions = numpy.empty(len(codes), dtype=numpy.int64)
+        # sorted queries touch mapped pages in file order
+        positions[order] = numpy.searchsorted(self.codes, codes[order])
+        positions = numpy.minimum(positions, len(self.codes) - 1)
+        return positions, self.codes[positions] == codes
+
+    def get_code_counts(self, codes):
+        """ Return int64 array of tfs of k-mer codes."""
+        positions, found = self._find(codes)
+        if not len(self.tfs):
+            return numpy.zeros(len(positions), dtype=numpy.int64)
+        return numpy.where(found, self.tfs[positions], 0).astype(numpy.int64)
+
+    def get_counts(self, kmers):
+        """ Return int64 array of tfs of list of k-mers, k-mers of other length
+        or with non ACGT characters have tf 0.
+        """
+        codes, valid = _encode_equal_kmers(kmers, self.k)
+        return numpy.where(valid, self.get_code_counts(codes), 0)
+
+    def _find_kmer(self, kmer):
+        """ Return position of k-mer in the table or None."""
+        if isinstance(kmer, bytes):
+            kmer = kmer.decode("ascii", "replace")
+        if len(kmer) != self.k or not len(self.codes):
+            return None
+        try:
+            code = encode_kmer(kmer)
+        except Exception:
+            return None
+        if self.canonical:
+            code = get_canonical_code(code, self.k)
+        position = int(numpy.searchsorted(self.codes, numpy.uint64(code)))
+        if position < len(self.codes) and int(self.codes[position]) == code:
+            return position
+        return None
+
+    def __getitem__(self, kmer):
+        return self.get(kmer, 0)
+
+    def get(self, kmer, default=None):
+        position = self._find_kmer(kmer)
+        if position is None:
+            return default
+        return int(self.tfs[position])
+
+    def __contains__(self, kmer):
+        return self.get(kmer) is not None
+
+    def iter_kmers(self):
+        """ Iterate over (kmer, tf) in code order, k-mers are upper case as in jellyfish dump."""
+        for start in range(0, len(self.codes), KMER_MMAP_BLOCK):
+            kmers = decode_kmers(self.codes[start:start + KMER_MMAP_BLOCK], self.k)
+            for kmer, tf in zip(kmers, self.tfs[start:start + KMER_MMAP_BLOCK].tolist()):
+                yield kmer.upper(), tf
+
+    def close(self):
+        """ Release mapped arrays."""
+        self.codes = numpy.zeros(0, dtype=numpy.uint64)
+        self.tfs = numpy.zeros(0, dtype=numpy.uint32)
+
+
+def sc_open_kmer2tf(dump_file, table_file=None, canonical=True, temp_dir=None, verbose=True):
+    """ Return Kmer2tfTable for jellyfish dump file, the table (dump_file.kmt by default)
+    is converted only if it is missing or older than the dump.
+    """
+    if table_file is None:
+        table_file = dump_file + ".kmt"
+    if not os.path.isfile(table_file) or os.path.getmtime(table_file) < os.path.getmtime(dump_file):
+        sc_convert_jellyfish_dump(dump_file, table_file, canonical=canonical, temp_dir=temp_dir, verbose=verbose)
+    return Kmer2tfTable(table_file)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Similarity of documents by shared k-mers over an inverted index.
+
+Inverted index is kept as integer arrays in CSR layout:
+postings of k-mer p are docids[offsets[p]:offsets[p+1]] (ascending)
+with frequencies freqs[offsets[p]:offsets[p+1]].
+
+Similarity of documents a < b is a sum of min(freq_a, freq_b) over
+k-mers of both documents. Pairs are generated with NumPy by groups
+of k-mers with the same df and accumulated into a sparse COO matrix
+(rows, cols, values) sorted by rows and cols.
+
+- get_postings_offsets(df) -> int64 array
+- iter_postings_pairs(offsets, docids, freqs, block_size=KMER_SIMILARITY_BLOCK) ~> (rows, cols, values)
+- get_postings_similarity(offsets, docids, freqs, block_size=KMER_SIMILARITY_BLOCK) -> (rows, cols, values)
+- write_similarity_file(file_name, rows, cols, values)
+- sc_compute_distances(postings, output_file, max_memory=1024, top_k=None, temp_dir=None, verbose=True) -> number of pairs
+
+sc_compute_distances is the bounded memory engine for a stream of
+(docids, freqs) postings: pairs are expanded by blocks of postings,
+partial sums are flushed as sorted binary runs of (pair key, value)
+and a final k-way merge sums values of each pair once.
+
+top_k is applied after the merge (second pass over the merged file),
+so runs, disk and merge cost grow with all pairs, not with top_k.
+Weak edges aren't dropped from runs: a run has partial sums only and
+a pair dropped from one run would be written with a wrong sum.
+"""
+import os
+import shutil
+import tempfile
+import numpy
+from trseeker.tools.read_codec import add_merged_part
+
+KMER_SIMILARITY_BLOCK = 1 << 22
+KMER_SIMILARITY_MAX_DENSE_DF = 256
+KMER_SIMILARITY_MEMORY = 1024
+KMER_SIMILARITY_BYTES_PER_PAIR = 64
+KMER_SIMILARITY_MIN_BLOCK = 1 << 12
+KMER_SIMILARITY_MAX_RUNS = 64
+
+PAIR_DTYPE = numpy.dtype([("key", "<u8"), ("value", "<f8")])
+
+
+def get_postings_offsets(df):
+    """ Return CSR offsets for postings lengths."""
+    offsets = numpy.zeros(len(df) + 1, dtype=numpy.int64)
+    numpy.cumsum(df, out=offsets[1:])
+    return offsets
+
+
+def iter_postings_pairs(offsets, docids, freqs, block_size=KMER_SIMILARITY_BLOCK):
+    """ Yield (rows, cols, values) blocks of document pairs sharing a k-mer,
+    rows < cols and values are min frequencies. Pairs of k-mers with
+    the same df are generated with one upper triangle index.
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    docids = numpy.asarray(docids, dtype=numpy.int64)
+    freqs = numpy.asarray(freqs)
+    df = numpy.diff(offsets)
+    for value in numpy.unique(df[df > 1]).tolist():
+        pointers = numpy.flatnonzero(df == value)
+        if value > KMER_SIMILARITY_MAX_DENSE_DF:
+            for p in pointers.tolist():
+                docs = docids[offsets[p]:offsets[p + 1]]
+                doc_freqs = freqs[offsets[p]:offsets[p + 1]]
+                for i in range(value - 1):
+                    yield (numpy.full(value - i - 1, docs[i], dtype=numpy.int64), docs[i + 1:],
+                           numpy.minimum(doc_freqs[i], doc_freqs[i + 1:]))
+            continue
+        first, second = numpy.triu_indices(value, 1)
+        step = max(1, block_size // len(first))
+        for start in range(0, len(pointers), step):
+            positions = offsets[pointers[start:start + step]][:, None] + numpy.arange(value)
+            docs = docids[positions]
+            doc_freqs = freqs[positions]
+            yield (docs[:, first].ravel(), docs[:, second].ravel(),
+                   numpy.minimum(doc_freqs[:, first], doc_freqs[:, second]).ravel())
+
+
+def _reduce_pairs(keys, values):
+    """ Sum values of equal keys, return sorted keys and sums."""
+    order = numpy.argsort(keys, kind="stable")
+    keys = keys[order]
+    values = values[order]
+    if not len(keys):
+        return keys, values
+    starts = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[starts], numpy.add.reduceat(values, starts)
+
+
+def _merge_pair_parts(parts):
+    """ Return (keys, values) of reduced pairs of parts."""
+    return _reduce_pairs(numpy.concatenate([x[0] for x in parts]), numpy.concatenate([x[1] for x in parts]))
+
+
+def get_postings_similarity(offsets, docids, freqs, block_size=KMER_SIMILARITY_BLOCK):
+    """ Return COO similarity matrix (rows, cols, values) for inverted index,
+    pairs are sorted by rows and cols.
+    """
+    n = int(numpy.max(docids)) + 1 if len(docids) else 0
+    parts = [(numpy.zeros(0, dtype=numpy.uint64), numpy.zeros(0, dtype=numpy.float64))]
+    buffer_keys = []
+    buffer_values = []
+    buffered = 0
+    for rows, cols, block_values in iter_postings_pairs(offsets, docids, freqs, block_size=block_size):
+        buffer_keys.append(rows.astype(numpy.uint64) * numpy.uint64(n) + cols.astype(numpy.uint64))
+        buffer_values.append(block_values.astype(numpy.float64))
+        buffered += len(rows)
+        if buffered >= block_size:
+            add_merged_part(parts, _reduce_pairs(numpy.concatenate(buffer_keys), numpy.concatenate(buffer_values)),
+                            _merge_pair_parts)
+            buffer_keys = []
+            buffer_values = []
+            buffered = 0
+    if buffer_keys:
+        add_merged_part(parts, _reduce_pairs(numpy.concatenate(buffer_keys), numpy.concatenate(buffer_values)),
+                        _merge_pair_parts)
+    keys, values = _merge_pair_parts(parts)
+    del parts
+    if not n:
+        return keys.astype(numpy.int64), keys.astype(numpy.int64), values
+    rows = (keys // numpy.uint64(n)).astype(numpy.int64)
+    cols = (keys % numpy.uint64(n)).astype(numpy.int64)
+    return rows, cols, values
+
+
+def write_similarity_file(file_name, rows, cols, values):
+    """ Write docid_a, docid_b, similarity tab-delimited lines."""
+    with open(file_name, "w") as fh:
+        for start in range(0, len(rows), KMER_SIMILARITY_BLOCK):
+            end = start + KMER_SIMILARITY_BLOCK
+            fh.writelines(["%s\t%s\t%s\n" % x for x in zip(rows[start:end].tolist(),
+                                                            cols[start:end].tolist(),
+                                                            values[start:end].tolist())])
+
+
+def _get_pair_keys(rows, cols):
+    """ Return uint64 keys (min docid << 32 | max docid)."""
+    rows = rows.astype(numpy.uint64)
+    cols = cols.astype(numpy.uint64)
+    return (numpy.minimum(rows, cols) << numpy.uint64(32)) | numpy.maximum(rows, cols)
+
+
+def _iter_postings_blocks(postings, block_size):
+    """ Join stream of (docids, freqs) into CSR blocks (offsets, docids, freqs)."""
+    docids = []
+    freqs = []
+    filled = 0
+    for posting_docids, posting_freqs in postings:
+        if len(posting_docids) < 2:
+            continue
+        docids.append(numpy.asarray(posting_docids, dtype=numpy.int64))
+        freqs.append(numpy.asarray(posting_freqs, dtype=numpy.float64))
+        filled += len(posting_docids) * (len(posting_docids) - 1) // 2
+        if filled >= block_size:
+            yield get_postings_offsets([len(x) for x in docids]), numpy.concatenate(docids), numpy.concatenate(freqs)
+            docids = []
+            freqs = []
+            filled = 0
+    if docids:
+        yield get_postings_offsets([len(x) for x in docids]), numpy.concatenate(docids), numpy.concatenate(freqs)
+
+
+def _write_pair_runs(postings, work_dir, block_size, verbose):
+    """ Accumulate pair sums and spill them as sorted runs, return list of run files."""
+    run_files = []
+    parts = []
+    reduced = 0
+    buffer_keys = []
+    buffer_values = []
+    buffered = 0
+
+    def spill(parts):
+        keys, values = _merge_pair_parts(parts)
+        run = numpy.empty(len(keys), dtype=PAIR_DTYPE)
+        run["key"] = keys
+        run["value"] = values
+        run_file = os.path.join(work_dir, "run%s.dat" % len(run_files))
+        run.tofile(run_file)
+        run_files.append(run_file)
+        if verbose:
+            print("Spill run %s with %s pairs" % (len(run_files), len(run)))
+
+    for offsets, docids, freqs in _iter_postings_blocks(postings, block_size):
+        for rows, cols, block_values in iter_postings_pairs(offsets, docids, freqs, block_size=block_size):
+            buffer_keys.append(_get_pair_keys(rows, cols))
+            buffer_values.append(block_values)
+            buffered += len(rows)
+            if buffered < block_size:
+                continue
+            parts.append(_reduce_pairs(numpy.concatenate(buffer_keys), numpy.concatenate(buffer_values)))
+            reduced += len(parts[-1][0])
+            buffer_keys = []
+            buffer_values = []
+            buffered = 0
+            if reduced >= block_size:
+                spill(parts)
+                parts = []
+                reduced = 0
+    if buffer_keys:
+        parts.append(_reduce_pairs(numpy.concatenate(buffer_keys), numpy.concatenate(buffer_values)))
+    if parts and sum(len(x[0]) for x in parts):
+        spill(parts)
+    return run_files
+
+
+def _iter_merged_pairs(run_files, block_size):
+    """ K-way merge of sorted runs, yield (keys, values) with unique keys in key order."""
+    handles = [open(x, "rb") for x in run_files]
+    buffers = [numpy.zeros(0, dtype=PAIR_DTYPE) for x in run_files]
+    try:
+        while True:
+            for i, fh in enumerate(handles):
+                if fh is not None and not len(buffers[i]):
+                    buffers[i] = numpy.fromfile(fh, dtype=PAIR_DTYPE, count=block_size)
+                    if len(buffers[i]) < block_size:
+                        fh.close()
+                        handles[i] = None
+            active = [i for i, buffer in enumerate(buffers) if len(buffer)]
+            if not active:
+                break
+            bounds = [buffers[i]["key"][-1] for i in active if handles[i] is not None]
+            parts = []
+            for i in active:
+                end = len(buffers[i])
+                if bounds:
+                    end = int(numpy.searchsorted(buffers[i]["key"], min(bounds), side="right"))
+                parts.append(buffers[i][:end])
+                buffers[i] = buffers[i][end:]
+            part = numpy.concatenate(parts)
+            del parts
+            yield _reduce_pairs(part["key"], part["value"])
+    finally:
+        for fh in handles:
+            if fh is not None:
+                fh.close()
+
+
+def _merge_pair_runs(run_files, output_file, block_size):
+    """ Merge runs into one run file, remove runs, return number of pairs."""
+    merge_block = max(block_size // max(len(run_files), 1), KMER_SIMILARITY_MIN_BLOCK)
+    total = 0
+    with open(output_file, "wb") as fh:
+        for keys, values in _iter_merged_pairs(run_files, merge_block):
+            merged = numpy.empty(len(keys), dtype=PAIR_DTYPE)
+            merged["key"] = keys
+            merged["value"] = values
+            merged.tofile(fh)
+            total += len(keys)
+    for run_file in run_files:
+        os.unlink(run_file)
+    return total
+
+
+def _update_top_values(nodes, values, top_nodes, top_values, top_k):
+    """ Keep top_k largest values for each node."""
+    nodes = numpy.concatenate((top_nodes, nodes))
+    values = numpy.concatenate((top_values, values))
+    order = numpy.lexsort((-values, nodes))
+    nodes = nodes[order]
+    values = values[order]
+    starts = numpy.flatnonzero(numpy.concatenate(([True], nodes[1:] != nodes[:-1])))
+    ranks = numpy.arange(len(nodes)) - numpy.repeat(starts, numpy.diff(numpy.append(starts, len(nodes))))
+    selected = ranks < top_k
+    return nodes[selected], values[selected]
+
+
+def _get_thresholds(merged_file, top_k, block_size):
+    """ Return dictionary node -> k-th largest value of its pairs."""
+    top_nodes = numpy.zeros(0, dtype=numpy.uint64)
+    top_values = numpy.zeros(0, dtype=numpy.float64)
+    with open(merged_file, "rb") as fh:
+        while True:
+            block = numpy.fromfile(fh, dtype=PAIR_DTYPE, count=block_size)
+            if not len(block):
+                break
+            nodes = numpy.concatenate((block["key"] >> numpy.uint64(32), block["key"] & numpy.uint64(0xFFFFFFFF)))
+            values = numpy.concatenate((block["value"], block["value"]))
+            top_nodes, top_values = _update_top_values(nodes, values, top_nodes, top_values, top_k)
+    result = {}
+    for node, value in zip(top_nodes.tolist(), top_values.tolist()):
+        result[node] = value
+    return result
+
+
+def sc_compute_distances(postings, output_file, max_memory=KMER_SIMILARITY_MEMORY, top_k=None,
+                         temp_dir=None, verbose=True):
+    """ Compute similarity of documents for stream of (docids, freqs) postings
+    and write docid_a, docid_b, similarity lines (docid_a < docid_b, sorted by pair).
+
+    Keyword arguments:
+
+    - max_memory  -- approximate memory ceiling for pair sums in Mb
+    - top_k       -- keep only pairs in top_k strongest pairs of docid_a or docid_b,
+                     it filters the merged pairs, temp_dir should fit all pairs
+    - temp_dir    -- directory for runs (default system temporary directory)
+
+    Docids should be integers from 0 to 2**32. Return number of written pairs.
+    """
+    block_size = max(int(max_memory * 1024 * 1024) // KMER_SIMILARITY_BYTES_PER_PAIR, KMER_SIMILARITY_MIN_BLOCK)
+    work_dir = tempfile.mkdtemp(prefix="kmer_distances", dir=temp_dir)
+    try:
+        run_files = _write_pair_runs(postings, work_dir, block_size, verbose)
+        n_runs = len(run_files)
+        while len(run_files) > KMER_SIMILARITY_MAX_RUNS:
+            groups = [run_files[i:i + KMER_SIMILARITY_MAX_RUNS]
+                      for i in range(0, len(run_files), KMER_SIMILARITY_MAX_RUNS)]
+            run_files = []
+            for group in groups:
+                run_files.append("%s.merged" % group[0])
+                _merge_pair_runs(group, run_files[-1], block_size)
+        merged_file = os.path.join(work_dir, "merged.dat")
+        total = _merge_pair_runs(run_files, merged_file, block_size)
+        if verbose:
+            print("Merged %s runs into %s pairs" % (n_runs, total))
+        thresholds = None
+        if top_k:
+            thresholds = _get_thresholds(merged_file, top_k, block_size)
+        written = 0
+        with open(merged_file, "rb") as fr, open(output_file, "w") as fw:
+            while True:
+                block = numpy.fromfile(fr, dtype=PAIR_DTYPE, count=KMER_SIMILARITY_MIN_BLOCK * 16)
+                if not len(block):
+                    break
+                rows = (block["key"] >> numpy.uint64(32)).tolist()
+                cols = (block["key"] & numpy.uint64(0xFFFFFFFF)).tolist()
+                values = block["value"].tolist()
+                lines = []
+                for row, col, value in zip(rows, cols, values):
+                    if thresholds is not None and value < thresholds[row] and value < thresholds[col]:
+                        continue
+                    lines.append("%s\t%s\t%s\n" % (row, col, value))
+                fw.writelines(lines)
+                written += len(lines)
+        if verbose:
+            print("Saved %s pairs" % written)
+        return written
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Approximate similarity of TRs with MinHash sketches and LSH banding.
+
+Each array is a set of packed k-mers, sketch is a vector of num_hashes
+minimal hash values (one permutation hashing with densification).
+Sketches are split into bands, arrays with equal band are candidates.
+Exact similarity (sum of min(tf/length) over shared k-mers, as in
+kmer_distance) is computed only for candidate pairs, so arrays sharing
+high-df k-mers don't produce quadratic number of pairs.
+
+Arrays of an LSH bucket larger than max_bucket are paired in overlapping
+windows of max_bucket arrays, neighbouring windows share one array.
+
+Sketches estimate Jaccard similarity of k-mer sets, not tf weighted similarity.
+Copies of one mutated monomer have high similarity but low Jaccard (each
+mutation adds new k-mers), they meet in a bucket rarely and the family
+is connected only if each copy meets some other copies. It depends on family
+size and bands: in bench_kmer_sketch 2000 copies with 32 bands form one big
+component (0.95 of exact pairs connected), 200 copies need 64 bands.
+
+- get_minhash_sketches(offsets, codes, num_hashes=128, seed=42) -> uint64 array (arrays x hashes)
+- get_lsh_candidates(sketches, bands=32, max_bucket=100) -> (rows, cols)
+- get_array_kmers(arrays, k=23, canonical=False, threads=1) -> (offsets, codes, freqs)
+- get_pairs_similarity(offsets, codes, freqs, rows, cols) -> float64 array
+- sc_compute_sketch_distances(arrays, output_file, ids=None, k=23, ...) -> number of pairs
+- sc_compute_sketch_network(trf_file, network_file, k=23, ...) -> number of edges
+
+Network file has trid_a, trid_b, similarity lines for network_tools.compute_network.
+"""
+import numpy
+from trseeker.tools.kmer_codec import hash_codes
+from trseeker.tools.kmer_tables import sc_count_kmer_table
+from trseeker.tools.kmer_similarity import get_postings_offsets, iter_postings_pairs, write_similarity_file
+from trseeker.seqio.tr_dataset import TRDataset
+
+KMER_SKETCH_HASHES = 128
+KMER_SKETCH_BANDS = 32
+KMER_SKETCH_MAX_BUCKET = 100
+KMER_SKETCH_BATCH = 1 << 22
+KMER_SKETCH_ROWS = 1 << 16
+
+_MAX_HASH = numpy.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _get_ranges(starts, lengths):
+    """ Return concatenated ranges start..start+length."""
+    total = int(lengths.sum())
+    shifts = numpy.repeat(starts - numpy.cumsum(lengths) + lengths, lengths)
+    return shifts + numpy.arange(total)
+
+
+def get_minhash_sketches(offsets, codes, num_hashes=KMER_SKETCH_HASHES, seed=42):
+    """ Return one permutation MinHash sketches for k-mer sets in CSR layout
+    (codes of array i are codes[offsets[i]:offsets[i+1]]): hash space is split
+    into num_hashes bins (power of two) and minimal hash of each bin is kept.
+    Empty bins get a value derived from the next non-empty bin (rotation).
+    Arrays without k-mers get max uint64 values.
+    """
+    if num_hashes & (num_hashes - 1):
+        raise Exception("Number of hashes should be a power of two, got %s" % num_hashes)
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    codes = numpy.asarray(codes, dtype=numpy.uint64)
+    n = len(offsets) - 1
+    sketches = numpy.full((n, num_hashes), _MAX_HASH, dtype=numpy.uint64)
+    if not len(codes):
+        return sketches
+    hashes = hash_codes(codes ^ hash_codes(numpy.array([seed], dtype=numpy.uint64))[0])
+    bins = (hashes >> numpy.uint64(64 - num_hashes.bit_length() + 1)).astype(numpy.int64) if num_hashes > 1 \
+        else numpy.zeros(len(hashes), dtype=numpy.int64)
+    doc_ids = numpy.repeat(numpy.arange(n), numpy.diff(offsets))
+    numpy.minimum.at(sketches, (doc_ids, bins), hashes)
+    columns = numpy.arange(2 * num_hashes)
+    for start in range(0, n, KMER_SKETCH_ROWS):
+        block = sketches[start:start + KMER_SKETCH_ROWS]
+        empty = block == _MAX_HASH
+        rows = numpy.flatnonzero(empty.any(axis=1) & ~empty.all(axis=1))
+        if not len(rows):
+            continue
+        doubled = numpy.where(numpy.tile(empty[rows], 2), 2 * num_hashes, columns)
+        following = numpy.minimum.accumulate(doubled[:, ::-1], axis=1)[:, ::-1][:, :num_hashes]
+        values = numpy.take_along_axis(block[rows], following % num_hashes, axis=1)
+        distances = (following - columns[:num_hashes]).astype(numpy.uint64)
+        block[rows] = numpy.where(empty[rows], hash_codes(values ^ distances), block[rows])
+    return sketches
+
+
+def get_lsh_candidates(sketches, bands=KMER_SKETCH_BANDS, max_bucket=KMER_SKETCH_MAX_BUCKET):
+    """ Return candidate pairs (rows, cols) with rows < cols,
+    arrays are candidates if all rows of at least one band are equal.
+    Buckets larger than max_bucket (at least 2) are paired in windows.
+    """
+    if max_bucket < 2:
+        raise Exception("max_bucket should be at least 2, got %s" % max_bucket)
+    n, num_hashes = sketches.shape
+    if num_hashes % bands:
+        raise Exception("Number of hashes %s isn't divisible by %s bands" % (num_hashes, bands))
+    band_rows = num_hashes // bands
+    valid = numpy.flatnonzero(sketches[:, 0] != _MAX_HASH)
+    pair_keys = [numpy.zeros(0, dtype=numpy.uint64)]
+    for band in range(bands):
+        keys = numpy.zeros(len(valid), dtype=numpy.uint64)
+        for j in range(band * band_rows, (band + 1) * band_rows):
+            keys = hash_codes(keys ^ sketches[valid, j])
+        order = numpy.argsort(keys, kind="stable")
+        keys = keys[order]
+        docs = valid[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+        sizes = numpy.diff(numpy.append(starts, len(keys)))
+        buckets = []
+        for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            for window in range(start, start + size - 1, max_bucket - 1):
+                buckets.append(docs[window:min(window + max_bucket, start + size)])
+        if not buckets:
+            continue
+        offsets = get_postings_offsets([len(x) for x in buckets])
+        members = numpy.concatenate(buckets)
+        for rows, cols, values in iter_postings_pairs(offsets, members, members):
+            pair_keys.append((numpy.minimum(rows, cols).astype(numpy.uint64) << numpy.uint64(32)) |
+                             numpy.maximum(rows, cols).astype(numpy.uint64))
+        pair_keys = [numpy.unique(numpy.concatenate(pair_keys))]
+    pair_keys = pair_keys[0]
+    rows = (pair_keys >> numpy.uint64(32)).astype(numpy.int64)
+    cols = (pair_keys & numpy.uint64(0xFFFFFFFF)).astype(numpy.int64)
+    return rows, cols
+
+
+def get_pairs_similarity(offsets, codes, freqs, rows, cols, batch_size=KMER_SKETCH_BATCH):
+    """ Return sum of min(freq) over shared codes for each pair of arrays,
+    codes of each array should be unique and sorted.
+    K-mers of both arrays of a pair are two sorted runs of (pair, k-mer rank) keys,
+    so shared k-mers are adjacent after merge sort.
+    """
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    lengths = numpy.diff(offsets)
+    ranks = numpy.searchsorted(numpy.unique(codes), codes).astype(numpy.uint64)
+    result = numpy.zeros(len(rows), dtype=numpy.float64)
+    pair_sizes = numpy.cumsum(lengths[rows] + lengths[cols])
+    start = 0
+    while start < len(rows):
+        done = pair_sizes[start - 1] if start else 0
+        end = int(numpy.searchsorted(pair_sizes, done + batch_size, side="right"))
+        end = max(end, start + 1)
+        starts = numpy.stack((offsets[rows[start:end]], offsets[cols[start:end]]), axis=1).ravel()
+        sizes = numpy.stack((lengths[rows[start:end]], lengths[cols[start:end]]), axis=1).ravel()
+        positions = _get_ranges(starts, sizes)
+        pairs = numpy.repeat(numpy.arange(end - start, dtype=numpy.uint64), sizes[::2] + sizes[1::2])
+        keys = (pairs << numpy.uint64(32)) | ranks[positions]
+        order = numpy.argsort(keys, kind="stable")
+        keys = keys[order]
+        values = freqs[positions][order]
+        shared = keys[1:] == keys[:-1]
+        result[start:end] = numpy.bincount((keys[1:][shared] >> numpy.uint64(32)).astype(numpy.int64),
+                                           weights=numpy.minimum(values[1:], values[:-1])[shared],
+                                           minlength=end - start)
+        start = end
+    return result
+
+
+def get_array_kmers(arrays, k=23, canonical=False, threads=1):
+    """ Return CSR layout (offsets, codes, freqs) of k-mers of each array,
+    freqs are tf divided by array length.
+    """
+    keys, tf, df, (codes, doc_ids, counts) = sc_count_kmer_table(arrays, k, canonical=canonical,
+                                                                 docids=True, threads=threads)
+    order = numpy.lexsort((codes, doc_ids))
+    codes = codes[order]
+    doc_ids = doc_ids[order].astype(numpy.int64)
+    lengths = numpy.array([len(x) for x in arrays], dtype=numpy.float64)
+    freqs = counts[order] / lengths[doc_ids]
+    offsets = get_postings_offsets(numpy.bincount(doc_ids, minlength=len(arrays)))
+    return offsets, codes, freqs
+
+
+def sc_compute_sketch_distances(arrays, output_file, ids=None, k=23, num_hashes=KMER_SKETCH_HASHES,
+                                bands=KMER_SKETCH_BANDS, max_bucket=KMER_SKETCH_MAX_BUCKET,
+                                min_similarity=0., canonical=False, threads=1, verbose=True):
+    """ Find candidate pairs of arrays by LSH of MinHash sketches and write
+    id_a, id_b, similarity lines for candidates with similarity > min_similarity.
+    Return number of written pairs.
+    """
+    if verbose:
+        print("Count k-mers of %s arrays..." % len(arrays))
+    offsets, codes, freqs = get_array_kmers(arrays, k=k, canonical=canonical, threads=threads)
+    if verbose:
+        print("Compute sketches...")
+    sketches = get_minhash_sketches(offsets, codes, num_hashes=num_hashes)
+    rows, cols = get_lsh_candidates(sketches, bands=bands, max_bucket=max_bucket)
+    if verbose:
+        print("Compute similarity for %s candidates..." % len(rows))
+    values = get_pairs_similarity(offsets, codes, freqs, rows, cols)
+    selected = values > min_similarity
+    rows = rows[selected]
+    cols = cols[selected]
+    values = values[selected]
+    if ids is not None:
+        ids = numpy.asarray(ids)
+        rows = ids[rows]
+        cols = ids[cols]
+    write_similarity_file(output_file, rows, cols, values)
+    return len(values)
+
+
+def sc_compute_sketch_network(trf_file, network_file, k=23, num_hashes=KMER_SKETCH_HASHES,
+                              bands=KMER_SKETCH_BANDS, max_bucket=KMER_SKETCH_MAX_BUCKET,
+                              min_similarity=0., canonical=False, threads=1, verbose=True):
+    """ Write network file of TRs for network_tools.compute_network:
+    trid_a, trid_b, similarity of arrays found by sketches.
+    """
+    with TRDataset.load(trf_file, fields=["trf_id", "trf_array"]) as dataset:
+        ids = dataset["trf_id"]
+        arrays = [x or "" for x in dataset["trf_array"].tolist()]
+    return sc_compute_sketch_distances(arrays, network_file, ids=ids, k=k, num_hashes=num_hashes,
+                                       bands=bands, max_bucket=max_bucket, min_similarity=min_similarity,
+                                       canonical=canonical, threads=threads, verbose=verbose)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+K-mer count tables of documents for k <= 32, counted in a process pool.
+
+Table is a tuple of NumPy arrays sorted by k-mer code:
+
+(keys, tf, df, postings)
+
+where postings is None or (codes, docids, freqs) sorted by code and docid.
+Documents are split into contiguous ranges of similar length, each worker
+returns a table of its range and tables are merged in documents order,
+so result is the same for any number of processes.
+
+- get_kmer_table(data, k, start=0, canonical=False, docids=False) -> table
+- merge_kmer_tables(tables, docids=False) -> table
+- sc_count_kmer_table(data, k, canonical=False, docids=False, threads=1) -> table
+"""
+from multiprocessing import Pool
+import numpy
+from trseeker.tools.kmer_codec import get_kmer_codes, count_kmer_postings
+
+KMER_TASKS_PER_THREAD = 4
+KMER_TABLE_BATCH_SIZE = 1 << 23
+
+
+def _count_batch(codes, doc_ids, docids):
+    keys, tf, df, postings = count_kmer_postings(numpy.concatenate(codes), numpy.concatenate(doc_ids))
+    if not docids:
+        postings = None
+    return keys, tf, df, postings
+
+
+def get_kmer_table(data, k, start=0, canonical=False, docids=False):
+    """ Return table of k-mers for list of sequences, docids start from start.
+    Documents are counted in batches of KMER_TABLE_BATCH_SIZE k-mers.
+    """
+    tables = []
+    codes = [numpy.zeros(0, dtype=numpy.uint64)]
+    doc_ids = [numpy.zeros(0, dtype=numpy.uint32)]
+    batch_size = 0
+    for i, sequence in enumerate(data):
+        doc_codes = get_kmer_codes(sequence, k, canonical=canonical)
+        codes.append(doc_codes)
+        doc_ids.append(numpy.full(len(doc_codes), start + i, dtype=numpy.uint32))
+        batch_size += len(doc_codes)
+        if batch_size >= KMER_TABLE_BATCH_SIZE:
+            tables.append(_count_batch(codes, doc_ids, docids))
+            codes = codes[:1]
+            doc_ids = doc_ids[:1]
+            batch_size = 0
+    if batch_size or not tables:
+        tables.append(_count_batch(codes, doc_ids, docids))
+    return merge_kmer_tables(tables, docids=docids)
+
+
+def merge_kmer_tables(tables, docids=False):
+    """ Merge tables of disjoint document ranges given in documents order."""
+    tables = list(tables)
+    if len(tables) == 1:
+        return tables[0]
+    keys = numpy.concatenate([x[0] for x in tables] + [numpy.zeros(0, dtype=numpy.uint64)])
+    tf = numpy.concatenate([x[1] for x in tables] + [numpy.zeros(0, dtype=numpy.int64)])
+    df = numpy.concatenate([x[2] for x in tables] + [numpy.zeros(0, dtype=numpy.int64)])
+    postings = None
+    if docids:
+        codes = numpy.concatenate([x[3][0] for x in tables] + [numpy.zeros(0, dtype=numpy.uint64)])
+        order = numpy.argsort(codes, kind="stable")
+        postings = (codes[order],
+                    numpy.concatenate([x[3][1] for x in tables] + [numpy.zeros(0, dtype=numpy.uint32)])[order],
+                    numpy.concatenate([x[3][2] for x in tables] + [numpy.zeros(0, dtype=numpy.uint32)])[order])
+    if not len(keys):
+        return keys, tf, df, postings
+    order = numpy.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+    tf = numpy.add.reduceat(tf[order], starts)
+    df = numpy.add.reduceat(df[order], starts)
+    return keys[starts], tf, df, postings
+
+
+def _split_documents(data, parts):
+    """ Return list of (start, end) ranges of documents with similar total length."""
+    lengths = numpy.cumsum([len(x) for x in data])
+    if not len(lengths):
+        return []
+    bounds = numpy.searchsorted(lengths, numpy.linspace(0, lengths[-1], parts + 1)[1:-1], side="right")
+    bounds = sorted(set([0] + bounds.tolist() + [len(data)]))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _count_kmer_table_task(args):
+    """ Pool worker: table of documents range."""
+    data, k, start, canonical, docids = args
+    return get_kmer_table(data, k, start=start, canonical=canonical, docids=docids)
+
+
+def sc_count_kmer_table(data, k, canonical=False, docids=False, threads=1):
+    """ Count k-mers of list of sequences,
+    with threads > 1 ranges of documents are counted in a process pool.
+    """
+    if threads <= 1 or len(data) < 2:
+        return get_kmer_table(data, k, canonical=canonical, docids=docids)
+    tasks = [(data[start:end], k, start, canonical, docids)
+             for start, end in _split_documents(data, threads * KMER_TASKS_PER_THREAD)]
+    pool = Pool(threads)
+    try:
+        tables = pool.map(_count_kmer_table_task, tasks)
+    finally:
+        pool.terminate()
+    return merge_kmer_tables(tables, docids=docids)
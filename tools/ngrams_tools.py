@@ -13,6 +13,12 @@ from trseeker.seqio.tab_file import sc_iter_tab_file
 from trseeker.models.trf_model import TRModel
 from trseeker.seqio.fasta_file import sc_iter_fasta
 from trseeker.tools.complexity import get_zlib_complexity
+from trseeker.tools.kmer_codec import KMER_MAX_K, get_kmer_codes, count_kmer_codes, \
+    count_kmer_postings, decode_kmers, get_revcomp_codes
+from trseeker.tools.kmer_index import sc_compute_kmer_index
+from trseeker.tools.kmer_tables import sc_count_kmer_table
+from trseeker.tools.kmer_cms import get_count_min_sketch, KMER_CMS_MEMORY
+import numpy
 
 
 def generate_ngrams(text, n=12):
@@ -63,9 +69,14 @@ def get_ngrams(text, m=None, n=23, k=None, skip_n=False):
 
 def get_kmer2tf(sequence, k):
     ''' Return kmer to tf dictionary.
+    For k <= 32 k-mers are counted as packed codes, k-mers with non ACGT characters are skipped.
     '''
     kmers = defaultdict(int)
-    for i in xrange(0, len(sequence) - k + 1):
+    if k <= KMER_MAX_K:
+        codes, counts = count_kmer_codes(get_kmer_codes(sequence, k))
+        kmers.update(zip(decode_kmers(codes, k), counts.tolist()))
+        return kmers
+    for i in range(0, len(sequence) - k + 1):
         kmer = sequence[i:i+k].lower()
         if 'n' in kmer:
             continue
@@ -76,8 +87,10 @@ def get_kmer2tf(sequence, k):
 def get_kmers(sequence, k):
     ''' Return kmers.
     '''
+    if k <= KMER_MAX_K:
+        return decode_kmers(numpy.unique(get_kmer_codes(sequence, k)), k)
     kmers = set()
-    for i in xrange(0, len(sequence) - k + 1):
+    for i in range(0, len(sequence) - k + 1):
         kmer = sequence[i:i+k].lower()
         if 'n' in kmer:
             continue
@@ -177,23 +190,18 @@ def get_expessiveness_coefficent(kmern, k):
 def count_kmer_tfdf(sequence, tf_dict, df_dict, k):
     ''' Update tf and df data with k-mers from given sequence.
     '''
-    seen = set()
-    local_tf = defaultdict(int)
+    local_tf = get_kmer2tf(sequence, k)
     local_df = defaultdict(int)
-    sequence = sequence.lower()
-    for (ngram, tf, nf) in get_ngrams_freq(sequence, n=k):
-        if 'n' in ngram:
-            continue
-        seen.add(ngram)
+    for ngram, tf in local_tf.items():
         tf_dict[ngram] += tf
-        local_tf[ngram] += tf
-    for ngram in seen:
         df_dict[ngram] += 1
         local_df[ngram] += 1
     return tf_dict, df_dict, local_tf, local_df
 
-def get_kmer_tf_df_for_data(data, k, docids=False, verbose=True):
+def get_kmer_tf_df_for_data(data, k, docids=False, verbose=True, threads=1):
     '''
+    For k <= 32 documents are counted as packed k-mer tables,
+    with threads > 1 in a process pool, result doesn't depend on threads.
     '''
     df = defaultdict(int)
     tf = defaultdict(int)
@@ -202,6 +210,24 @@ def get_kmer_tf_df_for_data(data, k, docids=False, verbose=True):
     N = len(data)
     if N>100:
         verbose = True
+    if k <= KMER_MAX_K:
+        if verbose:
+            print("Process tf/df: ", N, "documents in", threads, "processes")
+        keys, tf_values, df_values, postings = sc_count_kmer_table(data, k, docids=docids, threads=threads)
+        kmers = decode_kmers(keys, k)
+        tf.update(zip(kmers, tf_values.tolist()))
+        df.update(zip(kmers, df_values.tolist()))
+        if not docids:
+            return tf, df
+        codes, doc_ids, freqs = postings
+        starts = numpy.searchsorted(codes, keys, side="left").tolist()
+        ends = numpy.searchsorted(codes, keys, side="right").tolist()
+        doc_ids = doc_ids.tolist()
+        freqs = freqs.tolist()
+        for kmer, start, end in zip(kmers, starts, ends):
+            kmer2ids[kmer] = doc_ids[start:end]
+            kmer2freq[kmer] = freqs[start:end]
+        return tf, df, kmer2ids, kmer2freq
     for i, sequence in enumerate(data):
         if verbose:
             print("Process tf/df: ", i, N, sep=" ")
@@ -254,70 +280,188 @@ def get_df_stats_for_list(data, k, kmer2df):
     ngram_seqs = [":".join((k,str(f))) for k,f in ngram_seqs[:10]]
     return (maxdf, nmaxdf, pmaxdf, ngram_seqs)
 
-def process_list_to_kmer_index(data, k, docids=True, cutoff=None, verbose=True):
+KMER_INDEX_BATCH_SIZE = 1 << 23
+
+
+def _merge_kmer_counts(keys, tf, df, new_keys, new_tf, new_df):
+    """ Add sorted batch counts to sorted running counts."""
+    if not len(keys):
+        return new_keys, new_tf, new_df
+    pos = numpy.searchsorted(keys, new_keys)
+    found = pos < len(keys)
+    found[found] = keys[pos[found]] == new_keys[found]
+    tf[pos[found]] += new_tf[found]
+    df[pos[found]] += new_df[found]
+    missing = ~found
+    if missing.any():
+        pos = pos[missing]
+        keys = numpy.insert(keys, pos, new_keys[missing])
+        tf = numpy.insert(tf, pos, new_tf[missing])
+        df = numpy.insert(df, pos, new_df[missing])
+    return keys, tf, df
+
+
+def process_list_to_kmer_index(data, k, docids=True, cutoff=None, verbose=True, min_tf=None,
+                               max_memory=KMER_CMS_MEMORY):
     ''' Get list of string.
     Return list of (kmer, revkmer, tf, df, None, None)
     OR
     Return list of (kmer, revkmer, tf, df, docids, freqs)
+
+    Canonical k-mers are counted directly in one pass over data,
+    df is a number of documents with kmer or revkmer.
+    For k <= 32 k-mers are packed codes counted in batches with numpy sort,
+    rows are sorted by df and then by kmer.
+    With min_tf only k-mers with tf >= min_tf are returned, for k <= 32 the first pass
+    builds count-min sketch of max_memory Mb and only k-mers with estimated
+    tf >= min_tf are counted.
     '''
-    if docids:
-        (tf_dict, df_dict, doc_data, freq_data) = get_kmer_tf_df_for_data(data, k, docids=docids, verbose=verbose)
-    else:
-        (tf_dict, df_dict) = get_kmer_tf_df_for_data(data, k, docids=docids, verbose=verbose)
-    result = []
-    seen = set()
-    skipped = 0
-    added = 0
-    if verbose:
-        print("Join data...")
-    for key in df_dict:
+    if k > KMER_MAX_K:
+        result = _process_list_to_kmer_index_strings(data, k, docids=docids, cutoff=cutoff, verbose=verbose)
+        if min_tf:
+            result = [x for x in result if x[2] >= min_tf]
+        return result
+    sketch = None
+    if min_tf:
         if verbose:
-            print(skipped, added, sep=" ")
-        if key in seen:
-            continue
-        revkey = get_revcomp(key)
-        if revkey in seen:
+            print("Build count-min sketch...")
+        sketch = get_count_min_sketch(data, k, max_memory=max_memory, canonical=True)[0]
+    N = len(data)
+    keys = numpy.zeros(0, dtype=numpy.uint64)
+    tf = numpy.zeros(0, dtype=numpy.int64)
+    df = numpy.zeros(0, dtype=numpy.int64)
+    postings = []
+    batch_codes = []
+    batch_docs = []
+    batch_size = 0
+    for i, sequence in enumerate(data):
+        codes = get_kmer_codes(sequence, k, canonical=True)
+        batch_codes.append(codes)
+        batch_docs.append(numpy.full(len(codes), i, dtype=numpy.int32))
+        batch_size += len(codes)
+        if batch_size < KMER_INDEX_BATCH_SIZE and i + 1 < N:
             continue
-        if revkey in df_dict:
-            df = df_dict[key] + df_dict[revkey]
-            tf = tf_dict[key] + tf_dict[revkey]
-            if docids:
-                ids = doc_data[key] + doc_data[revkey]
-                freqs = freq_data[key] + freq_data[revkey]
-        else:
-            df = df_dict[key]
-            tf = tf_dict[key]
-            if docids:
-                ids = doc_data[key]
-                freqs = freq_data[key]
-        # skip by df
-        if cutoff and df <= cutoff:
-            skipped += 1
+        if verbose:
+            print("Process tf/df: ", i + 1, N, sep=" ")
+        batch_codes = numpy.concatenate(batch_codes)
+        batch_docs = numpy.concatenate(batch_docs)
+        if sketch is not None:
+            passed = sketch.get_counts(batch_codes) >= min_tf
+            batch_codes = batch_codes[passed]
+            batch_docs = batch_docs[passed]
+        batch = count_kmer_postings(batch_codes, batch_docs)
+        keys, tf, df = _merge_kmer_counts(keys, tf, df, *batch[:3])
+        if docids:
+            postings.append(batch[3])
+        batch_codes = []
+        batch_docs = []
+        batch_size = 0
+    selected = numpy.arange(len(keys))
+    if min_tf:
+        selected = selected[tf >= min_tf]
+        if verbose:
+            print("Candidates: %s, frequent: %s, false positive rate: %.4f" % (
+                len(keys), len(selected), 1. - len(selected) * 1. / len(keys) if len(keys) else 0.))
+    if cutoff:
+        selected = selected[df[selected] > cutoff]
+    selected = selected[numpy.lexsort((keys[selected], -df[selected]))]
+    kmers = decode_kmers(keys[selected], k)
+    revkmers = decode_kmers(get_revcomp_codes(keys[selected], k), k)
+    tf = tf[selected].tolist()
+    df = df[selected].tolist()
+    result = []
+    if not docids:
+        for j in range(len(kmers)):
+            result.append((kmers[j], revkmers[j], tf[j], df[j], None, None))
+        return result
+    if not postings:
+        return result
+    if verbose:
+        print("Join postings...")
+    codes = numpy.concatenate([x[0] for x in postings])
+    doc_ids = numpy.concatenate([x[1] for x in postings])
+    freqs = numpy.concatenate([x[2] for x in postings])
+    del postings
+    order = numpy.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = numpy.searchsorted(codes, keys[selected], side="left").tolist()
+    ends = numpy.searchsorted(codes, keys[selected], side="right").tolist()
+    doc_ids = doc_ids[order].tolist()
+    freqs = freqs[order].tolist()
+    del order, codes
+    for j in range(len(kmers)):
+        start = starts[j]
+        end = ends[j]
+        result.append((kmers[j], revkmers[j], tf[j], df[j], doc_ids[start:end], freqs[start:end]))
+    return result
+
+def _process_list_to_kmer_index_strings(data, k, docids=True, cutoff=None, verbose=True):
+    ''' String implementation of process_list_to_kmer_index for k > 32.
+    Canonical kmer -> row number, df is tracked with last docid of each row.
+    '''
+    kmer2row = {}
+    kmers = []
+    tf = []
+    df = []
+    last_docid = []
+    ids = []
+    freqs = []
+    N = len(data)
+    for docid, sequence in enumerate(data):
+        if verbose and docid % 1000 == 0:
+            print("Process tf/df: ", docid, N, sep=" ")
+        for kmer, freq in get_kmer2tf(sequence, k).items():
+            revkmer = get_revcomp(kmer)
+            if revkmer < kmer:
+                kmer = revkmer
+            row = kmer2row.get(kmer)
+            if row is None:
+                row = len(kmers)
+                kmer2row[kmer] = row
+                kmers.append(kmer)
+                tf.append(0)
+                df.append(0)
+                last_docid.append(-1)
+                if docids:
+                    ids.append([])
+                    freqs.append([])
+            tf[row] += freq
+            if last_docid[row] != docid:
+                last_docid[row] = docid
+                df[row] += 1
+                if docids:
+                    ids[row].append(docid)
+                    freqs[row].append(freq)
+            elif docids:
+                freqs[row][-1] += freq
+    del kmer2row, last_docid
+    result = []
+    for row, kmer in enumerate(kmers):
+        if cutoff and df[row] <= cutoff:
             continue
-        added += 1
-        if revkey < key:
-            key, revkey = revkey, key
         if docids:
-            result.append((key, revkey, tf, df, ids, freqs))
+            result.append((kmer, get_revcomp(kmer), tf[row], df[row], ids[row], freqs[row]))
         else:
-            result.append((key, revkey, tf, df, None, None))
-        seen.add(key)
-        seen.add(revkey)
-    if verbose:        
-        print()
-    result.sort(key=lambda x: x[-3], reverse=True)
+            result.append((kmer, get_revcomp(kmer), tf[row], df[row], None, None))
+    result.sort(key=lambda x: (-x[3], x[0]))
     return result
 
-def compute_kmer_index_for_fasta_file(file_name, index_file, k=23):
-    """ 
+def compute_kmer_index_for_fasta_file(file_name, index_file, k=23, cutoff=None, max_memory=None, temp_dir=None):
     """
+    With max_memory (Mb) index is computed in external memory,
+    see sc_compute_kmer_index, and number of written k-mers is returned.
+    """
+    if max_memory:
+        sequences = (sequence for header, sequence in sc_iter_fasta(file_name, as_tuples=True))
+        return sc_compute_kmer_index(sequences, index_file, k=k, cutoff=cutoff,
+                                     max_memory=max_memory, temp_dir=temp_dir)
     data = []
     print("Read arrays...")
     for i, seq_obj in enumerate(sc_iter_fasta(file_name)):
         data.append(seq_obj.sequence)
     print("Readed %s arrays." % i)
     print("Compute k-mers...")
-    result = process_list_to_kmer_index(data, k, docids=False)
+    result = process_list_to_kmer_index(data, k, docids=False, cutoff=cutoff)
     print("Save index...")
     with open(index_file, "w") as fh:
         for item in result:
@@ -325,17 +469,25 @@ def compute_kmer_index_for_fasta_file(file_name, index_file, k=23):
             fh.write(s)
     return result
 
-def compute_kmer_index_for_trf_file(file_name, index_file, k=23, max_complexity=None, min_complexity=None):
+def compute_kmer_index_for_trf_file(file_name, index_file, k=23, max_complexity=None, min_complexity=None,
+                                    cutoff=None, max_memory=None, temp_dir=None):
     """
+    With max_memory (Mb) index is computed in external memory,
+    see sc_compute_kmer_index, and number of written k-mers is returned.
     TODO: replace gzip complexity with DUST filter
     """
+    if max_memory:
+        sequences = (trf_obj.trf_array for trf_obj in sc_iter_tab_file(file_name, TRModel))
+        return sc_compute_kmer_index(sequences, index_file, k=k, cutoff=cutoff, max_memory=max_memory,
+                                     max_complexity=max_complexity, min_complexity=min_complexity,
+                                     temp_dir=temp_dir)
     data = []
     print("Read arrays...")
     for i, trf_obj in enumerate(sc_iter_tab_file(file_name, TRModel)):
         data.append(trf_obj.trf_array)
     print("Readed %s arrays." % i)
     print("Compute k-mers...")
-    result = process_list_to_kmer_index(data, k, docids=False)
+    result = process_list_to_kmer_index(data, k, docids=False, cutoff=cutoff)
     print("Save index...")
     with open(index_file, "w") as fh:
         for item in result:
@@ -364,8 +516,8 @@ def get_sequence_kmer_coverage(sequence, kmers, k):
             mismatch += 1
     return match/(n-k+1), variability
 
-def compute_kmers_libraries_from_fasta(fasta_file, k_diaposon):
-    '''
+def compute_kmers_libraries_from_fasta(fasta_file, k_diaposon, min_tf=None, max_memory=KMER_CMS_MEMORY):
+    ''' With min_tf only k-mers with tf >= min_tf are kept (see process_list_to_kmer_index).
     '''
     index2name = {}
     arrays = []
@@ -375,7 +527,7 @@ def compute_kmers_libraries_from_fasta(fasta_file, k_diaposon):
     libraries = {}
     for k in k_diaposon:
         library = {}
-        index = process_list_to_kmer_index(arrays, k, docids=True)
+        index = process_list_to_kmer_index(arrays, k, docids=True, min_tf=min_tf, max_memory=max_memory)
         for kmer, revkmer, tf, df, docids, freqs in index:
             items = []
             for i, docid in enumerate(docids):
@@ -387,8 +539,8 @@ def compute_kmers_libraries_from_fasta(fasta_file, k_diaposon):
         libraries[k] = library
     return libraries
 
-def get_for_and_rev_kmers_from_fastq(fasta_file, k):
-    '''
+def get_for_and_rev_kmers_from_fastq(fasta_file, k, min_tf=None, max_memory=KMER_CMS_MEMORY):
+    ''' With min_tf only k-mers with tf >= min_tf are kept (see process_list_to_kmer_index).
     '''
     index2name = {}
     arrays = []
@@ -396,7 +548,7 @@ def get_for_and_rev_kmers_from_fastq(fasta_file, k):
         index2name[i] = seq_obj.seq_head[1:]
         arrays.append(seq_obj.sequence)
     library = {}
-    index = process_list_to_kmer_index(arrays, k, docids=True)
+    index = process_list_to_kmer_index(arrays, k, docids=True, min_tf=min_tf, max_memory=max_memory)
     for kmer, revkmer, tf, df, docids, freqs in index:
         items = []
         for i, docid in enumerate(docids):
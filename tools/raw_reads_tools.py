@@ -10,7 +10,7 @@
 Short functions for working with collections of raw reads.
 """
 from trseeker.seqio.sra_file import fastq_reader
-from trseeker.tools.jellyfish_tools import query_kmers, query_kmers_new
+from trseeker.tools.jellyfish_tools import query_kmers, query_kmers_new, Kmer2tfAPI_cache
 from collections import Counter, defaultdict
 from trseeker.tools.edit_distance import get_ed_similarity
 
@@ -133,10 +133,14 @@ def raw_reads_continue_kmer_right(kmer, jellyfish_db, cutoff=0):
     ''' Return next kmers for given kmer according to jellyfish database.
 
     @param kmer: given kmer
-    @param jellyfish_db: jellyfish database
+    @param jellyfish_db: jellyfish database, Kmer2tfAPI_cache, object with get_counts (Kmer2tfTable) or defaultdict
     '''
     left_data, right_data = raw_reads_get_variants(kmer)
-    if not isinstance(jellyfish_db, defaultdict):
+    if isinstance(jellyfish_db, Kmer2tfAPI_cache):
+        R = jellyfish_db.get_neighbours(kmer)[1]
+    elif hasattr(jellyfish_db, "get_counts"):
+        R = list(zip(jellyfish_db.get_counts(right_data).tolist(), right_data))
+    elif not isinstance(jellyfish_db, defaultdict):
         R = query_kmers(jellyfish_db, right_data, both_strands=True, verbose=False)
         R = [(int(v),k) for k,v in R.items()]
     else:
@@ -153,10 +157,14 @@ def raw_reads_continue_kmer_left(kmer, jellyfish_db, cutoff=0):
     ''' Return previous kmers for given kmer according to jellyfish database.
 
     @param kmer: given kmer
-    @param jellyfish_db: jellyfish database
+    @param jellyfish_db: jellyfish database, Kmer2tfAPI_cache, object with get_counts (Kmer2tfTable) or defaultdict
     '''
     left_data, right_data = raw_reads_get_variants(kmer)
-    if not isinstance(jellyfish_db, defaultdict):
+    if isinstance(jellyfish_db, Kmer2tfAPI_cache):
+        L = jellyfish_db.get_neighbours(kmer)[0]
+    elif hasattr(jellyfish_db, "get_counts"):
+        L = list(zip(jellyfish_db.get_counts(left_data).tolist(), left_data))
+    elif not isinstance(jellyfish_db, defaultdict):
         L = query_kmers(jellyfish_db, left_data, both_strands=True, verbose=False)
         L = [(int(v),k) for k,v in L.items()]
     else:
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Vectorized 2-bit codec for reads of any length and fixed width binary files
+of counted reads and k-mers.
+
+Read is packed into width = ceil(length / 4) bytes, four nucleotides
+per byte from the high bits (a=0, c=1, g=2, t=3), as codes of kmer_codec.
+Batch of reads is a uint8 array (reads x width) and array of lengths.
+
+Binary file starts with a header (magic, k, width, count) followed by count
+fixed width records, read files can have several such chunks:
+
+- reads (k = 0): (seq uint8[width], length uint32, tf uint64)
+- k-mers (k > 0): (code uint64, tf uint64)
+
+- pack_reads(sequences, width=None) -> (packed, lengths, valid)
+- unpack_reads(packed, lengths) -> [sequence]
+- pad_packed_reads(packed, width) -> packed
+- count_packed_reads(packed, lengths, tfs=None) -> (packed, lengths, tfs)
+- get_read_hashes(packed, lengths) -> uint64 array
+- merge_kmer_counts(codes, tfs) -> (codes, tfs)
+- merge_kmer_parts(parts) -> (codes, tfs)
+- add_merged_part(parts, part, merge)
+- write_packed_header(fh, k, width, count)
+- read_packed_header(fh, file_name) -> (k, width, count)
+- write_packed_chunk(fh, packed, lengths, tfs) -> count
+- iter_packed_chunks(file_name) ~> (packed, lengths, tfs)
+- write_packed_reads(file_name, packed, lengths, tfs) -> count
+- read_packed_reads(file_name) -> (packed, lengths, tfs)
+- write_kmer_counts(file_name, codes, tfs, k) -> count
+- read_kmer_counts(file_name) -> (codes, tfs, k)
+"""
+import os
+import numpy
+from trseeker.tools.kmer_codec import encode_sequence, hash_codes, CODE_TO_NUCLEOTIDE
+
+PACKED_MAGIC = b"TRS2"
+PACKED_HEADER_DTYPE = numpy.dtype([("magic", "S4"), ("k", "<u4"), ("width", "<u4"), ("count", "<u8")])
+KMER_RECORD_DTYPE = numpy.dtype([("code", "<u8"), ("tf", "<u8")])
+
+_DECODE_TABLE = numpy.frombuffer(CODE_TO_NUCLEOTIDE.encode("ascii"), dtype=numpy.uint8)
+_DECODE_BLOCK = 1 << 16
+_SHIFTS = numpy.array([6, 4, 2, 0], dtype=numpy.uint8)
+
+
+def get_read_record_dtype(width):
+    """ Return dtype of fixed width read record."""
+    return numpy.dtype([("seq", "u1", (width,)), ("length", "<u4"), ("tf", "<u8")])
+
+
+def pack_reads(sequences, width=None):
+    """ Pack list of str or bytes sequences into uint8 array (reads x width).
+    Return (packed, lengths, valid), valid is False for reads with non ACGT characters.
+    """
+    n = len(sequences)
+    lengths = numpy.array([len(x) for x in sequences], dtype=numpy.int64)
+    if width is None:
+        width = (int(lengths.max()) + 3) // 4 if n else 0
+    if n and lengths.max() > 4 * width:
+        raise Exception("Read of length %s doesn't fit %s bytes" % (lengths.max(), width))
+    if n and not isinstance(sequences[0], bytes):
+        bases = encode_sequence("".join(sequences))
+    else:
+        bases = encode_sequence(b"".join(sequences))
+    codes = numpy.zeros((n, 4 * width), dtype=numpy.uint8)
+    if n and lengths.min() == lengths.max():
+        bases = bases.reshape(n, -1)
+        valid = ~(bases > 3).any(axis=1)
+        codes[:, :bases.shape[1]] = bases & 3
+    else:
+        rows = numpy.repeat(numpy.arange(n), lengths)
+        columns = numpy.arange(len(bases)) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        valid = numpy.bincount(rows[bases > 3], minlength=n) == 0
+        codes[rows, columns] = bases & 3
+    packed = (codes[:, 0::4] << 6) | (codes[:, 1::4] << 4) | (codes[:, 2::4] << 2) | codes[:, 3::4]
+    return packed, lengths.astype(numpy.uint32), valid
+
+
+def unpack_reads(packed, lengths):
+    """ Return list of lower case sequences for packed reads."""
+    packed = numpy.asarray(packed, dtype=numpy.uint8)
+    lengths = numpy.asarray(lengths).tolist()
+    result = []
+    if not packed.shape[1]:
+        return ["" for x in lengths]
+    for start in range(0, len(packed), _DECODE_BLOCK):
+        block = packed[start:start + _DECODE_BLOCK]
+        letters = _DECODE_TABLE[(block[:, :, None] >> _SHIFTS) & 3].reshape(len(block), -1)
+        rows = numpy.ascontiguousarray(letters).view("S%s" % letters.shape[1]).ravel().tolist()
+        result.extend(x[:length].decode("ascii") for x, length in zip(rows, lengths[start:start + _DECODE_BLOCK]))
+    return result
+
+
+def pad_packed_reads(packed, width):
+    """ Return packed reads padded with zero bytes to width."""
+    if packed.shape[1] == width:
+        return packed
+    result = numpy.zeros((len(packed), width), dtype=numpy.uint8)
+    result[:, :packed.shape[1]] = packed
+    return result
+
+
+def count_packed_reads(packed, lengths, tfs=None):
+    """ Collapse identical reads, tfs are counts of reads (ones by default).
+    Return unique (packed, lengths, tfs) sorted by packed bytes and length.
+    """
+    packed = numpy.asarray(packed, dtype=numpy.uint8)
+    lengths = numpy.asarray(lengths, dtype=numpy.uint32)
+    if tfs is None:
+        tfs = numpy.ones(len(packed), dtype=numpy.uint64)
+    width = packed.shape[1]
+    keys = numpy.concatenate([packed, lengths.astype(">u4").view(numpy.uint8).reshape(-1, 4)], axis=1)
+    keys = numpy.ascontiguousarray(keys).view("V%s" % (width + 4)).ravel()
+    keys, starts, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+    tfs = numpy.bincount(inverse.ravel(), weights=tfs, minlength=len(keys)).astype(numpy.uint64)
+    return packed[starts], lengths[starts], tfs
+
+
+def get_read_hashes(packed, lengths):
+    """ Return uint64 hash of each packed read."""
+    packed = numpy.asarray(packed, dtype=numpy.uint8)
+    words = pad_packed_reads(packed, (packed.shape[1] + 7) // 8 * 8).view("<u8")
+    hashes = hash_codes(numpy.asarray(lengths, dtype=numpy.uint64))
+    for j in range(words.shape[1]):
+        hashes = hash_codes(hashes ^ words[:, j])
+    return hashes
+
+
+def merge_kmer_counts(codes, tfs):
+    """ Sum tfs of equal codes, return sorted unique codes and tfs."""
+    codes = numpy.asarray(codes, dtype=numpy.uint64)
+    tfs = numpy.asarray(tfs, dtype=numpy.uint64)
+    if not len(codes):
+        return codes, tfs
+    order = numpy.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = numpy.flatnonzero(numpy.concatenate(([True], codes[1:] != codes[:-1])))
+    return codes[starts], numpy.add.reduceat(tfs[order], starts)
+
+
+def merge_kmer_parts(parts):
+    """ Return merge_kmer_counts of list of (codes, tfs) parts."""
+    return merge_kmer_counts(numpy.concatenate([x[0] for x in parts] + [numpy.zeros(0, numpy.uint64)]),
+                             numpy.concatenate([x[1] for x in parts] + [numpy.zeros(0, numpy.uint64)]))
+
+
+def add_merged_part(parts, part, merge):
+    """ Append part (tuple of arrays of equal length) to list of counted parts
+    and merge the last two parts with merge([part, part]) -> part while the last
+    one isn't less than half of the previous one. Parts sizes halve along the list,
+    so each item is merged O(log) times and parts keep about twice the distinct items.
+    """
+    parts.append(part)
+    while len(parts) > 1 and 2 * len(parts[-1][-1]) >= len(parts[-2][-1]):
+        last = parts.pop()
+        parts.append(merge([parts.pop(), last]))
+
+
+def write_packed_header(fh, k, width, count):
+    """ Write header of chunk of count records."""
+    header = numpy.zeros(1, dtype=PACKED_HEADER_DTYPE)
+    header[0] = (PACKED_MAGIC, k, width, count)
+    header.tofile(fh)
+
+
+def read_packed_header(fh, file_name):
+    """ Read header of chunk, return (k, width, count)."""
+    header = numpy.fromfile(fh, dtype=PACKED_HEADER_DTYPE, count=1)
+    if not len(header) or header[0]["magic"] != PACKED_MAGIC:
+        raise Exception("Not a packed reads file: %s" % file_name)
+    return int(header[0]["k"]), int(header[0]["width"]), int(header[0]["count"])
+
+
+def write_packed_chunk(fh, packed, lengths, tfs):
+    """ Write header and records of reads to open binary file, return number of records."""
+    packed = numpy.asarray(packed, dtype=numpy.uint8)
+    records = numpy.zeros(len(packed), dtype=get_read_record_dtype(packed.shape[1]))
+    records["seq"] = packed
+    records["length"] = lengths
+    records["tf"] = tfs
+    write_packed_header(fh, 0, packed.shape[1], len(records))
+    records.tofile(fh)
+    return len(records)
+
+
+def iter_packed_chunks(file_name):
+    """ Iterate over (packed, lengths, tfs) chunks of binary file of reads."""
+    with open(file_name, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        while fh.tell() < size:
+            k, width, count = read_packed_header(fh, file_name)
+            if k:
+                raise Exception("File %s has k-mers, not reads" % file_name)
+            records = numpy.fromfile(fh, dtype=get_read_record_dtype(width), count=count)
+            yield records["seq"], records["length"], records["tf"]
+
+
+def write_packed_reads(file_name, packed, lengths, tfs):
+    """ Write fixed width binary file of reads, return number of records."""
+    with open(file_name, "wb") as fh:
+        return write_packed_chunk(fh, packed, lengths, tfs)
+
+
+def read_packed_reads(file_name):
+    """ Read fixed width binary file of reads, return (packed, lengths, tfs)."""
+    with open(file_name, "rb") as fh:
+        k, width, count = read_packed_header(fh, file_name)
+        if k:
+            raise Exception("File %s has k-mers, not reads" % file_name)
+        records = numpy.fromfile(fh, dtype=get_read_record_dtype(width), count=count)
+    return records["seq"], records["length"], records["tf"]
+
+
+def write_kmer_counts(file_name, codes, tfs, k):
+    """ Write fixed width binary file of k-mer codes, return number of records."""
+    records = numpy.zeros(len(codes), dtype=KMER_RECORD_DTYPE)
+    records["code"] = codes
+    records["tf"] = tfs
+    with open(file_name, "wb") as fh:
+        write_packed_header(fh, k, KMER_RECORD_DTYPE.itemsize, len(records))
+        records.tofile(fh)
+    return len(records)
+
+
+def read_kmer_counts(file_name):
+    """ Read fixed width binary file of k-mers, return (codes, tfs, k)."""
+    with open(file_name, "rb") as fh:
+        k, width, count = read_packed_header(fh, file_name)
+        if not k:
+            raise Exception("File %s has reads, not k-mers" % file_name)
+        records = numpy.fromfile(fh, dtype=KMER_RECORD_DTYPE, count=count)
+    return records["code"], records["tf"], k
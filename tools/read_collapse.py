@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#@created: 18.10.2026
+#@author: Aleksey Komissarov
+#@contact: ad3002@gmail.com
+"""
+Collapsing of identical reads of large SRA runs in external memory.
+
+Batches of reads are packed with read_codec, collapsed and spilled
+to partition files by hash of the read, so all copies of a read are in one
+partition. Partitions are counted independently (in a process pool with
+threads > 1), only one partition of distinct reads is kept in memory
+by a process. Sorted partitions are merged by blocks into one file
+of reads sorted by tf.
+
+- iter_read_batches(reads, batch_size) ~> [sequence]
+- write_read_partitions(batches, work_dir, partitions) -> (partition files, skipped reads)
+- iter_collapsed_reads(batches, partitions=64, min_tf=1, temp_dir=None, threads=1, stats=None) ~> (packed, lengths, tfs)
+- sc_collapse_reads(batches, output_file, partitions=64, min_tf=1, temp_dir=None, threads=1) -> (reads, skipped reads)
+"""
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool
+import numpy
+from trseeker.tools.read_codec import pack_reads, count_packed_reads, get_read_hashes, pad_packed_reads, \
+    write_packed_chunk, iter_packed_chunks, write_packed_reads, write_packed_header, read_packed_header, \
+    get_read_record_dtype
+
+READ_COLLAPSE_PARTITIONS = 64
+READ_COLLAPSE_BATCH = 1 << 20
+READ_COLLAPSE_BLOCK = 1 << 22
+
+
+def iter_read_batches(reads, batch_size=READ_COLLAPSE_BATCH):
+    """ Iterate over lists of batch_size sequences of (title, seq) iterable."""
+    batch = []
+    for title, seq in reads:
+        batch.append(seq)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_read_partitions(batches, work_dir, partitions=READ_COLLAPSE_PARTITIONS):
+    """ Spill collapsed batches of reads into partition files by hash of read.
+    Reads with non ACGT characters are skipped.
+    Return (list of partition files, number of skipped reads).
+    """
+    files = [os.path.join(work_dir, "part%s.dat" % i) for i in range(partitions)]
+    for file_name in files:
+        open(file_name, "wb").close()
+    skipped = 0
+    for batch in batches:
+        packed, lengths, valid = pack_reads(batch)
+        skipped += len(batch) - int(valid.sum())
+        packed, lengths, tfs = count_packed_reads(packed[valid], lengths[valid])
+        parts = (get_read_hashes(packed, lengths) % numpy.uint64(partitions)).astype(numpy.int64)
+        order = numpy.argsort(parts, kind="stable")
+        bounds = numpy.searchsorted(parts[order], numpy.arange(partitions + 1))
+        for i in numpy.flatnonzero(numpy.diff(bounds)).tolist():
+            selected = order[bounds[i]:bounds[i + 1]]
+            with open(files[i], "ab") as fh:
+                write_packed_chunk(fh, packed[selected], lengths[selected], tfs[selected])
+    return files, skipped
+
+
+def _collapse_partition(args):
+    """ Count reads of partition file, keep reads with tf >= min_tf sorted by tf.
+    Write them to output_file and return (count, width) or return (packed, lengths, tfs).
+    """
+    file_name, min_tf, output_file = args
+    chunks = list(iter_packed_chunks(file_name))
+    width = max([x[0].shape[1] for x in chunks] + [0])
+    packed, lengths, tfs = count_packed_reads(
+        numpy.concatenate([pad_packed_reads(x[0], width) for x in chunks] + [numpy.zeros((0, width), numpy.uint8)]),
+        numpy.concatenate([x[1] for x in chunks] + [numpy.zeros(0, numpy.uint32)]),
+        numpy.concatenate([x[2] for x in chunks] + [numpy.zeros(0, numpy.uint64)]))
+    selected = numpy.flatnonzero(tfs >= min_tf)
+    selected = selected[numpy.argsort(-tfs[selected].astype(numpy.int64), kind="stable")]
+    packed, lengths, tfs = packed[selected], lengths[selected], tfs[selected]
+    if output_file is None:
+        return packed, lengths, tfs
+    write_packed_reads(output_file, packed, lengths, tfs)
+    return len(tfs), width
+
+
+def _iter_collapsed_partitions(tasks, threads):
+    """ Iterate over results of _collapse_partition in order of tasks."""
+    if threads <= 1:
+        for task in tasks:
+            yield _collapse_partition(task)
+        return
+    pool = Pool(threads)
+    try:
+        for result in pool.imap(_collapse_partition, tasks):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def iter_collapsed_reads(batches, partitions=READ_COLLAPSE_PARTITIONS, min_tf=1, temp_dir=None, threads=1,
+                         stats=None):
+    """ Iterate over (packed, lengths, tfs) of distinct reads with tf >= min_tf,
+    one tuple per partition, reads of a partition are sorted by tf.
+    If stats dictionary is given, number of skipped reads with non ACGT characters
+    is saved to stats["skipped"] before the first partition.
+    """
+    work_dir = tempfile.mkdtemp(prefix="read_collapse", dir=temp_dir)
+    try:
+        files, skipped = write_read_partitions(batches, work_dir, partitions)
+        if stats is not None:
+            stats["skipped"] = skipped
+        for result in _iter_collapsed_partitions([(x, min_tf, None) for x in files], threads):
+            yield result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _merge_sorted_partitions(files, output_file, block_size):
+    """ Merge files of reads sorted by tf into one file, return number of reads."""
+    handles = [open(x, "rb") for x in files]
+    try:
+        headers = [read_packed_header(fh, x) for fh, x in zip(handles, files)]
+        width = max([x[1] for x in headers] + [0])
+        dtype = get_read_record_dtype(width)
+        remaining = [x[2] for x in headers]
+        buffers = [numpy.zeros(0, dtype=dtype) for x in files]
+        total = sum(remaining)
+        with open(output_file, "wb") as fw:
+            write_packed_header(fw, 0, width, total)
+            while True:
+                for i, fh in enumerate(handles):
+                    if not len(buffers[i]) and remaining[i]:
+                        records = numpy.fromfile(fh, dtype=get_read_record_dtype(headers[i][1]),
+                                                 count=min(block_size, remaining[i]))
+                        remaining[i] -= len(records)
+                        buffers[i] = numpy.zeros(len(records), dtype=dtype)
+                        buffers[i]["seq"] = pad_packed_reads(records["seq"], width)
+                        buffers[i]["length"] = records["length"]
+                        buffers[i]["tf"] = records["tf"]
+                if not any(len(x) for x in buffers):
+                    break
+                # reads with tf below the last read tf of a partition with unread reads can't be written yet
+                bound = max([int(buffers[i]["tf"][-1]) for i in range(len(files)) if remaining[i]] + [0])
+                block = []
+                for i, records in enumerate(buffers):
+                    n = int(numpy.searchsorted(-records["tf"].astype(numpy.int64), -bound, side="right"))
+                    block.append(records[:n])
+                    buffers[i] = records[n:]
+                block = numpy.concatenate(block)
+                block[numpy.argsort(-block["tf"].astype(numpy.int64), kind="stable")].tofile(fw)
+    finally:
+        for fh in handles:
+            fh.close()
+    return total
+
+
+def sc_collapse_reads(batches, output_file, partitions=READ_COLLAPSE_PARTITIONS, min_tf=1, temp_dir=None,
+                      threads=1, verbose=True):
+    """ Collapse identical reads of iterable of batches in external memory
+    and write binary file of read_codec with distinct reads sorted by tf.
+
+    Keyword arguments:
+
+    - partitions      -- number of partition files, one partition is counted in memory
+    - min_tf          -- write reads with tf >= min_tf
+    - temp_dir        -- directory for partitions (default system temporary directory)
+    - threads         -- number of processes counting partitions
+
+    Return (number of written reads, number of skipped reads with non ACGT characters).
+    """
+    work_dir = tempfile.mkdtemp(prefix="read_collapse", dir=temp_dir)
+    try:
+        if verbose:
+            print("Write %s partitions..." % partitions)
+        files, skipped = write_read_partitions(batches, work_dir, partitions)
+        if verbose:
+            print("Count partitions...")
+        sorted_files = [x + ".sorted" for x in files]
+        for i, result in enumerate(_iter_collapsed_partitions(
+                [(x, min_tf, y) for x, y in zip(files, sorted_files)], threads)):
+            os.unlink(files[i])
+        if verbose:
+            print("Merge partitions...")
+        n = _merge_sorted_partitions(sorted_files, output_file, max(READ_COLLAPSE_BLOCK // partitions, 1))
+        return n, skipped
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
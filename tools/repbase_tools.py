@@ -11,6 +11,7 @@ import os, re
 from trseeker.tools.sequence_tools import clear_sequence
 from PyExp import sc_iter_filepath_folder
 from trseeker.seqio.fasta_file import sc_iter_fasta
+from trseeker.seqio.fai_file import FastaIndex
 from trseeker.seqio.tab_file import sc_iter_tab_file
 from trseeker.models.repbase_model import RepbaseModel
 from collections import Counter, defaultdict
@@ -78,68 +79,66 @@ def compute_repbase_stats(file_name, output_file, input_fasta, output_folder, le
     family2length = defaultdict(int)
 
 
-    print "Read genome sequences"
-    genome = {}
-    for seq_obj in sc_iter_fasta(input_fasta):
-        genome[seq_obj.header] = seq_obj.sequence
-
-
     fix_repeatmasker_out_file(file_name)
 
-    for i, rm_object in enumerate(sc_iter_tab_file(file_name, RepbaseModel)):
-        if i % 100000 == 0:
-            print i
-        rm_object.set_element_coverage()
-        if not rm_object.name in result:
-            result[rm_object.name] = {
-                'nall': 0,
-                'n0': 0,
-                'n50': 0,
-                'n80': 0,
-                'n98': 0,
-                'dall': [],
-                'd0': [],
-                'd50': [],
-                'd80': [],
-                'd98': [],
-            }
-        result[rm_object.name]['nall'] += 1
-        if rm_object.pcov <= 0.5:
-            result[rm_object.name]['n0'] += 1
-            result[rm_object.name]['d0'].append(rm_object.pdivergence)
-        if rm_object.pcov > 0.5:
-            result[rm_object.name]['n50'] += 1
-            result[rm_object.name]['d50'].append(rm_object.pdivergence)
-        if rm_object.pcov > 0.8:
-            result[rm_object.name]['n80'] += 1
-            result[rm_object.name]['d80'].append(rm_object.pdivergence)
-        if rm_object.pcov > 0.98:
-            result[rm_object.name]['n98'] += 1
-            result[rm_object.name]['d98'].append(rm_object.pdivergence)
-
-
-        if rm_object.pcov > length_cutoff:
-            sequence = rm_object.get_sequence(genome)
-            if not sequence:
-                print "Error. Not found.", rm_object
-            else:
-                if rm_object.query.endswith("|_1"):
-                    continue
-                name = rm_object.name.replace("/","__")
-                family_file_name = os.path.join(output_folder, name)
-                family_file_name_fa = os.path.join(output_folder, name+".fa")
-                with open(family_file_name, "a") as fh:
-                    s = str(rm_object).strip()
-                    fh.write("%s\t%s\n" % (s, sequence))
-                with open(family_file_name_fa, "a") as fh:
-                    s = str(rm_object).strip()
-                    if rm_object.strand == "C":
-                        sequence = get_revcomp(sequence)
-                    head = "%s_%s_%s_%s_%s" % (rm_object.query, rm_object.qstart, rm_object.qend, rm_object.name, rm_object.pdivergence)
-                    fh.write(">%s\n%s\n" % (head, sequence))
-
-                family2n[rm_object.name] += 1
-                family2length[rm_object.name] += len(sequence)
+    print "Index genome sequences"
+    with FastaIndex(input_fasta) as genome:
+        for i, rm_object in enumerate(sc_iter_tab_file(file_name, RepbaseModel)):
+            if i % 100000 == 0:
+                print i
+            rm_object.set_element_coverage()
+            if not rm_object.name in result:
+                result[rm_object.name] = {
+                    'nall': 0,
+                    'n0': 0,
+                    'n50': 0,
+                    'n80': 0,
+                    'n98': 0,
+                    'dall': [],
+                    'd0': [],
+                    'd50': [],
+                    'd80': [],
+                    'd98': [],
+                }
+            result[rm_object.name]['nall'] += 1
+            if rm_object.pcov <= 0.5:
+                result[rm_object.name]['n0'] += 1
+                result[rm_object.name]['d0'].append(rm_object.pdivergence)
+            if rm_object.pcov > 0.5:
+                result[rm_object.name]['n50'] += 1
+                result[rm_object.name]['d50'].append(rm_object.pdivergence)
+            if rm_object.pcov > 0.8:
+                result[rm_object.name]['n80'] += 1
+                result[rm_object.name]['d80'].append(rm_object.pdivergence)
+            if rm_object.pcov > 0.98:
+                result[rm_object.name]['n98'] += 1
+                result[rm_object.name]['d98'].append(rm_object.pdivergence)
+
+
+            if rm_object.pcov > length_cutoff:
+                sequence = rm_object.get_sequence(genome)
+                if sequence:
+                    sequence = clear_sequence(sequence, lower=False)
+                if not sequence:
+                    print "Error. Not found.", rm_object
+                else:
+                    if rm_object.query.endswith("|_1"):
+                        continue
+                    name = rm_object.name.replace("/","__")
+                    family_file_name = os.path.join(output_folder, name)
+                    family_file_name_fa = os.path.join(output_folder, name+".fa")
+                    with open(family_file_name, "a") as fh:
+                        s = str(rm_object).strip()
+                        fh.write("%s\t%s\n" % (s, sequence))
+                    with open(family_file_name_fa, "a") as fh:
+                        s = str(rm_object).strip()
+                        if rm_object.strand == "C":
+                            sequence = get_revcomp(sequence)
+                        head = "%s_%s_%s_%s_%s" % (rm_object.query, rm_object.qstart, rm_object.qend, rm_object.name, rm_object.pdivergence)
+                        fh.write(">%s\n%s\n" % (head, sequence))
+
+                    family2n[rm_object.name] += 1
+                    family2length[rm_object.name] += len(sequence)
 
 
     print
@@ -264,7 +263,8 @@ if __name__ == '__main__':
     #     for i, consensus in index_data.items():
     #         fh.write("%s\t%s\n" % (i, consensus))
     print "Compute distances..."
-    D = compute_distances(index_objs, id2length, index_function=None)
+    n = compute_distances(index_objs, id2length, dist_file)
+    print "Saved %s distances to %s" % (n, dist_file)
 
 
     # print "Compute index"
@@ -306,7 +306,7 @@ if __name__ == '__main__':
 
 
 
-    # D = compute_distances_for_index(index, id2length, index_function=None)
+    # n = compute_distances_for_index(index, id2length, dist_file)
 
     # data = [key, revkey, tf, df, ",".join(new_doc_ids), ",".join(freqs)]
 
@@ -8,8 +8,17 @@
 Functions related to short read data (SRA).
 '''
 import os
-from trseeker.tools.other_tools import sort_dictionary_by_value
-from trseeker.tools.ngrams_tools import generate_ngrams
+from binascii import hexlify, unhexlify
+import numpy
+from trseeker.tools.kmer_codec import get_kmer_codes, count_kmer_codes
+from trseeker.tools.read_codec import pack_reads, unpack_reads, count_packed_reads, merge_kmer_parts, \
+    write_packed_reads, write_kmer_counts, pad_packed_reads, add_merged_part
+from trseeker.tools.read_collapse import iter_read_batches, iter_collapsed_reads, sc_collapse_reads, \
+    READ_COLLAPSE_PARTITIONS
+
+from trseeker.tools.kmer_cms import sc_count_frequent_kmers, KMER_CMS_MEMORY
+
+SRA_BATCH_SIZE = 1 << 20
 
 def sra_fastaq_reader(file_name):
     ''' Iterate over fastaq data.'''
@@ -36,19 +45,21 @@ def sra_fasta_reader(file_name):
             line = line.strip()
             if not line:
                 continue
-            if line.startswith(">"):
+            if line.startswith(b">"):
                 if title:
                     yield title, seq
                 title = line
-                seq = ""
+                seq = b""
                 continue
             else:
                 seq += line
         if title:
-            yield title, line
+            yield title, seq
 
 def read_fastaq_freq_to_memory(file_name):
-    ''' Read fastaq data with correspoding TF.'''
+    ''' Read fastaq data with correspoding TF.
+    For large runs use iter_collapsed_reads of read_collapse.
+    '''
     SRA = {}
     for title, seq in sra_fastaq_reader(file_name):
         SRA.setdefault(seq, 0)
@@ -65,107 +76,127 @@ def fastaq_to_fasta(file_name, output_file):
             n += 1
     print(n)
 
-def write_fastaq_repeats(input_file, output_file, min_tf=1000):
-    ''' Write file with fastaq repeated reads with exact match.'''
-    SRA = read_fastaq_freq_to_memory(input_file)
+def write_fastaq_repeats(input_file, output_file, min_tf=1000, partitions=READ_COLLAPSE_PARTITIONS,
+                         temp_dir=None, threads=1, batch_size=SRA_BATCH_SIZE):
+    ''' Write file with fastaq repeated reads with exact match.
+    Reads are collapsed in hash partitions on disk, reads with tf < min_tf
+    are dropped per partition and never collected in memory.
+    Reads with non ACGT characters are skipped and their number is printed.
+    Return number of written reads.
+    '''
     i = 0
+    stats = {}
+    batches = iter_read_batches(sra_fastaq_reader(input_file), batch_size)
     with open(output_file, "w") as fw:
-        for k in SRA:
-            if SRA[k] >= min_tf:
+        for packed, lengths, tfs in iter_collapsed_reads(batches, partitions=partitions, min_tf=min_tf,
+                                                         temp_dir=temp_dir, threads=threads, stats=stats):
+            for seq, tf in zip(unpack_reads(packed, lengths), tfs.tolist()):
                 i += 1
-                fw.write(">%s-%s\n%s\n" % (i, SRA[k], k))
+                fw.write(">%s-%s\n%s\n" % (i, tf, seq))
+    print("Skipped: ", stats.get("skipped", 0))
+    return i
 
 def seq_to_bin(seq):
-    ''' Write binary representation of sequence.
-    TODO: fixit
+    ''' Return integer with leading 1 bit and 2-bit codes of sequence.
+    For batches use pack_reads of read_codec.
     '''
-    LBT = {'a':'00',
-     'c':'01',
-     'g':'10',
-     't':'11',
-     'A':'00',
-     'C':'01',
-     'G':'10',
-     'T':'11', }
-
-    b = '0b1'
-    for l in seq:
-        b += LBT[l]
-    return eval(b)
+    packed, lengths, valid = pack_reads([seq])
+    if not valid.all():
+        raise Exception("Can't encode sequence with non ACGT characters: %s" % seq)
+    width = packed.shape[1]
+    value = int(hexlify(packed[0].tobytes()) or b"0", 16)
+    return ((1 << 8 * width) | value) >> (8 * width - 2 * len(seq))
 
 def bin_to_seq(bseq):
-    ''' Write string representation of binary sequence data.
-    TODO: fixit
+    ''' Return sequence for integer of seq_to_bin.
+    For batches use unpack_reads of read_codec.
     '''
+    length = (bseq.bit_length() - 1) // 2
+    if not length:
+        return ""
+    width = (length + 3) // 4
+    value = (bseq ^ (1 << 2 * length)) << (8 * width - 2 * length)
+    packed = numpy.frombuffer(unhexlify(("%0*x" % (2 * width, value)).encode("ascii")), dtype=numpy.uint8)
+    return unpack_reads(packed.reshape(1, width), [length])[0]
 
-    BLT = {'00' : 'a',
-       '01':'c',
-       '10':'g',
-       '11':'t', }
-
-    bseq = str(bin(bseq))[3:]
-    result = ''
-    for i in xrange(0, len(bseq), 2):
-        result += BLT[bseq[i:i + 2]]
-    return result
+def _merge_read_parts(parts):
+    ''' Return (packed, lengths, tfs) of distinct reads of counted parts.'''
+    width = max([x[0].shape[1] for x in parts] + [0])
+    return count_packed_reads(
+        numpy.concatenate([pad_packed_reads(x[0], width) for x in parts] + [numpy.zeros((0, width), numpy.uint8)]),
+        numpy.concatenate([x[1] for x in parts] + [numpy.zeros(0, numpy.uint32)]),
+        numpy.concatenate([x[2] for x in parts] + [numpy.zeros(0, numpy.uint64)]))
 
-def write_reduced_fasta(input_file, output_reduced):
+def write_reduced_fasta(input_file, output_reduced, batch_size=SRA_BATCH_SIZE, partitions=None, temp_dir=None,
+                        threads=1):
     ''' Read SRA fasta data without read repeats.
-    Output format: read tf
+    Output format: fixed width binary file of read_codec (packed read, length, tf)
+    sorted by tf, read it with read_packed_reads.
+    With partitions reads are collapsed in hash partitions on disk
+    (sc_collapse_reads of read_collapse), partitions are counted by threads processes.
     Return number of skipped reads.
     '''
-    seen = {}
-    n = 0
+    batches = iter_read_batches(sra_fasta_reader(input_file), batch_size)
+    if partitions:
+        n, skipped = sc_collapse_reads(batches, output_reduced, partitions=partitions, temp_dir=temp_dir,
+                                       threads=threads)
+        print("Done.")
+        print("Skipped: ", skipped)
+        return skipped
+    parts = []
     print("Reading...")
     skipped = 0
-    for title, seq in sra_fasta_reader(input_file):
-        if 'N' in seq:
-            skipped += 1
-            continue
-
-        seq = seq_to_bin(seq)
-        seen.setdefault(seq, 0)
-        seen[seq] += 1
-        n += 1
+    for batch in batches:
+        batch_packed, batch_lengths, valid = pack_reads(batch)
+        skipped += len(batch) - int(valid.sum())
+        add_merged_part(parts, count_packed_reads(batch_packed[valid], batch_lengths[valid]), _merge_read_parts)
+    packed, lengths, tfs = _merge_read_parts(parts)
+    del parts
     print("Sorting...")
-    seen = sort_dictionary_by_value(seen, reverse=True)
-    print("Formating...")
-    seen = ["%s\t%s\n" % (k, v) for v, k in seen]
+    order = numpy.argsort(-tfs.astype(numpy.int64), kind="stable")
     print("Saving...")
-    with open(output_reduced, "w") as fh:
-        for line in seen:
-            fh.write(line)
+    write_packed_reads(output_reduced, packed[order], lengths[order], tfs[order])
     print("Done.")
     print("Skipped: ", skipped)
 
     return skipped
 
-def write_ngrams(input_file, output_ngram, NGRAM_N):
+def _iter_fasta_sequences(input_file):
+    ''' Iterate over sequences of SRA fasta file.'''
+    for title, seq in sra_fasta_reader(input_file):
+        yield seq
+
+def write_ngrams(input_file, output_ngram, NGRAM_N, batch_size=SRA_BATCH_SIZE, min_tf=None,
+                 max_memory=KMER_CMS_MEMORY):
     ''' Write ngrams data from SRA fasta data.
-    Output format: binary_ngram freq
-    Return: Nngram, skipped read
+    Output format: fixed width binary file of read_codec (2-bit ngram code, freq)
+    sorted by freq, read it with read_kmer_counts. NGRAM_N is up to 32.
+    With min_tf only ngrams with freq >= min_tf are written, they are counted
+    in two passes with count-min sketch of max_memory Mb (sc_count_frequent_kmers of kmer_cms).
+    Return: Nngram, skipped ngrams with non ACGT characters
     '''
-    seen = {}
-    n = 0
     print("Reading...")
-    skipped = 0
-    for title, seq in sra_fasta_reader(input_file):
-        for i, ngram in generate_ngrams(seq, n=NGRAM_N):
-            if 'N' in ngram:
-                skipped += 1
-                continue
-            ngram = seq_to_bin(ngram)
-            seen.setdefault(ngram, 0)
-            seen[ngram] += 1
-            n += 1
+    if min_tf:
+        codes, tfs, stats = sc_count_frequent_kmers(lambda: _iter_fasta_sequences(input_file), NGRAM_N, min_tf,
+                                                    max_memory=max_memory)
+        n = stats["kmers"]
+        skipped = stats["skipped"]
+    else:
+        parts = []
+        n = 0
+        skipped = 0
+        for batch in iter_read_batches(sra_fasta_reader(input_file), batch_size):
+            batch_codes = get_kmer_codes(b"n".join(batch), NGRAM_N)
+            n += len(batch_codes)
+            skipped += sum(max(0, len(seq) - NGRAM_N + 1) for seq in batch) - len(batch_codes)
+            batch_codes, batch_tfs = count_kmer_codes(batch_codes)
+            add_merged_part(parts, (batch_codes, batch_tfs.astype(numpy.uint64)), merge_kmer_parts)
+        codes, tfs = merge_kmer_parts(parts)
+        del parts
     print("Sorting...")
-    seen = sort_dictionary_by_value(seen, reverse=True)
-    print("Formating...")
-    seen = ["%s\t%s\n" % (bin_to_seq(k), v) for v, k in seen]
+    order = numpy.argsort(-tfs.astype(numpy.int64), kind="stable")
     print("Saving...")
-    with open(output_ngram, "w") as fh:
-        for line in seen:
-            fh.write(line)
+    write_kmer_counts(output_ngram, codes[order], tfs[order], NGRAM_N)
     print("Done.")
     print("ngrams, skipped: ", n, skipped)
-    return n, skipped
\ No newline at end of file
+    return n, skipped
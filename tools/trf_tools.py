@@ -23,6 +23,8 @@ from multiprocessing import Pool
 from trseeker.seqio.fasta_file import sc_iter_fasta
 from trseeker.models.trf_model import TRModel
 from trseeker.seqio.trf_file import TRFFileIO
+from trseeker.seqio.tr_dataset import TRDataset, sc_write_selected_rows
+import numpy
 
 settings = load_settings()
 
@@ -262,52 +264,40 @@ def trf_search_for_file_list_parallel(file_list, verbose=True, output_folder=Non
     p.map(trf_worker, map_data)
         
 
-def _filter_by_bottom_array_length(obj, cutoff):
-    if obj.trf_array_length > cutoff:
-        return True
-    else:
-        return False
-
-def _filter_by_bottom_unit_length(obj, cutoff):
-    if obj.trf_period > cutoff:
-        return True
-    else:
-        return False
+def _get_greater_mask(values, cutoff):
+    """ Return boolean mask of values greater than cutoff, None values aren't selected."""
+    if values.dtype != object:
+        return values > cutoff
+    return numpy.array([value is not None and value > cutoff for value in values.tolist()], dtype=bool)
 
 def trf_filter_by_array_length(trf_file, output_file, cutoff):
     """ Create output TRF file with tandem repeats with length greater than from input file.
     Function returns number of tandem repeats in output file.
     """
-    i = 0
-    with open(output_file, "w") as fw:
-        for obj in trf_reader(trf_file):
-            if _filter_by_bottom_array_length(obj, cutoff):
-                i += 1
-                fw.write(obj.get_string_repr())
-    print(i)
-    return i
+    with TRDataset.load(trf_file, fields=["trf_array_length"]) as dataset:
+        mask = _get_greater_mask(dataset["trf_array_length"], cutoff)
+    n = sc_write_selected_rows(trf_file, output_file, mask)
+    print(n)
+    return n
 
 def trf_filter_by_monomer_length(trf_file, output_file, cutoff):
     """ Create output TRF file with tandem repeats with unit length greater than from input file.
     Function returns number of tandem repeats in output file.
     """
-    i = 0
-    with open(output_file, "w") as fw:
-        for obj in trf_reader(trf_file):
-            if _filter_by_bottom_unit_length(obj, cutoff):
-                i += 1
-                fw.write(obj.get_string_repr())
-    print(i)
-    return i
+    with TRDataset.load(trf_file, fields=["trf_period"]) as dataset:
+        mask = _get_greater_mask(dataset["trf_period"], cutoff)
+    n = sc_write_selected_rows(trf_file, output_file, mask)
+    print(n)
+    return n
 
 def trf_filter_exclude_by_gi_list(trf_file, output_file, gi_list_to_exclude):
     """ Create output TRF file with tandem repeats with GI that don't match GI_LIST
     List of GI, see TRF and FA specifications, GI is first value in TRF row.
     """
-    with open(output_file, "w") as fw:
-        for obj in trf_reader(trf_file):
-            if not obj.trf_gi in gi_list_to_exclude:
-                    fw.write(obj.get_string_repr())
+    gi_set = set(gi_list_to_exclude)
+    with TRDataset.load(trf_file, fields=["trf_gi"]) as dataset:
+        mask = numpy.array([not gi in gi_set for gi in dataset["trf_gi"].tolist()], dtype=bool)
+    sc_write_selected_rows(trf_file, output_file, mask)
 
 def trf_representation(trf_file, trf_output, representation):
     """ Write TRF file tab delimited representation.
@@ -338,28 +328,22 @@ def trf_write_field_n_data(trf_file, file_output, field, field_format="%s"):
     """ Write statistics data: field, N.
     """
     result = {}
+    with TRDataset.load(trf_file, fields=[field]) as dataset:
+        field2n = dataset.count_by(field)
+    for value, n in field2n.items():
+        value = field_format % value
+        result.setdefault(value, 0)
+        result[value] += n
     with open(file_output, "w") as fw:
-        for obj in trf_reader(trf_file):
-            value = field_format % getattr(obj, field)
-            result.setdefault(value)
-            result[value] += 1
-        result = [ (value, n) for value, n in result.items() ]
-        result.sort()
-        for value, n in result:
-            line = field_format + "\t%s\n"
-            line = line % (value, n)
-            fw.write(line)
+        for value, n in sorted(result.items()):
+            fw.write("%s\t%s\n" % (value, n))
 
 def trf_write_two_field_data(trf_file, file_output, field_a, field_b):
     """ Write statistics data: field_a, field_b.
     """
-    result = []
+    with TRDataset.load(trf_file, fields=[field_a, field_b]) as dataset:
+        result = sorted(dataset.iter_rows([field_a, field_b]))
     with open(file_output, "w") as fw:
-        for obj in trf_reader(trf_file):
-            value_a = getattr(obj, field_a)
-            value_b = getattr(obj, field_b)
-            result.append([value_a, value_b])
-        result.sort()
         for value_a, value_b in result:
             line = "%s\t%s\n" % (value_a, value_b)
             fw.write(line)
@@ -367,34 +351,21 @@ def trf_write_two_field_data(trf_file, file_output, field_a, field_b):
 def count_trs_per_chrs(all_trf_file):
     """ Function prints chr, all trs, 3000 trs, 10000 trs
     """
-    chr2n = {}
-    chr2n_large = {}
-    chr2n_xlarge = {}
-    for trf_obj in trf_reader(all_trf_file):
-        chr = trf_obj.trf_chr
-        chr2n.setdefault(chr, 0)
-        chr2n_large.setdefault(chr, 0)
-        chr2n_xlarge.setdefault(chr, 0)
-        chr2n[chr] += 1
-        if trf_obj.trf_array_length > 3000:
-            chr2n_large[chr] += 1
-        if trf_obj.trf_array_length > 10000:
-            chr2n_xlarge[chr] += 1
+    with TRDataset.load(all_trf_file, fields=["trf_chr", "trf_array_length"]) as dataset:
+        lengths = dataset["trf_array_length"]
+        chr2n = dataset.count_by("trf_chr")
+        chr2n_large = dataset.count_by("trf_chr", _get_greater_mask(lengths, 3000))
+        chr2n_xlarge = dataset.count_by("trf_chr", _get_greater_mask(lengths, 10000))
     for chr in chr2n:
-        print(chr, chr2n[chr], chr2n_large[chr], chr2n_xlarge[chr])
+        print(chr, chr2n[chr], chr2n_large.get(chr, 0), chr2n_xlarge.get(chr, 0))
 
 def count_trf_subset_by_head(trf_file, head_value):
     """ Function prints number of items with given fasta head fragment
     """
-    total = 0
-    n = 0
-    total_length = 0
-    for trf_obj in trf_reader(trf_file):
-        total += 1
-        if head_value in trf_obj.trf_head:
-            n += 1
-            total_length += trf_obj.trf_array_length
-    return n, total, total_length
+    with TRDataset.load(trf_file, fields=["trf_head", "trf_array_length"]) as dataset:
+        mask = numpy.array([head_value in head for head in dataset["trf_head"].tolist()], dtype=bool)
+        total_length = int(dataset["trf_array_length"][mask].sum())
+        return int(mask.sum()), len(dataset), total_length
 
 def fix_chr_names(trf_file, temp_file_name=None, case=None):
     """ Some fasta heads impossible to parse, so it is simpler to fix them postfactum